@@ -0,0 +1,61 @@
+"""
+Compare the CPU cost of compressing GameInfo responses of typical sizes
+against the bytes saved, for each supported encoding and level.
+
+Run with ``python -m benchmarks.bench_compression``.
+"""
+
+import argparse
+from functools import partial
+from typing import Callable, List, Tuple
+
+from benchmarks.bench_game_response import cpu_time_per_call
+from benchmarks.games import example_game
+from ghost_api.compression import (
+    COMPRESSORS,
+    BrotliCompressor,
+    Compressor,
+    GzipCompressor,
+)
+from ghost_api.rendering import render_game
+
+
+def compressors() -> List[Tuple[str, Callable[[], Compressor]]]:
+    options: List[Tuple[str, Callable[[], Compressor]]] = [
+        (f"gzip level {level}", partial(GzipCompressor, level)) for level in (1, 6, 9)
+    ]
+    if "br" in COMPRESSORS:
+        options += [
+            (f"br quality {quality}", partial(BrotliCompressor, quality))
+            for quality in (1, 4, 11)
+        ]
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--moves", type=int, nargs="+", default=[0, 20, 100, 400])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    for n_moves in args.moves:
+        body = render_game(example_game(n_moves))
+        print(f"GameInfo response with {n_moves} moves, {len(body)} bytes:")
+
+        for name, new_compressor in compressors():
+
+            def compress():
+                return new_compressor().compress(body, final=True)
+
+            compressed = len(compress())
+            cpu_time = cpu_time_per_call(compress, args.iterations)
+            saved = len(body) - compressed
+            print(
+                f"  {name:<14} {compressed:8d} bytes ({compressed / len(body):4.0%})"
+                f" {cpu_time * 1e6:10.1f} us"
+                f" {saved / (cpu_time * 1e6):8.1f} bytes saved per us"
+            )
+
+
+if __name__ == "__main__":
+    main()
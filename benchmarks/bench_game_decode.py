@@ -0,0 +1,40 @@
+"""
+Compare the CPU cost of decoding a stored game with pydantic validation
+against the trusted ``decode_game`` path.
+
+Run with ``python -m benchmarks.bench_game_decode``.
+"""
+
+import argparse
+
+from benchmarks.bench_game_response import cpu_time_per_call
+from benchmarks.games import example_game
+from ghost_api.storage import decode_game, encode_game
+from ghost_api.types import GameInfo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--moves", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    game = example_game(args.moves)
+    # Validation can only be applied to games with moves in the list layout
+    list_item = game.dict()
+    item = encode_game(game)
+    assert decode_game(item) == GameInfo.parse_obj(list_item)
+
+    validated = cpu_time_per_call(
+        lambda: GameInfo.parse_obj(list_item), args.iterations
+    )
+    trusted = cpu_time_per_call(lambda: decode_game(item), args.iterations)
+
+    print(f"Decoding a stored game with {args.moves} moves, CPU time per read:")
+    print(f"  GameInfo.parse_obj: {validated * 1e6:10.1f} us")
+    print(f"  decode_game:        {trusted * 1e6:10.1f} us", end=" ")
+    print(f"({validated / trusted:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
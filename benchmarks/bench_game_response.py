@@ -0,0 +1,67 @@
+"""
+Compare the CPU cost of rendering a GameInfo response through FastAPI's
+``response_model`` handling against ``GameInfoResponse``.
+
+Run with ``python -m benchmarks.bench_game_response``.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Callable
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from benchmarks.games import example_game
+from ghost_api.responses import GameInfoResponse
+from ghost_api.types import GameInfo
+
+
+def cpu_time_per_call(func: Callable[[], object], iterations: int) -> float:
+    """
+    Mean CPU time of a call, in seconds
+    """
+    func()
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--moves", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    game = example_game(args.moves)
+
+    # The response field FastAPI validates a route's return value against
+    route = APIRoute("/game/{room_code}", lambda: None, response_model=GameInfo)
+    field = route.secure_cloned_response_field
+    loop = asyncio.new_event_loop()
+
+    def response_model_path():
+        content = loop.run_until_complete(
+            serialize_response(field=field, response_content=game)
+        )
+        return JSONResponse(content).body
+
+    def fast_path():
+        return GameInfoResponse(game).body
+
+    # Both paths must produce the same document
+    assert json.loads(fast_path()) == json.loads(response_model_path())
+
+    baseline = cpu_time_per_call(response_model_path, args.iterations)
+    fast = cpu_time_per_call(fast_path, args.iterations)
+
+    print(f"GameInfo response with {args.moves} moves, CPU time per request:")
+    print(f"  response_model:   {baseline * 1e6:10.1f} us")
+    print(f"  GameInfoResponse: {fast * 1e6:10.1f} us ({baseline / fast:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measure the time taken to import the API in a fresh interpreter, which is most
+of the cold start time of the Lambda handler, and fail if it's over budget or
+if modules that should only be loaded on first use are imported.
+
+Run with ``python -m benchmarks.bench_import_time``.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import List, Tuple
+
+#: Module imported by the Lambda handler
+HANDLER_MODULE = "ghost_api.api"
+
+#: Modules that must not be loaded by importing the handler
+DEFERRED_MODULES = ["boto3", "botocore", "ghost_api.service"]
+
+#: Script timing the import of the handler in a fresh interpreter
+IMPORT_SCRIPT = f"""
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import {HANDLER_MODULE}
+elapsed = time.perf_counter() - start
+
+deferred = {DEFERRED_MODULES!r}
+print(json.dumps([elapsed, [name for name in deferred if name in sys.modules]]))
+"""
+
+
+def time_import() -> Tuple[float, List[str]]:
+    """
+    Import the handler in a fresh interpreter, returning the time taken in
+    seconds and the deferred modules that were loaded
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        check=True,
+        stdout=subprocess.PIPE,
+    )
+    elapsed, loaded = json.loads(result.stdout)
+    return elapsed, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=300,
+        help="Maximum median import time, in milliseconds",
+    )
+    args = parser.parse_args()
+
+    times = []
+    loaded = []
+    for _ in range(args.runs):
+        elapsed, loaded = time_import()
+        times.append(elapsed * 1e3)
+
+    median = statistics.median(times)
+    print(f"Import of {HANDLER_MODULE} over {args.runs} runs:")
+    print(f"  median: {median:8.1f} ms")
+    print(f"  min:    {min(times):8.1f} ms")
+    print(f"  budget: {args.budget_ms:8.1f} ms")
+
+    failed = False
+    if median > args.budget_ms:
+        print("FAIL: import time is over budget")
+        failed = True
+    if len(loaded) > 0:
+        print(f"FAIL: modules that should load on first use were imported: {loaded}")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Example games of different sizes for benchmarks
+"""
+
+from ghost_api.types import (
+    Challenge,
+    ChallengeState,
+    ChallengeType,
+    ChallengeVote,
+    GameInfo,
+    Move,
+    Player,
+    Position,
+)
+
+#: Width of the board moves are laid out on
+BOARD_WIDTH = 20
+
+
+def example_players(n_players: int = 4):
+    return [
+        Player(
+            name=f"player{i}",
+            image_url=f"https://www.gravatar.com/avatar/{i:032x}?d=identicon",
+        )
+        for i in range(n_players)
+    ]
+
+
+def example_game(n_moves: int, n_players: int = 4) -> GameInfo:
+    """
+    A started game with ``n_moves`` moves, a loser and an open challenge on
+    the last move, if there is one
+    """
+    players = example_players(n_players + 1)
+    loser, players = players[-1], players[:-1]
+
+    moves = [
+        Move(
+            player_name=players[i % n_players].name,
+            position=Position(x=i % BOARD_WIDTH, y=i // BOARD_WIDTH),
+            letter=chr(ord("A") + i % 26),
+        )
+        for i in range(n_moves)
+    ]
+
+    challenge = None
+    if n_moves > 0:
+        challenge = Challenge(
+            challenger_name=players[n_moves % n_players].name,
+            move=moves[-1],
+            type=ChallengeType.COMPLETE_WORD,
+            state=ChallengeState.VOTING,
+            response=None,
+            votes=[
+                ChallengeVote(voter_name=player.name, pro_challenge=True)
+                for player in players[:-1]
+            ],
+        )
+
+    return GameInfo(
+        room_code="BENCH",
+        started=True,
+        winner=None,
+        players=players,
+        losers=[loser],
+        turn_player_name=players[n_moves % n_players].name,
+        moves=moves,
+        challenge=challenge,
+    )
@@ -0,0 +1,412 @@
+"""
+Clients and statistics shared by the load testing tools.
+
+Requests are described by their route, so they can be made either over HTTP to
+a running server or directly on a ``GhostService``, which leaves out the cost
+of the API and shows the service and DynamoDB on their own.
+"""
+
+import http.client
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode, urlsplit
+
+from botocore.exceptions import ClientError
+from pydantic import parse_obj_as
+
+from ghost_api.exceptions import (
+    ConcurrentUpdate,
+    GameAlreadyExists,
+    GameDoesNotExist,
+    GameNotStarted,
+    GameStarted,
+    InvalidCursor,
+    InvalidMove,
+    NoFieldsRequested,
+    PlayerNotJoined,
+    UnknownField,
+    WrongPlayer,
+)
+from ghost_api.types import (
+    BatchAction,
+    ChallengeResponse,
+    ChallengeVote,
+    GameInfo,
+    Move,
+    NewChallenge,
+    Player,
+)
+
+
+@dataclass
+class Request:
+    """
+    A request to a route of the API
+    """
+
+    #: HTTP method, e.g. ``POST``
+    method: str
+
+    #: Path of the route, e.g. ``/game/{room_code}/move``
+    route: str
+
+    #: Values of the parameters in the route's path
+    path_params: Dict[str, str] = field(default_factory=dict)
+
+    #: JSON body, with camelCase keys
+    body: Any = None
+
+    #: Query parameters
+    query: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.route}"
+
+    @property
+    def room_code(self) -> Optional[str]:
+        return self.path_params.get("room_code")
+
+
+#: Outcome of a successful request
+OK = "ok"
+
+#: Outcome of a request refused by the rules of the game, e.g. a move out of turn
+REJECTED = "rejected"
+
+#: Outcome of a request whose conditional write lost a race with another request
+CONFLICT = "conflict"
+
+#: Outcome of a request that failed for any other reason
+ERROR = "error"
+
+
+@dataclass
+class Result:
+    """
+    The result of a request
+    """
+
+    #: HTTP status code, or the one the API would have responded with
+    status: int
+
+    #: One of ``OK``, ``REJECTED``, ``CONFLICT`` or ``ERROR``
+    outcome: str
+
+    #: Time taken, in seconds
+    seconds: float
+
+    #: Response body: bytes over HTTP, or the value returned by the service
+    body: Any = None
+
+    def game(self) -> GameInfo:
+        """
+        The game returned by a successful request
+        """
+        if isinstance(self.body, GameInfo):
+            return self.body
+        return GameInfo.parse_raw(self.body)
+
+
+def _outcome(status: int) -> str:
+    if status < 400:
+        return OK
+    if status < 500:
+        return REJECTED
+    return ERROR
+
+
+class Client(ABC):
+    """
+    Makes requests to the API
+    """
+
+    @abstractmethod
+    def request(self, request: Request) -> Result:
+        """
+        Make a request, returning its outcome and latency
+        """
+
+    def warm_up(self) -> None:
+        """
+        Set up the current thread to make requests, so the setup isn't timed
+        as part of the first one
+        """
+
+
+class HttpClient(Client):
+    """
+    Makes requests to a running server, with a keep-alive connection per
+    thread.
+
+    Conditional writes that lose a race are server errors in the API, so they
+    are counted as errors rather than conflicts.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        url = urlsplit(base_url)
+        self.https = url.scheme == "https"
+        self.host = url.netloc
+        self.base_path = url.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection_class = (
+                http.client.HTTPSConnection
+                if self.https
+                else http.client.HTTPConnection
+            )
+            connection = self._local.connection = connection_class(
+                self.host, timeout=self.timeout
+            )
+        return connection
+
+    def request(self, request: Request) -> Result:
+        path = self.base_path + request.route.format(
+            **{
+                name: quote(value, safe="")
+                for name, value in request.path_params.items()
+            }
+        )
+        if request.query:
+            path += "?" + urlencode(request.query)
+        headers = {}
+        body = None
+        if request.body is not None:
+            body = json.dumps(request.body).encode()
+            headers["Content-Type"] = "application/json"
+
+        start = time.perf_counter()
+        try:
+            connection = self._connection()
+            connection.request(request.method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            # The connection is reopened by the next request
+            self._local.connection = None
+            return Result(0, ERROR, time.perf_counter() - start)
+        seconds = time.perf_counter() - start
+
+        return Result(response.status, _outcome(response.status), seconds, content)
+
+
+#: Status codes the API responds with for exceptions raised by the service
+EXCEPTION_STATUS = {
+    GameDoesNotExist: 404,
+    GameAlreadyExists: 409,
+    GameStarted: 409,
+    GameNotStarted: 409,
+    WrongPlayer: 409,
+    InvalidMove: 409,
+    PlayerNotJoined: 409,
+    InvalidCursor: 400,
+    UnknownField: 400,
+    NoFieldsRequested: 422,
+    ConcurrentUpdate: 409,
+}
+
+#: Names of game fields by their names in the API, as the API maps them
+GAME_FIELD_NAMES = {field.alias: name for name, field in GameInfo.__fields__.items()}
+
+
+def _read_game(service: Any, request: Request) -> Any:
+    fields = request.query.get("fields")
+    if fields is None:
+        return service.read_game_json(request.room_code)
+    requested = fields.split(",") if fields != "" else []
+    # Unknown fields are passed on for the service to reject
+    names = [GAME_FIELD_NAMES.get(field, field) for field in requested]
+    return service.read_game(request.room_code, fields=names)
+
+
+#: Service call made for each route, as a function of a service and a request
+SERVICE_ROUTES: Dict[Tuple[str, str], Callable[[Any, Request], Any]] = {
+    ("GET", "/game/{room_code}"): _read_game,
+    ("GET", "/games"): lambda service, request: service.list_open_games(
+        limit=int(request.query.get("limit", 20)),
+        cursor=request.query.get("cursor"),
+    ),
+    ("POST", "/games/query"): lambda service, request: list(
+        service.read_games(request.body["roomCodes"])
+    ),
+    ("POST", "/game/{room_code}"): lambda service, request: service.create_game(
+        request.room_code
+    ),
+    ("DELETE", "/game/{room_code}"): lambda service, request: service.delete_game(
+        request.room_code
+    ),
+    ("POST", "/game/{room_code}/start"): lambda service, request: service.start_game(
+        request.room_code
+    ),
+    ("POST", "/game/{room_code}/move"): lambda service, request: service.add_move(
+        request.room_code, Move.parse_obj(request.body)
+    ),
+    ("POST", "/game/{room_code}/player"): lambda service, request: service.add_player(
+        request.room_code, Player.parse_obj(request.body)
+    ),
+    (
+        "DELETE",
+        "/game/{room_code}/player/{player_name}",
+    ): lambda service, request: service.remove_player(
+        request.room_code, request.path_params["player_name"]
+    ),
+    (
+        "POST",
+        "/game/{room_code}/challenge",
+    ): lambda service, request: service.create_challenge(
+        request.room_code, NewChallenge.parse_obj(request.body)
+    ),
+    (
+        "POST",
+        "/game/{room_code}/challenge-response",
+    ): lambda service, request: service.create_challenge_response(
+        request.room_code, ChallengeResponse.parse_obj(request.body)
+    ),
+    (
+        "POST",
+        "/game/{room_code}/challenge-vote",
+    ): lambda service, request: service.add_challenge_vote(
+        request.room_code, ChallengeVote.parse_obj(request.body)
+    ),
+    ("POST", "/game/{room_code}/batch"): lambda service, request: service.apply_actions(
+        request.room_code, parse_obj_as(List[BatchAction], request.body)
+    ),
+}
+
+
+class ServiceClient(Client):
+    """
+    Makes requests by calling a ``GhostService`` directly, with a service per
+    thread. Requires the same environment variables as the API.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    def _service(self) -> Any:
+        service = getattr(self._local, "service", None)
+        if service is None:
+            from ghost_api.service import GhostService
+
+            service = self._local.service = GhostService()
+        return service
+
+    def warm_up(self) -> None:
+        self._service()
+
+    def request(self, request: Request) -> Result:
+        call = SERVICE_ROUTES[request.method, request.route]
+        service = self._service()
+
+        start = time.perf_counter()
+        try:
+            body = call(service, request)
+        except tuple(EXCEPTION_STATUS) as e:
+            status = EXCEPTION_STATUS[type(e)]
+            return Result(status, _outcome(status), time.perf_counter() - start)
+        except ClientError as e:
+            outcome = ERROR
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                outcome = CONFLICT
+            return Result(500, outcome, time.perf_counter() - start)
+        except Exception:
+            # A server error in the API
+            return Result(500, ERROR, time.perf_counter() - start)
+        seconds = time.perf_counter() - start
+
+        created = request.method == "POST" and request.route == "/game/{room_code}"
+        status = 201 if created else 200
+        return Result(status, OK, seconds, body)
+
+
+def new_client(url: Optional[str]) -> Client:
+    """
+    A client for the server at ``url``, or for the service if it's None
+    """
+    if url is None:
+        return ServiceClient()
+    return HttpClient(url)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    The value below which ``fraction`` of the sorted ``values`` fall
+    """
+    if len(values) == 0:
+        return 0.0
+    index = min(len(values) - 1, int(fraction * len(values)))
+    return values[index]
+
+
+class LoadStats:
+    """
+    Latencies and outcomes of the requests made during a load test, by route.
+    Safe to record into from many threads.
+    """
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Counter] = defaultdict(Counter)
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, request: Request, result: Result) -> None:
+        with self._lock:
+            self.latencies[request.name].append(result.seconds)
+            self.outcomes[request.name][result.outcome] += 1
+
+    def finish(self) -> None:
+        self.end = time.perf_counter()
+
+    @property
+    def requests(self) -> int:
+        return sum(len(latencies) for latencies in self.latencies.values())
+
+    def outcome_count(self, outcome: str) -> int:
+        return sum(counts[outcome] for counts in self.outcomes.values())
+
+    def report(self) -> str:
+        """
+        A table of throughput, latency percentiles and outcome rates, overall
+        and by route
+        """
+        end = self.end if self.end is not None else time.perf_counter()
+        elapsed = end - self.start
+        lines = [
+            f"{self.requests} requests in {elapsed:.1f} s "
+            f"({self.requests / elapsed if elapsed > 0 else 0:.1f} requests/s)",
+            "",
+            f"{'route':48} {'count':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+            f"{'max ms':>8} {'rejected':>9} {'conflict':>9} {'error':>7}",
+        ]
+        rows = sorted(self.latencies.items())
+        rows.append(("all", [s for _, values in rows for s in values]))
+        for name, latencies in rows:
+            if name == "all":
+                counts: Counter = sum(self.outcomes.values(), Counter())
+            else:
+                counts = self.outcomes[name]
+            latencies = sorted(latencies)
+            count = len(latencies)
+            percentiles = " ".join(
+                f"{percentile(latencies, p) * 1e3:8.1f}" for p in (0.5, 0.9, 0.99)
+            )
+            rates = " ".join(
+                f"{counts[outcome] / count:{width}.1%}"
+                for outcome, width in ((REJECTED, 9), (CONFLICT, 9), (ERROR, 7))
+            )
+            lines.append(
+                f"{name:48} {count:7d} {percentiles} "
+                f"{(latencies[-1] if count else 0) * 1e3:8.1f} {rates}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,320 @@
+"""
+Replay the requests in the API's logs, or in a recorded request file, against
+a running server or directly against ``GhostService``, keeping the original
+timing between requests.
+
+Traffic can be scaled up by replaying several copies of each room at once, and
+sped up or slowed down. Each replay uses fresh room codes, so it can be run
+repeatedly against the same table.
+
+Run with ``python -m benchmarks.replay LOG_FILE``. Log lines are the JSON
+records written by ``ghost_api.logging``, optionally prefixed, e.g. by
+CloudWatch. A recorded request file has one JSON object per line with a
+``time`` in seconds and the fields of a ``benchmarks.load.Request``.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, parse_obj_as
+
+from benchmarks.load import (
+    SERVICE_ROUTES,
+    Client,
+    LoadStats,
+    Request,
+    new_client,
+    percentile,
+)
+from ghost_api.types import (
+    BatchAction,
+    ChallengeResponse,
+    ChallengeVote,
+    Move,
+    NewChallenge,
+    Player,
+)
+
+#: Field of the request log of each route holding its body, and the body's type
+LOGGED_BODIES: Dict[str, Tuple[str, Type[BaseModel]]] = {
+    "/game/{room_code}/move": ("move", Move),
+    "/game/{room_code}/player": ("player", Player),
+    "/game/{room_code}/challenge": ("challenge", NewChallenge),
+    "/game/{room_code}/challenge-response": ("challenge_response", ChallengeResponse),
+    "/game/{room_code}/challenge-vote": ("vote", ChallengeVote),
+}
+
+
+@dataclass
+class TimedRequest:
+    #: Time the request was originally made, in seconds
+    time: float
+
+    request: Request
+
+
+def _camel_body(value: object, model: Type[BaseModel]) -> object:
+    return json.loads(model.parse_obj(value).json(by_alias=True))
+
+
+def _logged_request(record: dict, room_codes: List[str]) -> Optional[Request]:
+    """
+    The request described by a request log record, or None if the record isn't
+    a request log
+    """
+    method, _, route = str(record.get("message", "")).partition(" ")
+    if (method, route) not in SERVICE_ROUTES:
+        return None
+
+    request = Request(method, route)
+    for name in ("room_code", "player_name"):
+        if name in record:
+            request.path_params[name] = record[name]
+
+    if route in LOGGED_BODIES:
+        name, model = LOGGED_BODIES[route]
+        request.body = _camel_body(record[name], model)
+    elif route == "/game/{room_code}/batch":
+        actions = parse_obj_as(List[BatchAction], record["actions"])
+        request.body = [json.loads(action.json(by_alias=True)) for action in actions]
+    elif route == "/game/{room_code}" and method == "GET":
+        if record.get("fields") is not None:
+            request.query["fields"] = record["fields"]
+    elif route == "/games":
+        # Cursors of the original requests can't be used again
+        request.query["started"] = "false"
+    elif route == "/games/query":
+        # Only the number of room codes is logged, so recently seen rooms are
+        # queried instead
+        request.body = {"roomCodes": room_codes[-record["room_codes"] :]}
+    return request
+
+
+def _timestamp(value: object) -> float:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)  # type: ignore
+
+
+def parse_requests(lines: Iterable[str]) -> List[TimedRequest]:
+    """
+    Parse the requests in request logs or a recorded request file, in the
+    order they were made. Lines that aren't requests are skipped.
+    """
+    requests = []
+    room_codes: List[str] = []
+    for line in lines:
+        start = line.find("{")
+        if start < 0:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if not isinstance(record, dict) or "time" not in record:
+            continue
+
+        if "route" in record:
+            request: Optional[Request] = Request(
+                method=record["method"],
+                route=record["route"],
+                path_params=record.get("path_params", {}),
+                body=record.get("body"),
+                query=record.get("query", {}),
+            )
+        else:
+            request = _logged_request(record, room_codes)
+        if request is None:
+            continue
+
+        if request.room_code is not None and request.room_code not in room_codes:
+            room_codes.append(request.room_code)
+        requests.append(TimedRequest(_timestamp(record["time"]), request))
+
+    requests.sort(key=lambda timed: timed.time)
+    return requests
+
+
+def _copy_request(request: Request, room_code_map: Dict[str, str]) -> Request:
+    path_params = dict(request.path_params)
+    if request.room_code is not None:
+        path_params["room_code"] = room_code_map[request.room_code]
+    body = request.body
+    if request.route == "/games/query":
+        body = {
+            "roomCodes": [
+                room_code_map[room_code]
+                for room_code in body["roomCodes"]
+                if room_code in room_code_map
+            ]
+        }
+    return Request(request.method, request.route, path_params, body, request.query)
+
+
+def scale_requests(
+    requests: List[TimedRequest], copies: int, rooms: Optional[int] = None
+) -> List[TimedRequest]:
+    """
+    Make ``copies`` copies of every room in the requests, each with its own
+    fresh room code, keeping the first ``rooms`` rooms if given. Requests that
+    aren't for a room are copied as they are.
+    """
+    original_rooms: List[str] = []
+    for timed in requests:
+        room_code = timed.request.room_code
+        if room_code is not None and room_code not in original_rooms:
+            original_rooms.append(room_code)
+    if rooms is not None:
+        original_rooms = original_rooms[:rooms]
+    kept = set(original_rooms)
+
+    run = uuid.uuid4().hex[:6]
+    scaled = []
+    for copy in range(copies):
+        room_code_map = {
+            room_code: f"{room_code}-{run}-{copy}" for room_code in original_rooms
+        }
+        for timed in requests:
+            room_code = timed.request.room_code
+            if room_code is not None and room_code not in kept:
+                continue
+            scaled.append(
+                TimedRequest(timed.time, _copy_request(timed.request, room_code_map))
+            )
+
+    scaled.sort(key=lambda timed: timed.time)
+    return scaled
+
+
+def missing_rooms(requests: List[TimedRequest]) -> List[str]:
+    """
+    Rooms whose first request isn't creating them, because they were created
+    before the requests were logged
+    """
+    seen = set()
+    missing = []
+    for timed in requests:
+        request = timed.request
+        room_code = request.room_code
+        if room_code is None or room_code in seen:
+            continue
+        seen.add(room_code)
+        if (request.method, request.route) != ("POST", "/game/{room_code}"):
+            missing.append(room_code)
+    return missing
+
+
+def replay(
+    client: Client,
+    requests: List[TimedRequest],
+    speed: float = 1,
+    workers: int = 32,
+    ordered: bool = True,
+) -> Tuple[LoadStats, List[float]]:
+    """
+    Make the requests at their original times relative to the first one,
+    divided by ``speed``, from a pool of ``workers`` threads.
+
+    If ``ordered``, a request to a room waits for the previous request to the
+    same room to finish, so requests are made in the order they were logged
+    even if they take longer than they originally did.
+
+    Returns the stats of the requests, and how far behind its scheduled time
+    each request was started, in seconds.
+    """
+    stats = LoadStats()
+    lags: List[float] = []
+    lags_lock = threading.Lock()
+    if len(requests) == 0:
+        stats.finish()
+        return stats, lags
+
+    def make(request: Request, due: float, previous: Optional[Future]) -> None:
+        if previous is not None:
+            # Submitted earlier, so it's already running
+            previous.result()
+        lag = time.perf_counter() - due
+        with lags_lock:
+            lags.append(lag)
+        stats.record(request, client.request(request))
+
+    last_requests: Dict[str, Future] = {}
+    first = requests[0].time
+    with ThreadPoolExecutor(workers, initializer=client.warm_up) as executor:
+        start = time.perf_counter()
+        for timed in requests:
+            due = start + (timed.time - first) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            room_code = timed.request.room_code
+            previous = None
+            if ordered and room_code is not None:
+                previous = last_requests.get(room_code)
+            future = executor.submit(make, timed.request, due, previous)
+            if room_code is not None:
+                last_requests[room_code] = future
+    stats.finish()
+    return stats, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "log_file", help="Request logs or a recorded request file, or - for stdin"
+    )
+    parser.add_argument(
+        "--url",
+        help="URL of a running server. Requests are made on GhostService if unset.",
+    )
+    parser.add_argument(
+        "--copies", type=int, default=1, help="Copies of each room to replay at once"
+    )
+    parser.add_argument("--rooms", type=int, help="Number of rooms to replay")
+    parser.add_argument(
+        "--speed", type=float, default=1, help="Factor to speed up the timing by"
+    )
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="Let requests to the same room overlap if they take longer than logged",
+    )
+    args = parser.parse_args()
+
+    if args.log_file == "-":
+        requests = parse_requests(sys.stdin)
+    else:
+        with open(args.log_file) as f:
+            requests = parse_requests(f)
+    requests = scale_requests(requests, args.copies, args.rooms)
+
+    client = new_client(args.url)
+    for room_code in missing_rooms(requests):
+        client.request(Request("POST", "/game/{room_code}", {"room_code": room_code}))
+
+    print(f"Replaying {len(requests)} requests...")
+    stats, lags = replay(
+        client, requests, args.speed, args.workers, ordered=not args.unordered
+    )
+    print(stats.report())
+
+    lags.sort()
+    print()
+    print(
+        f"Schedule lag: p50 {percentile(lags, 0.5) * 1e3:.1f} ms, "
+        f"p99 {percentile(lags, 0.99) * 1e3:.1f} ms. "
+        "A high lag means the replay couldn't keep up, so try more workers."
+    )
+
+
+if __name__ == "__main__":
+    main()
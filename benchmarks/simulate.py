@@ -0,0 +1,411 @@
+"""
+Simulate complete games played by bot players, against a running server or
+directly against ``GhostService``.
+
+Each player is a thread that joins its room, polls the game, and moves,
+challenges, responds to challenges and votes as the game goes on, pausing for
+a random think time between actions. Games grow and end the way real ones do,
+rather than hammering a single route.
+
+Run with ``python -m benchmarks.simulate``. Bots place random letters unless
+given a word list with ``--words``, e.g. ``/usr/share/dict/words``, which they
+use to spell out words and to judge challenges.
+"""
+
+import argparse
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from benchmarks.load import OK, Client, LoadStats, Request, Result, new_client
+from ghost_api.types import (
+    Challenge,
+    ChallengeState,
+    ChallengeType,
+    GameInfo,
+    Move,
+    Position,
+)
+
+#: Letters bots play
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def row_word(moves: List[Move], position: Position, letter: str = "") -> str:
+    """
+    The letters in the unbroken run of the row through ``position``, with
+    ``letter`` played there if it's empty
+    """
+    letters = {
+        move.position.x: move.letter for move in moves if move.position.y == position.y
+    }
+    letters.setdefault(position.x, letter)
+    start = position.x
+    while start - 1 in letters:
+        start -= 1
+    word = ""
+    x = start
+    while x in letters:
+        word += letters[x]
+        x += 1
+    return word.lower()
+
+
+def empty_neighbours(moves: List[Move]) -> List[Position]:
+    """
+    Empty positions next to a played move, or the origin of an empty board
+    """
+    taken = {(move.position.x, move.position.y) for move in moves}
+    if len(taken) == 0:
+        return [Position(x=0, y=0)]
+    neighbours = {
+        (x + dx, y + dy)
+        for x, y in taken
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+    }
+    return [Position(x=x, y=y) for x, y in sorted(neighbours - taken)]
+
+
+class Bot:
+    """
+    Decides the actions of a player, placing random letters and voting at
+    random
+    """
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def move(self, game: GameInfo, name: str) -> Move:
+        position = self.rng.choice(empty_neighbours(game.moves))
+        return Move(
+            player_name=name, position=position, letter=self.rng.choice(LETTERS)
+        )
+
+    def challenge_type(self, game: GameInfo) -> Optional[ChallengeType]:
+        """
+        The type of challenge to issue on the last move, or None to play a move
+        """
+        if self.rng.random() < 0.1:
+            return self.rng.choice(list(ChallengeType))
+        return None
+
+    def respond(self, challenge: Challenge) -> str:
+        """
+        A word containing the challenged move
+        """
+        return challenge.move.letter + "".join(self.rng.choices(LETTERS, k=4))
+
+    def vote(self, game: GameInfo, challenge: Challenge) -> bool:
+        """
+        If the bot is in favour of the challenge
+        """
+        return self.rng.random() < 0.5
+
+
+class WordList:
+    """
+    Words bots play, with the prefixes of them that can still be extended
+    """
+
+    def __init__(self, words: List[str]):
+        self.words = words
+        self.word_set = set(words)
+        self.prefixes = {word[:i] for word in words for i in range(len(word))}
+
+    @classmethod
+    def load(cls, path: str) -> "WordList":
+        """
+        Load lowercase words of at least 3 letters from a file with one word
+        per line
+        """
+        with open(path) as f:
+            words = (line.strip().lower() for line in f)
+            return cls(
+                [
+                    word
+                    for word in words
+                    if len(word) >= 3 and word.isalpha() and word.isascii()
+                ]
+            )
+
+
+class WordBot(Bot):
+    """
+    Spells out words from a word list along rows, and challenges and votes on
+    whether rows spell words
+    """
+
+    def __init__(self, rng: random.Random, words: WordList):
+        super().__init__(rng)
+        self.words = words
+
+    def move(self, game: GameInfo, name: str) -> Move:
+        positions = empty_neighbours(game.moves)
+        self.rng.shuffle(positions)
+        for position in positions:
+            letters = list(LETTERS)
+            self.rng.shuffle(letters)
+            for letter in letters:
+                # Avoid completing a word, which can be challenged
+                if row_word(game.moves, position, letter) in self.words.prefixes:
+                    return Move(player_name=name, position=position, letter=letter)
+        return super().move(game, name)
+
+    def challenge_type(self, game: GameInfo) -> Optional[ChallengeType]:
+        word = row_word(game.moves, game.moves[-1].position)
+        if word in self.words.word_set:
+            return ChallengeType.COMPLETE_WORD
+        if word not in self.words.prefixes:
+            return ChallengeType.NO_VALID_WORDS
+        return None
+
+    def respond(self, challenge: Challenge) -> str:
+        letter = challenge.move.letter.lower()
+        candidates = [word for word in self.words.words if letter in word]
+        if len(candidates) == 0:
+            return super().respond(challenge)
+        return self.rng.choice(candidates)
+
+    def vote(self, game: GameInfo, challenge: Challenge) -> bool:
+        if challenge.type is ChallengeType.COMPLETE_WORD:
+            word = row_word(game.moves, challenge.move.position)
+            return word in self.words.word_set
+        assert challenge.response is not None
+        return challenge.response.row_word not in self.words.word_set
+
+
+@dataclass
+class Settings:
+    #: Players in each room
+    players: int
+
+    #: Mean time a player waits between actions, in seconds
+    think_seconds: float
+
+    #: Moves after which a game is abandoned if nobody has won
+    max_moves: int
+
+    #: Time after which a game is abandoned, e.g. if it's stuck after an error
+    max_seconds: float
+
+    #: Word list for bots, or None for bots that play at random
+    words: Optional[WordList]
+
+
+@dataclass
+class GameSummary:
+    room_code: str
+
+    #: If the game was won, rather than abandoned
+    won: bool
+
+    #: Moves played
+    moves: int
+
+    #: Time taken, in seconds
+    seconds: float
+
+
+class Room:
+    """
+    A game played by bots, making requests with a client
+    """
+
+    def __init__(
+        self, client: Client, stats: LoadStats, room_code: str, settings: Settings
+    ):
+        self.client = client
+        self.stats = stats
+        self.room_code = room_code
+        self.settings = settings
+        self.names = [f"bot{i}" for i in range(settings.players)]
+        self.rng = random.Random()
+        self.done = threading.Event()
+        self.deadline = time.monotonic() + settings.max_seconds
+
+    def _request(self, method: str, route: str, body: object = None) -> Result:
+        request = Request(method, route, {"room_code": self.room_code}, body)
+        result = self.client.request(request)
+        self.stats.record(request, result)
+        return result
+
+    def _think(self) -> None:
+        if self.settings.think_seconds > 0:
+            self.done.wait(self.rng.expovariate(1 / self.settings.think_seconds))
+
+    def _new_bot(self) -> Bot:
+        rng = random.Random(self.rng.random())
+        if self.settings.words is None:
+            return Bot(rng)
+        return WordBot(rng, self.settings.words)
+
+    def _read_game(self) -> Optional[GameInfo]:
+        result = self._request("GET", "/game/{room_code}")
+        return result.game() if result.outcome == OK else None
+
+    def play(self) -> GameSummary:
+        start = time.perf_counter()
+        self._request("POST", "/game/{room_code}")
+        with ThreadPoolExecutor(len(self.names)) as executor:
+            players = [executor.submit(self._play_player, name) for name in self.names]
+        for player in players:
+            player.result()
+        game = self._read_game()
+        return GameSummary(
+            self.room_code,
+            won=game is not None and game.winner is not None,
+            moves=len(game.moves) if game is not None else 0,
+            seconds=time.perf_counter() - start,
+        )
+
+    def _play_player(self, name: str) -> None:
+        bot = self._new_bot()
+        try:
+            while not self.done.is_set():
+                self._think()
+                game = self._read_game()
+                if game is not None:
+                    self._act(game, name, bot)
+        finally:
+            # Every player stops once one of them sees the game is over
+            self.done.set()
+
+    def _act(self, game: GameInfo, name: str, bot: Bot) -> None:
+        if (
+            game.winner is not None
+            or len(game.moves) >= self.settings.max_moves
+            or time.monotonic() > self.deadline
+        ):
+            self.done.set()
+            return
+        if name in [player.name for player in game.losers]:
+            # Players who lost a challenge are out, but the others carry on
+            self.done.wait()
+            return
+        if name not in [player.name for player in game.players]:
+            # Join, again if a concurrent join won the race
+            if not game.started:
+                self._request(
+                    "POST",
+                    "/game/{room_code}/player",
+                    {"name": name, "imageUrl": f"https://example.com/{name}.png"},
+                )
+            return
+
+        if not game.started:
+            # The first player starts the game once everyone has joined
+            if name == self.names[0] and len(game.players) == len(self.names):
+                self._request("POST", "/game/{room_code}/start")
+            return
+
+        challenge = game.challenge
+        if challenge is not None:
+            if challenge.state is ChallengeState.AWAITING_RESPONSE:
+                if challenge.move.player_name == name:
+                    word = bot.respond(challenge)
+                    self._request(
+                        "POST",
+                        "/game/{room_code}/challenge-response",
+                        {"rowWord": word, "colWord": word},
+                    )
+            elif name not in [vote.voter_name for vote in challenge.votes]:
+                self._request(
+                    "POST",
+                    "/game/{room_code}/challenge-vote",
+                    {"voterName": name, "proChallenge": bot.vote(game, challenge)},
+                )
+            return
+
+        if game.turn_player_name != name:
+            return
+
+        if len(game.moves) > 0 and game.moves[-1].player_name != name:
+            challenge_type = bot.challenge_type(game)
+            if challenge_type is not None:
+                self._request(
+                    "POST",
+                    "/game/{room_code}/challenge",
+                    {
+                        "challengerName": name,
+                        "move": game.moves[-1].dict(by_alias=True),
+                        "type": challenge_type.value,
+                    },
+                )
+                return
+
+        move = bot.move(game, name)
+        self._request("POST", "/game/{room_code}/move", move.dict(by_alias=True))
+
+
+def simulate(
+    client: Client, games: int, rooms: int, settings: Settings
+) -> Tuple[LoadStats, List[GameSummary]]:
+    """
+    Play ``games`` games, ``rooms`` at a time
+    """
+    stats = LoadStats()
+    run = uuid.uuid4().hex[:6]
+    with ThreadPoolExecutor(rooms) as executor:
+        summaries = list(
+            executor.map(
+                lambda i: Room(client, stats, f"SIM-{run}-{i}", settings).play(),
+                range(games),
+            )
+        )
+    stats.finish()
+    return stats, summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--url",
+        help="URL of a running server. Requests are made on GhostService if unset.",
+    )
+    parser.add_argument("--games", type=int, default=10, help="Games to play")
+    parser.add_argument("--rooms", type=int, default=10, help="Games played at once")
+    parser.add_argument("--players", type=int, default=4, help="Players per room")
+    parser.add_argument(
+        "--think-ms", type=float, default=200, help="Mean think time between actions"
+    )
+    parser.add_argument(
+        "--max-moves", type=int, default=200, help="Moves before a game is abandoned"
+    )
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=300,
+        help="Time before a game is abandoned",
+    )
+    parser.add_argument("--words", help="Word list for bots, one word per line")
+    args = parser.parse_args()
+
+    settings = Settings(
+        players=args.players,
+        think_seconds=args.think_ms / 1e3,
+        max_moves=args.max_moves,
+        max_seconds=args.max_seconds,
+        words=WordList.load(args.words) if args.words is not None else None,
+    )
+    client = new_client(args.url)
+
+    print(f"Playing {args.games} games, {args.rooms} at a time...")
+    stats, summaries = simulate(client, args.games, args.rooms, settings)
+    print(stats.report())
+
+    won = [summary for summary in summaries if summary.won]
+    moves = sorted(summary.moves for summary in summaries)
+    print()
+    print(f"{len(won)} of {len(summaries)} games won, the rest abandoned")
+    median = moves[len(moves) // 2]
+    print(f"Moves per game: min {moves[0]}, median {median}, max {moves[-1]}")
+    seconds = sum(summary.seconds for summary in summaries) / len(summaries)
+    print(f"Mean game length: {seconds:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
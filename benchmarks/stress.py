@@ -0,0 +1,330 @@
+"""
+Stress the conditional writes of a single room with many concurrent requests,
+then check that the game is still consistent.
+
+Each round fills a fresh room with concurrent joins, plays moves with every
+thread acting as the turn player and aiming for the same free position, and
+has every player vote on a challenge at once. Requests that lose a conditional
+write are retried. Afterwards the game is checked for duplicate players or
+positions, moves out of turn order, and challenges with more votes than
+players or that were never resolved.
+
+Run with ``python -m benchmarks.stress``, against a running server with
+``--url`` or directly against ``GhostService``. Exits with an error if any
+invariant was broken.
+"""
+
+import argparse
+import sys
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, TypeVar
+
+from benchmarks.load import (
+    CONFLICT,
+    ERROR,
+    OK,
+    Client,
+    LoadStats,
+    Request,
+    Result,
+    new_client,
+)
+from ghost_api.types import GameInfo
+
+T = TypeVar("T")
+
+#: Width of the board moves are placed on, filling rows in order
+BOARD_WIDTH = 10
+
+
+class Room:
+    """
+    A room being stressed, recording the requests made to it and the
+    invariants its game breaks
+    """
+
+    def __init__(
+        self, client: Client, stats: LoadStats, room_code: str, max_retries: int
+    ):
+        self.client = client
+        self.stats = stats
+        self.room_code = room_code
+        self.max_retries = max_retries
+        self.violations: List[str] = []
+        self.attempts = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def request(
+        self, method: str, route: str, body: Any = None, retry: bool = True
+    ) -> Result:
+        """
+        Make a request, retrying it while it loses conditional writes if
+        ``retry``
+        """
+        request = Request(method, route, {"room_code": self.room_code}, body)
+        for attempt in range(self.max_retries + 1 if retry else 1):
+            result = self.client.request(request)
+            self.stats.record(request, result)
+            with self._lock:
+                self.attempts += 1
+                self.retries += attempt > 0
+            if result.outcome not in (CONFLICT, ERROR):
+                break
+        return result
+
+    def count_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def read_game(self) -> GameInfo:
+        result = self.request("GET", "/game/{room_code}")
+        if result.outcome != OK:
+            raise RuntimeError(f"Couldn't read game {self.room_code!r}: {result}")
+        return result.game()
+
+    def check(self, condition: bool, message: str) -> None:
+        if not condition:
+            self.violations.append(f"{self.room_code}: {message}")
+
+
+def _concurrently(workers: int, task: Callable[[int], T], count: int) -> List[T]:
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [executor.submit(task, i) for i in range(count)]
+        return [future.result() for future in futures]
+
+
+def join(room: Room, players: int, workers: int) -> GameInfo:
+    """
+    Have every player join at once, then check each player whose join
+    succeeded joined exactly once
+    """
+    names = [f"player{i}" for i in range(players)]
+    results = _concurrently(
+        workers,
+        lambda i: room.request(
+            "POST",
+            "/game/{room_code}/player",
+            {"name": names[i], "imageUrl": f"https://example.com/{names[i]}.png"},
+        ),
+        players,
+    )
+
+    game = room.read_game()
+    joined = Counter(player.name for player in game.players)
+    duplicates = sorted(name for name, count in joined.items() if count > 1)
+    room.check(len(duplicates) == 0, f"players joined more than once: {duplicates}")
+    succeeded = {name for name, result in zip(names, results) if result.outcome == OK}
+    missing = sorted(succeeded - set(joined))
+    room.check(len(missing) == 0, f"successful joins were lost: {missing}")
+    room.check(
+        game.turn_player_name in joined,
+        f"turn player {game.turn_player_name!r} hasn't joined",
+    )
+    return game
+
+
+def play(room: Room, moves: int, workers: int) -> GameInfo:
+    """
+    Play moves with every thread acting as the turn player and placing its
+    move on the first free position, then check positions are unique and
+    moves were made in turn
+    """
+    room.request("POST", "/game/{room_code}/start")
+    start = room.read_game()
+    if start.turn_player_name is None:
+        room.check(False, "no turn player after joining")
+        return start
+    players = [player.name for player in start.players]
+    first_turn = players.index(start.turn_player_name)
+    budget = threading.Semaphore(moves * 10)
+    played = threading.Event()
+
+    def mover(_: int) -> None:
+        conflicted = False
+        while not played.is_set() and budget.acquire(blocking=False):
+            game = room.read_game()
+            if len(game.moves) >= moves:
+                played.set()
+                return
+            if conflicted:
+                room.count_retry()
+            taken = {(move.position.x, move.position.y) for move in game.moves}
+            x, y = next(
+                (i % BOARD_WIDTH, i // BOARD_WIDTH)
+                for i in range(len(taken) + 1)
+                if (i % BOARD_WIDTH, i // BOARD_WIDTH) not in taken
+            )
+            # Retried by reading the game again, as the turn player and free
+            # positions change when another move wins
+            result = room.request(
+                "POST",
+                "/game/{room_code}/move",
+                {
+                    "playerName": game.turn_player_name,
+                    "position": {"x": x, "y": y},
+                    "letter": "g",
+                },
+                retry=False,
+            )
+            conflicted = result.outcome in (CONFLICT, ERROR)
+
+    _concurrently(workers, mover, workers)
+
+    game = room.read_game()
+    positions = Counter((move.position.x, move.position.y) for move in game.moves)
+    duplicates = sorted(position for position, count in positions.items() if count > 1)
+    room.check(len(duplicates) == 0, f"positions played more than once: {duplicates}")
+    for i, move in enumerate(game.moves):
+        expected = players[(first_turn + i) % len(players)]
+        if move.player_name != expected:
+            room.check(
+                False,
+                f"move {i} was made by {move.player_name!r}, not {expected!r}",
+            )
+            break
+    expected_turn = players[(first_turn + len(game.moves)) % len(players)]
+    room.check(
+        game.turn_player_name == expected_turn,
+        f"turn player is {game.turn_player_name!r} after {len(game.moves)} moves, "
+        f"not {expected_turn!r}",
+    )
+    return game
+
+
+def vote(room: Room, workers: int) -> Optional[GameInfo]:
+    """
+    Challenge the last move and have every player vote at once, then check
+    the challenge was resolved once, with no more votes than players
+    """
+    game = room.read_game()
+    if len(game.moves) == 0:
+        return None
+    challenger = next(
+        player.name
+        for player in game.players
+        if player.name != game.moves[-1].player_name
+    )
+    room.request(
+        "POST",
+        "/game/{room_code}/challenge",
+        {
+            "challengerName": challenger,
+            "move": game.moves[-1].dict(by_alias=True),
+            "type": "COMPLETE_WORD",
+        },
+    )
+    players = [player.name for player in game.players]
+    results = _concurrently(
+        workers,
+        lambda i: room.request(
+            "POST",
+            "/game/{room_code}/challenge-vote",
+            {"voterName": players[i], "proChallenge": i % 2 == 0},
+        ),
+        len(players),
+    )
+
+    after = room.read_game()
+    if after.challenge is not None:
+        voters = [vote.voter_name for vote in after.challenge.votes]
+        room.check(
+            len(voters) <= len(players),
+            f"{len(voters)} votes on a challenge in a game of {len(players)} players",
+        )
+        room.check(len(set(voters)) == len(voters), f"players voted twice: {voters}")
+        succeeded = [
+            name for name, result in zip(players, results) if result.outcome == OK
+        ]
+        room.check(
+            set(succeeded) <= set(voters),
+            f"successful votes were lost: {sorted(set(succeeded) - set(voters))}",
+        )
+        room.check(
+            len(voters) < len(players), "challenge has every vote but wasn't resolved"
+        )
+    else:
+        room.check(
+            len(after.losers) == len(game.losers) + 1,
+            f"challenge resolved with {len(after.losers) - len(game.losers)} losers",
+        )
+        names = [player.name for player in after.players + after.losers]
+        room.check(
+            sorted(names) == sorted(players),
+            f"players and losers {names} don't match the players {players}",
+        )
+    return after
+
+
+def stress_room(
+    client: Client,
+    stats: LoadStats,
+    players: int,
+    moves: int,
+    workers: int,
+    max_retries: int,
+) -> Room:
+    room = Room(client, stats, f"STRESS-{uuid.uuid4().hex[:8]}", max_retries)
+    room.request("POST", "/game/{room_code}")
+    join(room, players, workers)
+    play(room, moves, workers)
+    vote(room, workers)
+    return room
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--url",
+        help="URL of a running server. Requests are made on GhostService if unset.",
+    )
+    parser.add_argument("--rounds", type=int, default=5, help="Rooms to stress")
+    parser.add_argument("--players", type=int, default=8, help="Players per room")
+    parser.add_argument("--moves", type=int, default=50, help="Moves per room")
+    parser.add_argument(
+        "--workers", type=int, default=16, help="Threads making requests at once"
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help="Times a request that lost a conditional write is retried",
+    )
+    args = parser.parse_args()
+
+    client = new_client(args.url)
+    stats = LoadStats()
+    rooms = []
+    for _ in range(args.rounds):
+        rooms.append(
+            stress_room(
+                client,
+                stats,
+                args.players,
+                args.moves,
+                args.workers,
+                args.max_retries,
+            )
+        )
+    stats.finish()
+
+    print(stats.report())
+    attempts = sum(room.attempts for room in rooms)
+    retries = sum(room.retries for room in rooms)
+    print()
+    print(f"Retried {retries} of {attempts} requests ({retries / attempts:.1%})")
+
+    violations = [violation for room in rooms for violation in room.violations]
+    if len(violations) > 0:
+        print(f"FAIL: {len(violations)} invariants were broken:")
+        for violation in violations:
+            print(f"  {violation}")
+        sys.exit(1)
+    print("All invariants held")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+Benchmark the hot paths of the API at increasing game sizes, saving the
+results as a JSON baseline that later runs can be compared against.
+
+Cases cover every ``GhostService`` method, the full HTTP round trip of the
+busiest routes through ``TestClient``, and parsing and serializing a
+``GameInfo``. The service and API cases need the games table, e.g. in the
+local DynamoDB instance. The cost of each extra move is worked out from the
+largest and smallest games, so growth in per-move cost shows up even when it
+is small next to the cost of a request.
+
+Run with ``python -m benchmarks.suite run --output RESULTS`` and compare two
+runs with ``python -m benchmarks.suite compare BASELINE RESULTS``.
+"""
+
+import argparse
+import json
+import platform
+import re
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.games import example_game
+from benchmarks.load import percentile
+from ghost_api.rendering import render_game
+from ghost_api.storage import decode_game, encode_game
+from ghost_api.types import (
+    BatchAction,
+    BatchActionType,
+    ChallengeResponse,
+    ChallengeState,
+    ChallengeType,
+    ChallengeVote,
+    GameInfo,
+    Move,
+    NewChallenge,
+    Player,
+    Position,
+)
+
+#: Numbers of moves in the games benchmarked
+GAME_SIZES = [0, 50, 500]
+
+#: Groups of cases, and the default number of timed calls of each case
+GROUPS: Dict[str, int] = {"service": 20, "api": 20, "serialization": 200}
+
+#: Default slowdown of a case, as a fraction, reported as a regression
+REGRESSION_THRESHOLD = 0.25
+
+#: Suffix of the names of the derived cost of each extra move in a case
+PER_MOVE = " per move"
+
+
+@dataclass
+class Case:
+    """
+    A call to benchmark
+    """
+
+    #: Name of the case, e.g. ``service.add_move[50]`` for 50 moves
+    name: str
+
+    #: The call that is timed
+    call: Callable[[], Any]
+
+    #: Called before each timed call, e.g. to reset the game it changes
+    setup: Callable[[], Any] = lambda: None
+
+
+def measure(case: Case, iterations: int) -> Dict[str, float]:
+    """
+    Time calls of a case, after an untimed warm-up call
+    """
+    case.setup()
+    case.call()
+    times = []
+    for _ in range(iterations):
+        case.setup()
+        start = time.perf_counter()
+        case.call()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "median_us": percentile(times, 0.5) * 1e6,
+        "p90_us": percentile(times, 0.9) * 1e6,
+        "min_us": times[0] * 1e6,
+        "iterations": iterations,
+    }
+
+
+def _game(n_moves: int, started: bool = True, challenge: bool = False) -> GameInfo:
+    """
+    An example game in its own room, with or without an open challenge on the
+    last move
+    """
+    game = example_game(n_moves)
+    game.room_code = f"BENCH-{uuid.uuid4().hex[:8]}"
+    game.started = started
+    if not challenge:
+        game.challenge = None
+    return game
+
+
+def _next_move(game: GameInfo) -> Move:
+    assert game.turn_player_name is not None
+    return Move(
+        player_name=game.turn_player_name,
+        position=Position(x=-1, y=-1),
+        letter="G",
+    )
+
+
+def service_cases(n_moves: int) -> List[Case]:
+    from ghost_api.service import GhostService, _game_item
+
+    service = GhostService()
+
+    def case(method: str, game: GameInfo, call: Callable[[], Any]) -> Case:
+        item = _game_item(game)
+        return Case(
+            f"service.{method}[{n_moves}]",
+            call,
+            lambda: service.games_table.put_item(Item=item),
+        )
+
+    game = _game(n_moves)
+    lobby = _game(n_moves, started=False)
+    room_code = game.room_code
+    new_player = Player(name="newcomer", image_url="https://example.com/new.png")
+
+    cases = [
+        case("read_game", game, lambda: service.read_game(room_code)),
+        case(
+            "read_game_consistent",
+            game,
+            lambda: service.read_game(room_code, consistent=True),
+        ),
+        case(
+            "read_game_fields",
+            game,
+            lambda: service.read_game(room_code, fields=["turn_player_name"]),
+        ),
+        case("read_game_json", game, lambda: service.read_game_json(room_code)),
+        case("read_games", game, lambda: list(service.read_games([room_code]))),
+        case("list_open_games", lobby, lambda: service.list_open_games()),
+        Case(
+            f"service.create_game[{n_moves}]",
+            lambda: service.create_game(room_code),
+            lambda: service.delete_game(room_code),
+        ),
+        case("delete_game", game, lambda: service.delete_game(room_code)),
+        case("start_game", lobby, lambda: service.start_game(lobby.room_code)),
+        case(
+            "add_player",
+            lobby,
+            lambda: service.add_player(lobby.room_code, new_player),
+        ),
+        case(
+            "remove_player",
+            game,
+            lambda: service.remove_player(room_code, game.players[0].name),
+        ),
+        case("add_move", game, lambda: service.add_move(room_code, _next_move(game))),
+        case(
+            "apply_actions",
+            game,
+            lambda: service.apply_actions(
+                room_code,
+                [BatchAction(type=BatchActionType.MOVE, move=_next_move(game))],
+            ),
+        ),
+    ]
+
+    if n_moves > 0:
+        new_challenge = NewChallenge(
+            challenger_name=game.players[0].name,
+            move=game.moves[-1],
+            type=ChallengeType.NO_VALID_WORDS,
+        )
+        awaiting = _game(n_moves, challenge=True)
+        assert awaiting.challenge is not None
+        awaiting.challenge.type = ChallengeType.NO_VALID_WORDS
+        awaiting.challenge.state = ChallengeState.AWAITING_RESPONSE
+        awaiting.challenge.votes = []
+        response = ChallengeResponse(row_word="GHOST", col_word="GHOST")
+        # Every player but the last has voted, so the vote completes it
+        voting = _game(n_moves, challenge=True)
+        vote = ChallengeVote(voter_name=voting.players[-1].name, pro_challenge=True)
+
+        cases += [
+            case(
+                "create_challenge",
+                game,
+                lambda: service.create_challenge(room_code, new_challenge),
+            ),
+            case(
+                "create_challenge_response",
+                awaiting,
+                lambda: service.create_challenge_response(awaiting.room_code, response),
+            ),
+            case(
+                "add_challenge_vote",
+                voting,
+                lambda: service.add_challenge_vote(voting.room_code, vote),
+            ),
+        ]
+
+    return cases
+
+
+def api_cases(n_moves: int) -> List[Case]:
+    from fastapi.testclient import TestClient
+
+    from ghost_api.api import app
+    from ghost_api.service import GhostService, _game_item
+
+    client = TestClient(app)
+    service = GhostService()
+    game = _game(n_moves)
+    item = _game_item(game)
+    move = _next_move(game).dict(by_alias=True)
+
+    def reset() -> None:
+        service.games_table.put_item(Item=item)
+
+    def case(route: str, method: str, path: str, **kwargs: Any) -> Case:
+        def call() -> None:
+            response = client.request(method, path, **kwargs)
+            assert response.status_code < 300, response.text
+
+        return Case(f"api.{method} {route}[{n_moves}]", call, reset)
+
+    path = f"/game/{game.room_code}"
+    return [
+        case("/game/{room_code}", "GET", path),
+        case(
+            "/game/{room_code}?fields",
+            "GET",
+            path,
+            params={"fields": "turnPlayerName"},
+        ),
+        case("/game/{room_code}/move", "POST", f"{path}/move", json=move),
+        case(
+            "/games/query",
+            "POST",
+            "/games/query",
+            json={"roomCodes": [game.room_code]},
+        ),
+    ]
+
+
+def serialization_cases(n_moves: int) -> List[Case]:
+    game = example_game(n_moves)
+    body = game.json(by_alias=True)
+    item = encode_game(game)
+    return [
+        Case(f"serialization.parse[{n_moves}]", lambda: GameInfo.parse_raw(body)),
+        Case(f"serialization.serialize[{n_moves}]", lambda: game.json(by_alias=True)),
+        Case(f"serialization.render_game[{n_moves}]", lambda: render_game(game)),
+        Case(f"serialization.encode_game[{n_moves}]", lambda: encode_game(game)),
+        Case(f"serialization.decode_game[{n_moves}]", lambda: decode_game(item)),
+    ]
+
+
+#: Cases of each group, for a number of moves
+GROUP_CASES: Dict[str, Callable[[int], List[Case]]] = {
+    "service": service_cases,
+    "api": api_cases,
+    "serialization": serialization_cases,
+}
+
+
+def per_move_costs(results: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    """
+    The median cost of each extra move in the cases run at the largest game
+    size, from the difference to the smallest size they were run at, in
+    microseconds
+    """
+    largest = max(GAME_SIZES)
+    costs = {}
+    for name, result in results.items():
+        match = re.fullmatch(rf"(.*)\[{largest}\]", name)
+        if match is None:
+            continue
+        case = match.group(1)
+        # Some cases, like challenges, can't be run without moves
+        smallest = min(n for n in GAME_SIZES if f"{case}[{n}]" in results)
+        if smallest == largest:
+            continue
+        base = results[f"{case}[{smallest}]"]
+        costs[case + PER_MOVE] = (result["median_us"] - base["median_us"]) / (
+            largest - smallest
+        )
+    return costs
+
+
+def run_cases(
+    groups: List[str], iterations: Optional[int], pattern: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Run the cases of the given groups whose names match ``pattern``, returning
+    the results to save
+    """
+    results = {}
+    for group in groups:
+        for n_moves in GAME_SIZES:
+            for case in GROUP_CASES[group](n_moves):
+                if pattern is not None and re.search(pattern, case.name) is None:
+                    continue
+                result = measure(case, iterations or GROUPS[group])
+                results[case.name] = result
+                print(f"{case.name:56} {result['median_us']:12.1f} us", flush=True)
+
+    for name, cost in per_move_costs(results).items():
+        results[name] = {"median_us": cost}
+        print(f"{name:56} {cost:12.3f} us")
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(
+    baseline: Dict[str, Any], results: Dict[str, Any], threshold: float
+) -> List[str]:
+    """
+    Print how the median of each case changed from the baseline, returning
+    the cases that are slower by more than ``threshold``
+    """
+    regressions = []
+    base_results = baseline["results"]
+    new_results = results["results"]
+    print(f"{'case':56} {'baseline':>12} {'new':>12} {'change':>8}")
+    for name in sorted(set(base_results) | set(new_results)):
+        if name not in base_results or name not in new_results:
+            missing = "baseline" if name not in base_results else "results"
+            print(f"{name:56} not in {missing}")
+            continue
+        before = base_results[name]["median_us"]
+        after = new_results[name]["median_us"]
+        scale = before
+        if name.endswith(PER_MOVE):
+            # Per-move costs can be close to zero, so changes in them are
+            # relative to the mean cost per move of the largest game
+            largest = name[: -len(PER_MOVE)] + f"[{max(GAME_SIZES)}]"
+            scale = base_results[largest]["median_us"] / max(GAME_SIZES)
+        change = (after - before) / scale
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:56} {before:12.1f} {after:12.1f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument(
+        "--output", default="benchmark-results.json", help="File to save results in"
+    )
+    run_parser.add_argument(
+        "--group",
+        action="append",
+        choices=list(GROUPS),
+        help="Group of cases to run, or all if not given. Can be repeated.",
+    )
+    run_parser.add_argument("--filter", help="Only run cases matching a regex")
+    run_parser.add_argument(
+        "--iterations", type=int, help="Timed calls of each case, instead of defaults"
+    )
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare results against a baseline"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("results")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        help="Slowdown, as a fraction, that fails the comparison",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_cases(args.group or list(GROUPS), args.iterations, args.filter)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.results) as f:
+            results = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        if len(regressions) > 0:
+            print(f"FAIL: {len(regressions)} cases are slower than the baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
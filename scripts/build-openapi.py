@@ -0,0 +1,20 @@
+import sys
+from pathlib import Path
+
+from ghost_api.api import app
+from ghost_api.openapi import OPENAPI_SCHEMA_PATH, build_openapi_schema
+
+
+def build_openapi(path: Path = OPENAPI_SCHEMA_PATH):
+    """
+    Build the OpenAPI schema of the API as a static artifact, which is served
+    instead of generating the schema at runtime when GHOST_STATIC_OPENAPI=1.
+
+    Rebuild it whenever the routes or models change, before deploying.
+    """
+    build_openapi_schema(app, path)
+    print(f"Wrote OpenAPI schema to {path}")
+
+
+if __name__ == "__main__":
+    build_openapi(*[Path(arg) for arg in sys.argv[1:2]])
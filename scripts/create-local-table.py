@@ -1,4 +1,5 @@
 from ghost_api.constants import GAMES_TABLE_NAME, LOCAL_DYNAMODB_ENDPOINT
+from ghost_api.service import LOBBY_INDEX_NAME
 import boto3
 
 
@@ -28,11 +29,35 @@ def games_table():
                     "AttributeName": "room_code",
                     "AttributeType": "S",
                 },
+                {
+                    "AttributeName": "lobby",
+                    "AttributeType": "S",
+                },
             ],
             ProvisionedThroughput={
                 "ReadCapacityUnits": 100,
                 "WriteCapacityUnits": 100,
             },
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": LOBBY_INDEX_NAME,
+                    "KeySchema": [
+                        {
+                            "AttributeName": "lobby",
+                            "KeyType": "HASH",
+                        },
+                        {
+                            "AttributeName": "room_code",
+                            "KeyType": "RANGE",
+                        },
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                    "ProvisionedThroughput": {
+                        "ReadCapacityUnits": 100,
+                        "WriteCapacityUnits": 100,
+                    },
+                },
+            ],
         )
     except dynamodb_client.exceptions.ResourceInUseException:
         print("Using existing games table")
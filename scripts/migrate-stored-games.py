@@ -0,0 +1,80 @@
+import time
+
+from boto3.dynamodb.conditions import Attr
+
+from ghost_api.constants import GAME_TTL_SECONDS
+from ghost_api.service import LOBBY_OPEN, GhostService
+from ghost_api.storage import decode_game, encode_game
+
+
+def migrate_stored_games():
+    """
+    Rewrite games stored in an old layout, with moves as a list of maps or
+    players with their full image URLs, to the current layout.
+
+    Also backfills attributes that games written before they were added lack:
+    the lobby index key of games that haven't started, so they're listed as
+    open games, and the expiry time, so they're deleted by TTL
+    ``GAME_TTL_SECONDS`` after the migration unless they're played.
+
+    Games that change while being migrated are skipped, and the script can be
+    rerun safely. Games in an old layout are also migrated attribute by
+    attribute as they are played.
+    """
+    games_table = GhostService().games_table
+    conditional_check_failed = (
+        games_table.meta.client.exceptions.ConditionalCheckFailedException
+    )
+
+    migrated = 0
+    skipped = 0
+    scan_kwargs = {}
+    while True:
+        response = games_table.scan(**scan_kwargs)
+        for item in response["Items"]:
+            encoded = encode_game(decode_game(item))
+            attributes = ["moves", "players", "losers", "winner"]
+            changed = [name for name in attributes if item[name] != encoded[name]]
+            values = {name: encoded[name] for name in changed}
+            conditions = [Attr(name).eq(item[name]) for name in changed]
+
+            if not item["started"] and "lobby" not in item:
+                values["lobby"] = LOBBY_OPEN
+                conditions.append(Attr("started").eq(False))
+                conditions.append(Attr("lobby").not_exists())
+            if "expires_at" not in item:
+                now = int(time.time())
+                values["last_activity"] = now
+                values["expires_at"] = now + GAME_TTL_SECONDS
+                conditions.append(Attr("expires_at").not_exists())
+
+            if len(values) == 0:
+                continue
+
+            condition = conditions[0]
+            for other_condition in conditions[1:]:
+                condition = condition & other_condition
+            try:
+                games_table.update_item(
+                    Key={"room_code": item["room_code"]},
+                    UpdateExpression="set "
+                    + ", ".join(f"{name}=:{name}" for name in values),
+                    ExpressionAttributeValues={
+                        f":{name}": value for name, value in values.items()
+                    },
+                    ConditionExpression=condition,
+                )
+            except conditional_check_failed:
+                skipped += 1
+            else:
+                migrated += 1
+
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    print(f"Migrated {migrated} games, skipped {skipped} changed games")
+
+
+if __name__ == "__main__":
+    migrate_stored_games()
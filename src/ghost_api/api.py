@@ -1,35 +1,130 @@
-import hashlib
+import json
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Type,
+    Union,
+)
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.utils import create_cloned_field, create_response_field
 from fastapi_camelcase import CamelModel
 from mangum import Mangum
+from pydantic import BaseModel
+from starlette.routing import request_response
 
+from ghost_api.avatars import default_image_url
+from ghost_api.compression import CompressionMiddleware
+from ghost_api.constants import PROFILING, STATIC_OPENAPI, SWEEP_EXPIRED_GAMES
 from ghost_api.exceptions import (
+    ConcurrentUpdate,
     GameAlreadyExists,
     GameDoesNotExist,
     GameNotStarted,
     GameStarted,
+    GamesUnavailable,
+    InvalidCursor,
     InvalidMove,
+    NoFieldsRequested,
     WrongPlayer,
 )
-from ghost_api.logging import get_logger
-from ghost_api.service import GhostService
+from ghost_api.idempotency import IdempotencyMiddleware
+from ghost_api.logging import get_logger, log_fields, with_log_flush
+from ghost_api.metrics import REGISTRY, MetricsMiddleware
+from ghost_api.negotiation import NegotiatedRoute
+from ghost_api.openapi import use_static_openapi
+from ghost_api.responses import GameInfoResponse
 from ghost_api.types import (
+    BatchAction,
     ChallengeResponse,
     ChallengeVote,
     GameInfo,
+    GamesPage,
+    GamesQuery,
     GuestLogin,
     Move,
     NewChallenge,
+    PartialGameInfo,
     Player,
 )
+from ghost_api.warmup import with_warmup
+
+if TYPE_CHECKING:
+    from ghost_api.service import GhostService
 
 logger = get_logger()
 
+
+def get_service() -> "GhostService":
+    """
+    Get a service for handling a request.
+
+    The service module is imported on first use rather than with the app, as
+    it loads boto3, which is a large part of the cold start time of a Lambda.
+    Requests that don't touch the games table never load it.
+    """
+    from ghost_api.service import GhostService
+
+    return GhostService()
+
+
+#: Clones of response models, shared between routes
+_cloned_types: Dict[Type[BaseModel], Type[BaseModel]] = {}
+
+
+class GhostRoute(NegotiatedRoute):
+    """
+    Route that shares the clone of its response model with other routes.
+
+    FastAPI clones the response model of each route as it's added, which was
+    most of the time taken to import this module, as every game route clones
+    the whole GameInfo model. The clones of a model are identical, so they're
+    shared between routes, as newer FastAPI versions do.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        endpoint: Callable[..., Any],
+        *,
+        response_model: Optional[Type[Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        # The response model is left out so it isn't cloned, then set here
+        super().__init__(path, endpoint, **kwargs)
+        if response_model is None:
+            return
+
+        self.response_model = response_model
+        self.response_field = create_response_field(
+            name="Response_" + self.unique_id, type_=response_model
+        )
+        self.secure_cloned_response_field = create_cloned_field(
+            self.response_field, cloned_types=_cloned_types
+        )
+        self.app = request_response(self.get_route_handler())
+
+
 app = FastAPI()
 
+# Routes accept and return MessagePack as well as JSON
+app.router.route_class = GhostRoute
+
+# Retried POST and DELETE requests with an Idempotency-Key header get the
+# original response rather than being executed again
+app.add_middleware(IdempotencyMiddleware)
+
+# Outside of the idempotency middleware, so stored responses are uncompressed
+# and replays are compressed for each client
+app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -38,6 +133,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if PROFILING:
+    # Requests with an X-Profile header, and sampled requests, are profiled
+    from ghost_api.profiling import ProfilerMiddleware
+
+    app.add_middleware(ProfilerMiddleware, router=app.router)
+
+# Outermost, so request latencies include all other middleware
+app.add_middleware(MetricsMiddleware, router=app.router)
+
+
+if SWEEP_EXPIRED_GAMES:
+    # DynamoDB Local doesn't implement TTL, so expired games are swept here
+    from ghost_api.sweeper import ExpiredGameSweeper
+
+    sweeper = ExpiredGameSweeper()
+    app.add_event_handler("startup", sweeper.start)
+    app.add_event_handler("shutdown", sweeper.stop)
+
 
 class ErrorMessage(CamelModel):
     """An error message with additional content"""
@@ -45,34 +158,156 @@ class ErrorMessage(CamelModel):
     message: str
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """
+    Metrics of this process in the Prometheus text format
+    """
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
 @app.post("/login/guest", response_model=Player)
 async def login_guest(info: GuestLogin):
     """
     Simple guest login that generates a display picture
     """
-    name_hash = hashlib.md5(info.name.encode()).hexdigest()
-    return Player(
-        name=info.name,
-        image_url=f"https://www.gravatar.com/avatar/{name_hash}?d=identicon",
-    )
+    return Player(name=info.name, image_url=default_image_url(info.name))
+
+
+#: Field names of games in responses, mapped to the names used by the service
+GAME_FIELD_NAMES = {field.alias: name for name, field in GameInfo.__fields__.items()}
 
 
 @app.get(
     "/game/{room_code}",
-    response_model=GameInfo,
-    responses={404: {"model": ErrorMessage, "description": "The game does not exist"}},
+    response_model=Union[GameInfo, PartialGameInfo],  # type: ignore
+    response_description=(
+        "The game, or only the requested fields of the game if `fields` is given"
+    ),
+    responses={
+        400: {"model": ErrorMessage, "description": "Unknown fields were requested"},
+        404: {"model": ErrorMessage, "description": "The game does not exist"},
+        422: {"model": ErrorMessage, "description": "No fields were requested"},
+    },
 )
-async def get_game_info(room_code: str):
+async def get_game_info(
+    room_code: str,
+    fields: Optional[str] = Query(
+        None,
+        description=(
+            "Comma-separated fields to return, e.g. 'turnPlayerName,started'. "
+            "All fields are returned if not given, otherwise only those fields "
+            "are in the response."
+        ),
+    ),
+):
     """
     Get game info of an existing game
     """
-    logger.info("GET game/%s", room_code)
+    logger.info(
+        "GET /game/{room_code}", extra=log_fields(room_code=room_code, fields=fields)
+    )
 
-    service = GhostService()
+    service = get_service()
     try:
-        return service.read_game(room_code)
+        if fields is None:
+            return GameInfoResponse(service.read_game_json(room_code))
+
+        requested = fields.split(",") if fields != "" else []
+        unknown = [field for field in requested if field not in GAME_FIELD_NAMES]
+        if len(unknown) > 0:
+            return JSONResponse(
+                status_code=400,
+                content={"message": f"Games have no fields {unknown!r}"},
+            )
+
+        names = [GAME_FIELD_NAMES[field] for field in requested]
+        return GameInfoResponse(service.read_game(room_code, fields=names))
     except GameDoesNotExist as e:
         return JSONResponse(status_code=404, content={"message": str(e)})
+    except NoFieldsRequested as e:
+        return JSONResponse(status_code=422, content={"message": str(e)})
+
+
+@app.get(
+    "/games",
+    response_model=GamesPage,
+    responses={
+        400: {"model": ErrorMessage, "description": "The listing isn't supported"},
+    },
+)
+async def list_games(
+    started: bool,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    """
+    List games that can be joined, a page at a time. Pass the returned cursor
+    to get the next page.
+    """
+    logger.info("GET /games", extra=log_fields(started=started, cursor=cursor))
+
+    if started:
+        return JSONResponse(
+            status_code=400,
+            content={"message": "Only games that haven't started can be listed"},
+        )
+
+    service = get_service()
+    try:
+        return service.list_open_games(limit=limit, cursor=cursor)
+    except InvalidCursor as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+
+
+@app.post(
+    "/games/query",
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": (
+                "Newline-delimited JSON GameInfo objects, ending with an "
+                '{"error": message} object if the rest of the games could not be '
+                "read"
+            ),
+        },
+        503: {"model": ErrorMessage, "description": "The games could not be read"},
+    },
+)
+async def query_games(query: GamesQuery):
+    """
+    Get game info of many games at once.
+
+    Games are streamed back as newline-delimited JSON, one game per line, in no
+    particular order. Room codes of games that don't exist are skipped. If
+    some games can't be read once the response has started, the stream ends
+    with a line holding an ``error`` message instead.
+    """
+    logger.info("POST /games/query", extra=log_fields(room_codes=len(query.room_codes)))
+
+    service = get_service()
+    games = service.read_games(query.room_codes)
+    try:
+        # Read the first batch before responding, so its failure can still be
+        # returned with an error status
+        first = next(games, None)
+    except GamesUnavailable as e:
+        return JSONResponse(status_code=503, content={"message": str(e)})
+
+    def lines() -> Iterator[str]:
+        if first is None:
+            return
+        yield first.json(by_alias=True) + "\n"
+        try:
+            for game in games:
+                yield game.json(by_alias=True) + "\n"
+        except GamesUnavailable as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 @app.post(
@@ -85,11 +320,11 @@ async def new_game(room_code: str):
     """
     Create a new game
     """
-    logger.info("POST game/%s", room_code)
+    logger.info("POST /game/{room_code}", extra=log_fields(room_code=room_code))
 
-    service = GhostService()
+    service = get_service()
     try:
-        return service.create_game(room_code)
+        return GameInfoResponse(service.create_game(room_code), status_code=201)
     except GameAlreadyExists as e:
         return JSONResponse(status_code=409, content={"message": str(e)})
 
@@ -100,9 +335,9 @@ async def delete_game(room_code: str) -> None:
     Delete an existing game, so a new game can be started with the same room
     code
     """
-    logger.info("DELETE game/%s", room_code)
+    logger.info("DELETE /game/{room_code}", extra=log_fields(room_code=room_code))
 
-    service = GhostService()
+    service = get_service()
     service.delete_game(room_code)
 
 
@@ -117,11 +352,11 @@ async def start_game(room_code: str):
     """
     Start a game, if it's not started
     """
-    logger.info("POST /game/%s/start", room_code)
+    logger.info("POST /game/{room_code}/start", extra=log_fields(room_code=room_code))
 
-    service = GhostService()
+    service = get_service()
     try:
-        return service.start_game(room_code)
+        return GameInfoResponse(service.start_game(room_code))
     except GameDoesNotExist as e:
         return JSONResponse(status_code=404, content={"message": str(e)})
 
@@ -141,11 +376,14 @@ async def post_new_move(room_code: str, move: Move):
     """
     Make a move in an existing game
     """
-    logger.info("POST game/%s/move: %s", room_code, move.dict())
+    logger.info(
+        "POST /game/{room_code}/move",
+        extra=log_fields(room_code=room_code, move=move),
+    )
 
-    service = GhostService()
+    service = get_service()
     try:
-        return service.add_move(room_code, move)
+        return GameInfoResponse(service.add_move(room_code, move))
     except WrongPlayer as e:
         return JSONResponse(status_code=409, content={"message": str(e)})
     except InvalidMove as e:
@@ -171,11 +409,14 @@ async def join_game(room_code: str, player: Player):
     """
     Join an existing game
     """
-    logger.info("POST game/%s/player: %s", room_code, player.dict())
+    logger.info(
+        "POST /game/{room_code}/player",
+        extra=log_fields(room_code=room_code, player=player),
+    )
 
-    service = GhostService()
+    service = get_service()
     try:
-        return service.add_player(room_code, player)
+        return GameInfoResponse(service.add_player(room_code, player))
     except GameStarted as e:
         return JSONResponse(status_code=409, content={"message": str(e)})
     except GameDoesNotExist as e:
@@ -191,11 +432,14 @@ async def remove_player(room_code: str, player_name: str):
     """
     Remove a player from a game
     """
-    logger.info("DELETE game/%s/player/%s", room_code, player_name)
+    logger.info(
+        "DELETE /game/{room_code}/player/{player_name}",
+        extra=log_fields(room_code=room_code, player_name=player_name),
+    )
 
-    service = GhostService()
+    service = get_service()
     try:
-        return service.remove_player(room_code, player_name)
+        return GameInfoResponse(service.remove_player(room_code, player_name))
     except GameDoesNotExist as e:
         return JSONResponse(status_code=404, content={"message": str(e)})
 
@@ -215,11 +459,14 @@ async def create_challenge(room_code: str, challenge: NewChallenge):
     """
     Create a challenge on the most recent move
     """
-    logger.info("POST /game/%s/challenge: %s", room_code, challenge.dict())
+    logger.info(
+        "POST /game/{room_code}/challenge",
+        extra=log_fields(room_code=room_code, challenge=challenge),
+    )
 
-    service = GhostService()
+    service = get_service()
     try:
-        return service.create_challenge(room_code, challenge)
+        return GameInfoResponse(service.create_challenge(room_code, challenge))
     except GameDoesNotExist as e:
         return JSONResponse(status_code=404, content={"message": str(e)})
     except InvalidMove as e:
@@ -248,12 +495,15 @@ async def create_challenge_response(
     # TODO: responding player in the header to validate it's being sent by the
     # right person
     logger.info(
-        "POST /game/%s/challenge-response: %s", room_code, challenge_response.dict()
+        "POST /game/{room_code}/challenge-response",
+        extra=log_fields(room_code=room_code, challenge_response=challenge_response),
     )
 
-    service = GhostService()
+    service = get_service()
     try:
-        return service.create_challenge_response(room_code, challenge_response)
+        return GameInfoResponse(
+            service.create_challenge_response(room_code, challenge_response)
+        )
     except GameDoesNotExist as e:
         return JSONResponse(status_code=404, content={"message": str(e)})
     except InvalidMove as e:
@@ -272,16 +522,64 @@ async def create_challenge_response(
     },
 )
 async def add_challenge_vote(room_code: str, vote: ChallengeVote):
-    logger.info("POST /game/%s/challenge-vote: %s", room_code, vote.dict())
+    logger.info(
+        "POST /game/{room_code}/challenge-vote",
+        extra=log_fields(room_code=room_code, vote=vote),
+    )
 
-    service = GhostService()
+    service = get_service()
     try:
-        return service.add_challenge_vote(room_code, vote)
+        return GameInfoResponse(service.add_challenge_vote(room_code, vote))
     except GameDoesNotExist as e:
         return JSONResponse(status_code=404, content={"message": str(e)})
     except InvalidMove as e:
         return JSONResponse(status_code=409, content={"message": str(e)})
 
 
-#: Handler for optional serverless deployment of FastAPI app
-handler = Mangum(app)
+@app.post(
+    "/game/{room_code}/batch",
+    response_model=GameInfo,
+    responses={
+        404: {"model": ErrorMessage, "description": "The game does not exist"},
+        409: {
+            "model": ErrorMessage,
+            "description": (
+                "One of the actions can't be applied, or the game kept being "
+                "changed by other requests"
+            ),
+        },
+    },
+)
+async def apply_batch(room_code: str, actions: List[BatchAction]):
+    """
+    Apply several actions to an existing game in order. Either all of the
+    actions are applied or, if any of them fails, none are.
+    """
+    logger.info(
+        "POST /game/{room_code}/batch",
+        extra=log_fields(room_code=room_code, actions=actions),
+    )
+
+    service = get_service()
+    try:
+        return GameInfoResponse(service.apply_actions(room_code, actions))
+    except GameDoesNotExist as e:
+        return JSONResponse(status_code=404, content={"message": str(e)})
+    except (
+        GameStarted,
+        GameNotStarted,
+        WrongPlayer,
+        InvalidMove,
+        ConcurrentUpdate,
+    ) as e:
+        return JSONResponse(status_code=409, content={"message": str(e)})
+
+
+if STATIC_OPENAPI:
+    # Served from the artifact built by scripts/build-openapi.py
+    use_static_openapi(app)
+
+
+#: Handler for optional serverless deployment of FastAPI app. Keep-warm pings
+#: are answered without going through the app.
+handler = with_log_flush(with_warmup(Mangum(app)))
@@ -0,0 +1,11 @@
+import hashlib
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
+def default_image_url(name: str) -> str:
+    """
+    Get the display image generated for a player's name
+    """
+    name_hash = hashlib.md5(name.encode()).hexdigest()
+    return f"https://www.gravatar.com/avatar/{name_hash}?d=identicon"
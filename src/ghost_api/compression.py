@@ -0,0 +1,187 @@
+"""
+Compression of response bodies with gzip or brotli
+"""
+
+import zlib
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ghost_api.constants import (
+    BROTLI_QUALITY,
+    COMPRESSION_ENCODINGS,
+    COMPRESSION_MIN_SIZE,
+    GZIP_LEVEL,
+)
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+class Compressor(ABC):
+    """
+    Incrementally compresses the chunks of a response body
+    """
+
+    @abstractmethod
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """
+        Compress a chunk of the body. Everything compressed so far is flushed,
+        so it can be decompressed by the client without waiting for the next
+        chunk. The final chunk ends the compressed stream.
+        """
+
+
+class GzipCompressor(Compressor):
+    def __init__(self, level: int = GZIP_LEVEL):
+        # A window size of 16 + 15 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(mode)
+
+
+class BrotliCompressor(Compressor):
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        compressed = self._compressor.process(data)
+        if final:
+            return compressed + self._compressor.finish()
+        return compressed + self._compressor.flush()
+
+
+#: Compressor for each supported content encoding
+COMPRESSORS: Dict[str, Callable[[], Compressor]] = {"gzip": GzipCompressor}
+if brotli is not None:
+    COMPRESSORS["br"] = BrotliCompressor
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header into the quality of each encoding
+    """
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        name, *params = coding.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    return qualities
+
+
+def choose_encoding(accept_encoding: str, encodings: List[str]) -> Optional[str]:
+    """
+    Choose the encoding to compress a response with, out of the supported
+    ``encodings`` in order of preference. Returns None if the client doesn't
+    accept any of them.
+    """
+    qualities = accepted_encodings(accept_encoding)
+    default = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, default)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies for clients that accept gzip or brotli.
+
+    Bodies smaller than ``minimum_size`` aren't compressed, since the saving
+    isn't worth the CPU time. Streamed bodies are always compressed, and each
+    chunk is flushed as it is sent so clients can read them as they arrive.
+    Responses that already have a Content-Encoding are left alone.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        encodings: List[str] = COMPRESSION_ENCODINGS,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+    ):
+        self.app = app
+        self.encodings = [encoding for encoding in encodings if encoding in COMPRESSORS]
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = choose_encoding(accept_encoding, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        new_compressor = COMPRESSORS[encoding]
+        start_message: Message = {}
+        compressor: Optional[Compressor] = None
+        passthrough = False
+
+        async def compressing_send(message: Message) -> None:
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows if it's compressed
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if passthrough:
+                await send(message)
+                return
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if "content-encoding" in headers or (
+                    not more_body and len(body) < self.minimum_size
+                ):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = new_compressor()
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    body = compressor.compress(body, final=True)
+                    headers["content-length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                # The length of a streamed body isn't known until it's sent
+                if "content-length" in headers:
+                    del headers["content-length"]
+                await send(start_message)
+
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": compressor.compress(body, final=not more_body),
+                    "more_body": more_body,
+                }
+            )
+
+        await self.app(scope, receive, compressing_send)
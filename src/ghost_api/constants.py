@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Dict, List, Optional
 
 #: Name of the games table in DynamoDB
 GAMES_TABLE_NAME: str = os.environ["GHOST_GAMES_TABLE_NAME"]
@@ -9,3 +9,86 @@ AWS_REGION: Optional[str] = os.environ.get("AWS_REGION")
 
 #: Optional endpoint for a local DynamoDB instance, taking precedence over AWS_REGION
 LOCAL_DYNAMODB_ENDPOINT: Optional[str] = os.environ.get("LOCAL_DYNAMODB_ENDPOINT")
+
+#: How long a game is kept after it was last changed, in seconds
+GAME_TTL_SECONDS: int = int(os.environ.get("GHOST_GAME_TTL_SECONDS", "604800"))
+
+#: If expired games should be deleted by a background sweeper. DynamoDB TTL
+#: deletes them in AWS, but DynamoDB Local doesn't implement TTL.
+SWEEP_EXPIRED_GAMES: bool = os.environ.get("GHOST_SWEEP_EXPIRED_GAMES") == "1"
+
+#: Seconds between sweeps for expired games
+SWEEP_INTERVAL_SECONDS: float = float(
+    os.environ.get("GHOST_SWEEP_INTERVAL_SECONDS", "60")
+)
+
+#: Maximum rate at which the sweeper deletes expired games
+SWEEP_MAX_DELETES_PER_SECOND: float = float(
+    os.environ.get("GHOST_SWEEP_MAX_DELETES_PER_SECOND", "10")
+)
+
+#: If a rendered JSON snapshot of each game should be stored whenever it
+#: changes, so reading the game doesn't require decoding and rendering it
+STORE_SNAPSHOTS: bool = os.environ.get("GHOST_STORE_SNAPSHOTS") == "1"
+
+#: Optional name of a DynamoDB table for storing idempotent responses. If unset,
+#: responses are kept in memory, which is only shared within a single process.
+IDEMPOTENCY_TABLE_NAME: Optional[str] = os.environ.get("GHOST_IDEMPOTENCY_TABLE_NAME")
+
+#: How long a response is replayed for a repeated Idempotency-Key, in seconds
+IDEMPOTENCY_TTL_SECONDS: int = int(
+    os.environ.get("GHOST_IDEMPOTENCY_TTL_SECONDS", "3600")
+)
+
+#: Content encodings responses may be compressed with, in order of preference.
+#: Brotli is only used if the optional ``brotli`` package is installed.
+COMPRESSION_ENCODINGS: List[str] = [
+    encoding.strip()
+    for encoding in os.environ.get("GHOST_COMPRESSION_ENCODINGS", "br,gzip").split(",")
+    if encoding.strip()
+]
+
+#: Minimum size of a response body to compress, in bytes
+COMPRESSION_MIN_SIZE: int = int(os.environ.get("GHOST_COMPRESSION_MIN_SIZE", "1024"))
+
+#: Compression level for gzip, from 1 (fastest) to 9 (smallest)
+GZIP_LEVEL: int = int(os.environ.get("GHOST_GZIP_LEVEL", "6"))
+
+#: Compression quality for brotli, from 0 (fastest) to 11 (smallest)
+BROTLI_QUALITY: int = int(os.environ.get("GHOST_BROTLI_QUALITY", "4"))
+
+#: If the OpenAPI schema should be served from the artifact built by
+#: ``scripts/build-openapi.py`` instead of being generated at runtime
+STATIC_OPENAPI: bool = os.environ.get("GHOST_STATIC_OPENAPI") == "1"
+
+#: Seconds between logging a summary of the metrics, or 0 to never log them.
+#: Useful in Lambda, where the metrics endpoint can't be scraped.
+METRICS_LOG_INTERVAL_SECONDS: float = float(
+    os.environ.get("GHOST_METRICS_LOG_INTERVAL_SECONDS", "0")
+)
+
+#: If debugging information, such as the DynamoDB capacity consumed by each
+#: request, should be returned in response headers
+DEBUG: bool = os.environ.get("GHOST_DEBUG") == "1"
+
+#: If requests can be profiled, on request with an X-Profile header or when
+#: sampled. Only enable this where clients are trusted.
+PROFILING: bool = os.environ.get("GHOST_PROFILING") == "1"
+
+#: Fraction of requests profiled when profiling is enabled
+PROFILE_SAMPLE_RATE: float = float(os.environ.get("GHOST_PROFILE_SAMPLE_RATE", "0"))
+
+#: Optional directory to save profiles in. If unset, they are logged.
+PROFILE_DIR: Optional[str] = os.environ.get("GHOST_PROFILE_DIR")
+
+#: Fraction of the request logs of each route that are kept, e.g.
+#: ``GET /game/{room_code}=0.1,GET /games=0.5``. Routes not listed are always
+#: logged, as are warnings and errors.
+LOG_SAMPLE_RATES: Dict[str, float] = {
+    route.strip(): float(rate)
+    for route, _, rate in (
+        entry.rpartition("=")
+        for entry in os.environ.get("GHOST_LOG_SAMPLE_RATES", "").split(",")
+        if entry.strip()
+    )
+}
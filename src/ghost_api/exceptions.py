@@ -28,3 +28,23 @@ class GameStarted(GhostServiceException):
 
 class GameNotStarted(GhostServiceException):
     """An action is invalid because the game hasn't started yet"""
+
+
+class GamesUnavailable(GhostServiceException):
+    """Games could not be read, e.g. because the table is being throttled"""
+
+
+class InvalidCursor(GhostServiceException):
+    """A pagination cursor could not be decoded"""
+
+
+class UnknownField(GhostServiceException):
+    """Attempted to read a field that games don't have"""
+
+
+class NoFieldsRequested(GhostServiceException):
+    """Attempted to read none of the fields of a game"""
+
+
+class ConcurrentUpdate(GhostServiceException):
+    """A game kept being changed by other requests while trying to update it"""
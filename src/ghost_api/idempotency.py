@@ -0,0 +1,386 @@
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ghost_api.constants import IDEMPOTENCY_TABLE_NAME, IDEMPOTENCY_TTL_SECONDS
+from ghost_api.negotiation import JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, accepts_msgpack
+
+#: Header clients send to make a mutating request safe to retry
+IDEMPOTENCY_HEADER = "idempotency-key"
+
+#: Header added to responses that were replayed rather than executed
+REPLAYED_HEADER = "idempotent-replayed"
+
+#: Methods that idempotency keys apply to
+IDEMPOTENT_METHODS = ("POST", "DELETE")
+
+#: Response headers that apply to a single connection, so aren't replayed.
+#: Content-Length is set from the stored body.
+UNREPLAYED_HEADERS = frozenset(
+    (
+        "connection",
+        "content-length",
+        "keep-alive",
+        "proxy-authenticate",
+        "proxy-authorization",
+        "te",
+        "trailer",
+        "transfer-encoding",
+        "upgrade",
+    )
+)
+
+#: How long a request holds its key before a retry may execute it again, in
+#: seconds, in case it never finishes. Longer than requests can take.
+IN_PROGRESS_TTL_SECONDS = 60
+
+
+class StoredResponse(NamedTuple):
+    #: Digest of the request body the response was produced for
+    fingerprint: str
+
+    #: HTTP status code of the original response
+    status_code: int
+
+    #: Headers of the original response, except ``UNREPLAYED_HEADERS``
+    headers: List[Tuple[str, str]]
+
+    #: Body of the original response
+    body: bytes
+
+    #: If the original request is still executing, so there's no response yet
+    in_progress: bool = False
+
+
+def in_progress_response(fingerprint: str) -> StoredResponse:
+    """
+    Placeholder stored for a request while it executes
+    """
+    return StoredResponse(
+        fingerprint=fingerprint,
+        status_code=0,
+        headers=[],
+        body=b"",
+        in_progress=True,
+    )
+
+
+class IdempotencyStore(ABC):
+    """
+    Store of responses to previously executed requests, keyed by the request's
+    idempotency key
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[StoredResponse]:
+        """
+        Get the stored response for a key, if it exists and hasn't expired
+        """
+
+    @abstractmethod
+    def reserve(self, key: str, fingerprint: str) -> bool:
+        """
+        Store an in-progress placeholder for a key if it has no stored response,
+        returning whether it was stored. Atomic, so only one of several
+        concurrent requests with the same key reserves it.
+        """
+
+    @abstractmethod
+    def put(self, key: str, response: StoredResponse) -> None:
+        """
+        Store a response for a key, replacing any existing response
+        """
+
+    @abstractmethod
+    def release(self, key: str) -> None:
+        """
+        Delete the stored response for a key, so its request can be retried
+        """
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    """
+    Idempotency store local to the current process
+    """
+
+    def __init__(self, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._responses: Dict[str, Tuple[float, StoredResponse]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key: str) -> Optional[StoredResponse]:
+        entry = self._responses.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= time.time():
+            del self._responses[key]
+            return None
+        return response
+
+    def reserve(self, key: str, fingerprint: str) -> bool:
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._put(key, in_progress_response(fingerprint), IN_PROGRESS_TTL_SECONDS)
+            return True
+
+    def put(self, key: str, response: StoredResponse) -> None:
+        with self._lock:
+            self._put(key, response, self.ttl_seconds)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._responses.pop(key, None)
+
+    def _put(self, key: str, response: StoredResponse, ttl_seconds: int) -> None:
+        now = time.time()
+        expired = [k for k, (exp, _) in self._responses.items() if exp <= now]
+        for expired_key in expired:
+            del self._responses[expired_key]
+        self._responses[key] = (now + ttl_seconds, response)
+
+
+class DynamoIdempotencyStore(IdempotencyStore):
+    """
+    Idempotency store backed by a DynamoDB table with an ``idempotency_key``
+    hash key and TTL enabled on ``expires_at``
+    """
+
+    def __init__(self, table_name: str, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS):
+        # Imported here to avoid a circular import with the service module
+        from ghost_api.service import dynamodb
+
+        self.ttl_seconds = ttl_seconds
+        self.table = dynamodb().Table(table_name)
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        response = self.table.get_item(Key={"idempotency_key": key})
+        if "Item" not in response:
+            return None
+
+        item = response["Item"]
+        # DynamoDB TTL deletion is lazy, so expired items may still be returned
+        if item["expires_at"] <= int(time.time()):
+            return None
+
+        if item.get("in_progress", False):
+            return in_progress_response(item["fingerprint"])
+        if "headers" in item:
+            headers = [(name, value) for name, value in item["headers"]]
+        else:
+            # Stored before headers were, with only the content type
+            content_type = item.get("content_type")
+            headers = [] if content_type is None else [("content-type", content_type)]
+        return StoredResponse(
+            fingerprint=item["fingerprint"],
+            status_code=int(item["status_code"]),
+            headers=headers,
+            body=bytes(item["body"]),
+        )
+
+    def reserve(self, key: str, fingerprint: str) -> bool:
+        from boto3.dynamodb.conditions import Attr
+        from botocore.exceptions import ClientError
+
+        now = int(time.time())
+        try:
+            self.table.put_item(
+                Item={
+                    "idempotency_key": key,
+                    "fingerprint": fingerprint,
+                    "in_progress": True,
+                    "expires_at": now + IN_PROGRESS_TTL_SECONDS,
+                },
+                # Expired items may not have been deleted yet
+                ConditionExpression=(
+                    Attr("idempotency_key").not_exists() | Attr("expires_at").lte(now)
+                ),
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+        return True
+
+    def put(self, key: str, response: StoredResponse) -> None:
+        from boto3.dynamodb.types import Binary
+
+        self.table.put_item(
+            Item={
+                "idempotency_key": key,
+                "fingerprint": response.fingerprint,
+                "status_code": response.status_code,
+                "headers": [list(header) for header in response.headers],
+                "body": Binary(response.body),
+                "expires_at": int(time.time()) + self.ttl_seconds,
+            }
+        )
+
+    def release(self, key: str) -> None:
+        self.table.delete_item(Key={"idempotency_key": key})
+
+
+@lru_cache(maxsize=None)
+def get_idempotency_store() -> IdempotencyStore:
+    """
+    Get the configured idempotency store, shared within the process
+    """
+    if IDEMPOTENCY_TABLE_NAME is not None:
+        return DynamoIdempotencyStore(IDEMPOTENCY_TABLE_NAME)
+    return InMemoryIdempotencyStore()
+
+
+class IdempotencyMiddleware:
+    """
+    Replay the stored response of a mutating request when it is retried with
+    the same Idempotency-Key header, rather than executing it again.
+
+    Keys are scoped to the method and path. Reusing a key with a different
+    request body, or a different negotiated response media type, is rejected
+    with a 422. A retry that arrives while the original request is still
+    executing is rejected with a 409. Server errors are not stored, so those
+    requests can be retried.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store_factory: Callable[[], IdempotencyStore] = get_idempotency_store,
+    ):
+        self.app = app
+        self.store_factory = store_factory
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in IDEMPOTENT_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        idempotency_key = Headers(scope=scope).get(IDEMPOTENCY_HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        media_type = (
+            MSGPACK_MEDIA_TYPE if accepts_msgpack(Request(scope)) else JSON_MEDIA_TYPE
+        )
+        # Replays must be in the media type the client negotiated
+        fingerprint = hashlib.sha256(media_type.encode() + b" " + body).hexdigest()
+        store_key = f"{scope['method']} {scope['path']} {idempotency_key}"
+
+        store = self.store_factory()
+        stored = store.get(store_key)
+        if stored is None and not store.reserve(store_key, fingerprint):
+            # Another request with the key got there first. If it has already
+            # finished and its response expired, it's treated as in progress.
+            stored = store.get(store_key) or in_progress_response(fingerprint)
+        if stored is not None:
+            await _send_stored_response(send, stored, fingerprint)
+            return
+
+        status_code = 500
+        headers: List[Tuple[str, str]] = []
+        chunks: List[bytes] = []
+
+        async def replay_receive() -> Message:
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture_send(message: Message) -> None:
+            nonlocal status_code, headers
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = [
+                    (name, value)
+                    for name, value in Headers(raw=message["headers"]).items()
+                    if name not in UNREPLAYED_HEADERS
+                ]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            store.release(store_key)
+            raise
+
+        if status_code >= 500:
+            store.release(store_key)
+        else:
+            store.put(
+                store_key,
+                StoredResponse(
+                    fingerprint=fingerprint,
+                    status_code=status_code,
+                    headers=headers,
+                    body=b"".join(chunks),
+                ),
+            )
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    return b"".join(chunks)
+
+
+def _message_response(status_code: int, message: str) -> StoredResponse:
+    return StoredResponse(
+        fingerprint="",
+        status_code=status_code,
+        headers=[("content-type", JSON_MEDIA_TYPE)],
+        body=json.dumps({"message": message}).encode(),
+    )
+
+
+async def _send_stored_response(
+    send: Send, stored: StoredResponse, fingerprint: str
+) -> None:
+    if stored.fingerprint != fingerprint:
+        msg = "Idempotency-Key has already been used for a different request"
+        await _send_response(send, _message_response(422, msg))
+    elif stored.in_progress:
+        msg = "A request with this Idempotency-Key is still in progress"
+        await _send_response(send, _message_response(409, msg))
+    else:
+        await _send_response(send, stored, replayed=True)
+
+
+async def _send_response(
+    send: Send,
+    response: StoredResponse,
+    replayed: bool = False,
+) -> None:
+    headers = [(b"content-length", str(len(response.body)).encode())]
+    headers.extend(
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in response.headers
+    )
+    if replayed:
+        headers.append((REPLAYED_HEADER.encode(), b"true"))
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": headers,
+        }
+    )
+    await send({"type": "http.response.body", "body": response.body})
@@ -1,19 +1,176 @@
+"""
+Structured JSON logging off the request path
+
+Records are put on a queue by the thread that logs them and formatted and
+written by a background thread, so a request never waits on formatting or on
+writing to stderr. Fields passed with :func:`log_fields` are only serialized
+when a record is written, so models can be logged without converting them
+first, and records dropped by sampling never serialize their fields at all.
+"""
+
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
 
+import orjson
+from pydantic import BaseModel
 
-def get_logger() -> logging.Logger:
+from ghost_api.constants import LOG_SAMPLE_RATES
+
+#: Attribute of log records holding their structured fields
+FIELDS_ATTRIBUTE = "fields"
+
+
+class Lazy:
+    """
+    A log field computed only if its record is written, e.g.
+    ``Lazy(lambda: len(game.players))``
+    """
+
+    def __init__(self, compute: Callable[[], Any]):
+        self.compute = compute
+
+
+def log_fields(**fields: Any) -> Dict[str, Any]:
+    """
+    Structured fields to log with a record, passed as ``extra``::
+
+        logger.info("POST /game/{room_code}/move", extra=log_fields(move=move))
+
+    Pydantic models and :class:`Lazy` values are serialized when the record is
+    written, in the logging thread. Values shouldn't be mutated after they're
+    logged.
+    """
+    return {FIELDS_ATTRIBUTE: fields}
+
+
+def _serialize(value: Any) -> Any:
+    if isinstance(value, Lazy):
+        return value.compute()
+    if isinstance(value, BaseModel):
+        return value.dict()
+    return str(value)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format a record as a single line of JSON, with its structured fields
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(getattr(record, FIELDS_ATTRIBUTE, {}))
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(payload, default=_serialize).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the records of each route.
+
+    ``rates`` maps the message of a record, which is the route for request
+    logs, e.g. ``GET /game/{room_code}``, to the fraction of its records that
+    are kept. Other records, and warnings and errors, are always kept.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.msg)
+        return rate is None or random.random() < rate
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
     """
-    Get a logger that's configured appropriately in local or Lambda
-    environments.
+    Put records on a queue as they are, leaving all formatting to the thread
+    writing them. The standard ``QueueHandler`` formats records before queueing
+    them so they can be pickled, which isn't needed within a process.
     """
-    # See https://stackoverflow.com/a/56579088
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_handler: Optional[LocalQueueHandler] = None
+_records: "Optional[queue.Queue[logging.LogRecord]]" = None
+
+
+def _start_listener() -> None:
+    global _records
+    assert _handler is not None
+    _records = queue.Queue()
+    _handler.queue = _records
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+    logging.handlers.QueueListener(_records, stream_handler).start()
+
+
+def _configure() -> None:
+    global _handler
     logger = logging.getLogger()
-    if len(logger.handlers) > 0:
-        # The Lambda environment pre-configures a handler logging to stderr.
-        # If a handler is already configured, `.basicConfig` does not execute.
-        # Thus we set the level directly.
-        logger.setLevel(logging.INFO)
-    else:
-        logging.basicConfig(level=logging.INFO)
-
-    return logger
+    # Handlers pre-configured e.g. by the Lambda runtime are replaced
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    _handler = LocalQueueHandler(queue.Queue())
+    _handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+    _start_listener()
+    atexit.register(flush_logs)
+    # The listener thread doesn't survive forking server workers
+    os.register_at_fork(after_in_child=_start_listener)
+
+
+_configure_lock = threading.Lock()
+
+
+def get_logger() -> logging.Logger:
+    """
+    Get a logger that writes structured JSON logs from a background thread,
+    configuring it the first time
+    """
+    with _configure_lock:
+        if _handler is None:
+            _configure()
+    return logging.getLogger()
+
+
+def flush_logs() -> None:
+    """
+    Wait until every record logged so far has been written. Lambda freezes the
+    process between invocations, so this is done before returning from each.
+    """
+    if _records is not None:
+        _records.join()
+
+
+def with_log_flush(handler: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    """
+    Wrap a Lambda handler to flush logs before returning
+    """
+
+    def flushing_handler(event: Any, context: Any) -> Any:
+        try:
+            return handler(event, context)
+        finally:
+            flush_logs()
+
+    return flushing_handler
@@ -0,0 +1,490 @@
+"""
+Request latency histograms and backend call counters, exposed in the
+Prometheus text format
+"""
+
+import functools
+import inspect
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type, TypeVar
+
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Router
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ghost_api.constants import DEBUG, METRICS_LOG_INTERVAL_SECONDS
+from ghost_api.logging import get_logger, log_fields
+
+logger = get_logger()
+
+#: Header returning the DynamoDB capacity consumed by a request, in debug mode
+CAPACITY_HEADER = "x-consumed-capacity"
+
+#: Upper bounds of latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+#: Upper bounds of buckets for the number of DynamoDB calls made by a request
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+Labels = Tuple[str, ...]
+
+
+class Histogram:
+    """
+    Counts of observed values in cumulative buckets, like a Prometheus
+    histogram
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> List[Tuple[str, int]]:
+        """
+        Get the number of observations up to each bucket's upper bound
+        """
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        counts = []
+        total = 0
+        for bound, count in zip(bounds, self.bucket_counts):
+            total += count
+            counts.append((bound, total))
+        return counts
+
+
+class Metric(ABC):
+    """
+    A named family of metrics, with one value for each combination of labels
+    """
+
+    type = ""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str]):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def clear(self) -> None:
+        """
+        Reset the metric, removing the values of all labels
+        """
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """
+        Get the samples of the metric, as Prometheus sample names, labels and
+        values
+        """
+
+    @abstractmethod
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Get a JSON-compatible summary of the metric for logging
+        """
+
+    def _labels(self, values: Labels, **extra: str) -> Dict[str, str]:
+        return {**dict(zip(self.label_names, values)), **extra}
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str]):
+        super().__init__(name, description, label_names)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels) -> float:
+        return self._values.get(labels, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, self._labels(labels), value) for labels, value in values]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            {"labels": self._labels(labels), "value": value} for labels, value in values
+        ]
+
+
+class HistogramMetric(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str],
+        buckets: Sequence[float],
+    ):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[Labels, Histogram] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(labels)
+            if histogram is None:
+                histogram = self._histograms[labels] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def histogram(self, labels: Labels) -> Optional[Histogram]:
+        return self._histograms.get(labels)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples: List[Tuple[str, Dict[str, str], float]] = []
+        with self._lock:
+            for labels, histogram in self._histograms.items():
+                for bound, count in histogram.cumulative_counts():
+                    samples.append(
+                        (f"{self.name}_bucket", self._labels(labels, le=bound), count)
+                    )
+                samples.append(
+                    (f"{self.name}_sum", self._labels(labels), histogram.sum)
+                )
+                samples.append(
+                    (f"{self.name}_count", self._labels(labels), histogram.count)
+                )
+        return samples
+
+    def summary(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "labels": self._labels(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                }
+                for labels, histogram in self._histograms.items()
+            ]
+
+
+def _format_value(value: float) -> str:
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    """
+    The metrics of a process
+    """
+
+    def __init__(self, metrics: Sequence[Metric]):
+        self.metrics = list(metrics)
+
+    def clear(self) -> None:
+        for metric in self.metrics:
+            metric.clear()
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                label_text = ",".join(
+                    f'{key}="{_escape(label)}"' for key, label in labels.items()
+                )
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get a JSON-compatible summary of all metrics for logging
+        """
+        return {metric.name: metric.summary() for metric in self.metrics}
+
+
+REQUEST_DURATION = HistogramMetric(
+    "ghost_request_duration_seconds",
+    "Time taken to handle requests",
+    ["method", "route"],
+    LATENCY_BUCKETS,
+)
+
+SERVICE_CALL_DURATION = HistogramMetric(
+    "ghost_service_call_duration_seconds",
+    "Time taken by GhostService methods",
+    ["method"],
+    LATENCY_BUCKETS,
+)
+
+DYNAMODB_CALLS = Counter(
+    "ghost_dynamodb_calls_total",
+    "DynamoDB API calls made while handling requests",
+    ["method", "route", "operation"],
+)
+
+DYNAMODB_CONSUMED_CAPACITY = Counter(
+    "ghost_dynamodb_consumed_capacity_units_total",
+    "DynamoDB capacity units consumed while handling requests",
+    ["method", "route", "type"],
+)
+
+DYNAMODB_CALLS_PER_REQUEST = HistogramMetric(
+    "ghost_dynamodb_calls_per_request",
+    "Number of DynamoDB API calls made by each request",
+    ["method", "route"],
+    CALL_COUNT_BUCKETS,
+)
+
+#: Metrics of this process
+REGISTRY = Registry(
+    [
+        REQUEST_DURATION,
+        SERVICE_CALL_DURATION,
+        DYNAMODB_CALLS,
+        DYNAMODB_CONSUMED_CAPACITY,
+        DYNAMODB_CALLS_PER_REQUEST,
+    ]
+)
+
+
+class RequestMetrics:
+    """
+    DynamoDB usage of the request being handled, which may be recorded from
+    several threads
+    """
+
+    def __init__(self) -> None:
+        #: Number of DynamoDB calls, by operation
+        self.calls: Dict[str, int] = {}
+        #: Consumed DynamoDB capacity units, by type of capacity
+        self.capacity = {"read": 0.0, "write": 0.0}
+        self._lock = threading.Lock()
+
+    def add_call(self, operation: str) -> None:
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def add_capacity(self, capacity_type: str, units: float) -> None:
+        with self._lock:
+            self.capacity[capacity_type] += units
+
+
+#: Metrics of the request being handled. Unset outside of requests.
+_request_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    "request_metrics", default=None
+)
+
+#: DynamoDB operations that consume read capacity. Others consume write
+#: capacity.
+READ_OPERATIONS = {"GetItem", "BatchGetItem", "Query", "Scan", "TransactGetItems"}
+
+
+def _snake_case(name: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+def _request_consumed_capacity(params: Dict[str, Any], model: Any, **kwargs: Any):
+    if "ReturnConsumedCapacity" in model.input_shape.members:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def _record_dynamodb_call(model: Any, **kwargs: Any) -> None:
+    request_metrics = _request_metrics.get()
+    if request_metrics is not None:
+        request_metrics.add_call(_snake_case(model.name))
+
+
+def _record_consumed_capacity(parsed: Dict[str, Any], model: Any, **kwargs: Any):
+    request_metrics = _request_metrics.get()
+    consumed = parsed.get("ConsumedCapacity")
+    if request_metrics is None or consumed is None:
+        return
+
+    # Batch operations return the capacity consumed in each table
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    capacity_type = "read" if model.name in READ_OPERATIONS else "write"
+    for table_capacity in consumed:
+        request_metrics.add_capacity(
+            capacity_type, table_capacity.get("CapacityUnits", 0)
+        )
+
+
+def instrument_dynamodb(client: Any) -> None:
+    """
+    Register handlers for the events of a boto3 DynamoDB client, recording its
+    calls and the capacity they consume against the request being handled.
+
+    Every call that supports it requests its ``TOTAL`` consumed capacity.
+    """
+    events = client.meta.events
+    events.register("before-parameter-build.dynamodb", _request_consumed_capacity)
+    events.register("before-call.dynamodb", _record_dynamodb_call)
+    events.register("after-call.dynamodb", _record_consumed_capacity)
+
+
+Cls = TypeVar("Cls", bound=Type[Any])
+
+
+def timed_methods(cls: Cls) -> Cls:
+    """
+    Class decorator recording the time taken by each public method of the
+    class in ``SERVICE_CALL_DURATION``
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not callable(method):
+            continue
+        setattr(cls, name, _timed(name, method))
+    return cls
+
+
+def _timed(name: str, method: Callable[..., Any]) -> Callable[..., Any]:
+    labels = (name,)
+
+    if inspect.isgeneratorfunction(method):
+        # Timed until the generator is exhausted or closed
+        @functools.wraps(method)
+        def timed_generator(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return (yield from method(*args, **kwargs))
+            finally:
+                SERVICE_CALL_DURATION.observe(labels, time.perf_counter() - start)
+
+        return timed_generator
+
+    @functools.wraps(method)
+    def timed_method(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            SERVICE_CALL_DURATION.observe(labels, time.perf_counter() - start)
+
+    return timed_method
+
+
+class RoutePaths:
+    """
+    Look up the path template of the route that handled a request, e.g.
+    ``/game/{room_code}``, to label it with
+    """
+
+    def __init__(self, router: Router):
+        self.router = router
+        self._paths: Dict[Any, str] = {}
+
+    def __call__(self, scope: Scope) -> str:
+        # The router adds the matched endpoint to the scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if endpoint not in self._paths:
+            for route in self.router.routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    self._paths[endpoint] = getattr(route, "path", "unknown")
+                    break
+            else:
+                return "unknown"
+        return self._paths[endpoint]
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, DynamoDB calls and consumed capacity of each request,
+    labelled with its method and the path template of the route that handled
+    it.
+
+    With ``log_interval_seconds`` set, a summary of the metrics is logged after
+    a request at most that often, for environments like Lambda where the
+    metrics endpoint of a single process can't be scraped.
+
+    In debug mode, the DynamoDB capacity consumed by a request is returned in
+    an ``X-Consumed-Capacity`` header. Streamed responses only include the
+    capacity consumed before they started.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        router: Router,
+        log_interval_seconds: float = METRICS_LOG_INTERVAL_SECONDS,
+    ):
+        self.app = app
+        self.log_interval_seconds = log_interval_seconds
+        self._route_paths = RoutePaths(router)
+        self._last_logged = time.monotonic()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_metrics = RequestMetrics()
+        token = _request_metrics.set(request_metrics)
+
+        async def send_with_capacity(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                capacity = ", ".join(
+                    f"{capacity_type}={units:g}"
+                    for capacity_type, units in request_metrics.capacity.items()
+                )
+                headers = MutableHeaders(scope=message)
+                headers.append(CAPACITY_HEADER, capacity)
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_capacity if DEBUG else send)
+        finally:
+            duration = time.perf_counter() - start
+            _request_metrics.reset(token)
+            self._record(scope, duration, request_metrics)
+
+    def _record(
+        self,
+        scope: Scope,
+        duration: float,
+        request_metrics: RequestMetrics,
+    ) -> None:
+        labels = (scope["method"], self._route_paths(scope))
+        REQUEST_DURATION.observe(labels, duration)
+        for operation, count in request_metrics.calls.items():
+            DYNAMODB_CALLS.inc((*labels, operation), count)
+        for capacity_type, units in request_metrics.capacity.items():
+            if units > 0:
+                DYNAMODB_CONSUMED_CAPACITY.inc((*labels, capacity_type), units)
+        DYNAMODB_CALLS_PER_REQUEST.observe(labels, sum(request_metrics.calls.values()))
+
+        if self.log_interval_seconds > 0:
+            now = time.monotonic()
+            if now - self._last_logged >= self.log_interval_seconds:
+                self._last_logged = now
+                logger.info("Metrics", extra=log_fields(metrics=REGISTRY.summary()))
@@ -0,0 +1,107 @@
+"""
+Content negotiation between JSON and MessagePack request and response bodies
+"""
+
+from typing import Callable, Coroutine
+
+import msgpack
+import orjson
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response
+
+from ghost_api.responses import GameInfoResponse
+
+#: Media type of MessagePack bodies
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+#: Media type of JSON bodies
+JSON_MEDIA_TYPE = "application/json"
+
+
+def _media_type(content_type: str) -> str:
+    return content_type.split(";")[0].strip().lower()
+
+
+def accepts_msgpack(request: Request) -> bool:
+    """
+    If a request prefers a MessagePack response body to JSON
+    """
+    accepted = [
+        _media_type(media_range)
+        for media_range in request.headers.get("accept", "").split(",")
+    ]
+    return MSGPACK_MEDIA_TYPE in accepted and (
+        JSON_MEDIA_TYPE not in accepted
+        or accepted.index(MSGPACK_MEDIA_TYPE) < accepted.index(JSON_MEDIA_TYPE)
+    )
+
+
+class MsgPackRequest(Request):
+    """
+    Request with a MessagePack body, presented to FastAPI as a JSON request
+    """
+
+    def __init__(self, request: Request):
+        headers = [
+            (name, value)
+            for name, value in request.scope["headers"]
+            if name != b"content-type"
+        ]
+        headers.append((b"content-type", JSON_MEDIA_TYPE.encode()))
+        super().__init__({**request.scope, "headers": headers}, request.receive)
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            raw_body = await super().body()
+            # Decoded objects are set directly, so they're never parsed as JSON
+            self._json = msgpack.unpackb(raw_body)
+            self._body = orjson.dumps(self._json)
+        return self._body
+
+
+def _msgpack_response(response: Response) -> Response:
+    """
+    Re-encode a JSON response as MessagePack
+    """
+    if isinstance(response, GameInfoResponse):
+        content = response.content()
+    else:
+        content = orjson.loads(response.body)
+
+    headers = {
+        name: value
+        for name, value in response.headers.items()
+        if name not in ("content-length", "content-type")
+    }
+    return Response(
+        content=msgpack.packb(content),
+        status_code=response.status_code,
+        headers=headers,
+        media_type=MSGPACK_MEDIA_TYPE,
+        background=response.background,
+    )
+
+
+class NegotiatedRoute(APIRoute):
+    """
+    Route that accepts MessagePack request bodies, sent with a Content-Type of
+    application/msgpack, and returns MessagePack instead of JSON responses to
+    requests that prefer it in their Accept header
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[None, None, Response]]:
+        handler = super().get_route_handler()
+
+        async def negotiated_handler(request: Request) -> Response:
+            content_type = request.headers.get("content-type", "")
+            if _media_type(content_type) == MSGPACK_MEDIA_TYPE:
+                request = MsgPackRequest(request)
+
+            response = await handler(request)
+
+            if response.media_type == JSON_MEDIA_TYPE and accepts_msgpack(request):
+                return _msgpack_response(response)
+            return response
+
+        return negotiated_handler
@@ -0,0 +1,45 @@
+"""
+Building the OpenAPI schema ahead of time and serving it as a static artifact
+"""
+
+from pathlib import Path
+from typing import Any, Dict
+
+import orjson
+from fastapi import FastAPI
+
+from ghost_api.logging import get_logger
+
+logger = get_logger()
+
+#: Where the OpenAPI schema artifact is built, shipped alongside the package
+OPENAPI_SCHEMA_PATH = Path(__file__).parent / "openapi.json"
+
+
+def build_openapi_schema(app: FastAPI, path: Path = OPENAPI_SCHEMA_PATH) -> None:
+    """
+    Generate the OpenAPI schema of an app and write it to ``path``
+    """
+    path.write_bytes(orjson.dumps(app.openapi(), option=orjson.OPT_INDENT_2))
+
+
+def use_static_openapi(app: FastAPI, path: Path = OPENAPI_SCHEMA_PATH) -> None:
+    """
+    Serve the OpenAPI schema of an app from an artifact built by
+    ``build_openapi_schema``, rather than generating it from the app's routes
+    on the first request for it. The artifact is read on first use.
+
+    If the artifact hasn't been built, the schema is generated as usual.
+    """
+    generate_openapi = app.openapi
+
+    def openapi() -> Dict[str, Any]:
+        if not app.openapi_schema:
+            try:
+                app.openapi_schema = orjson.loads(path.read_bytes())
+            except FileNotFoundError:
+                logger.warning(f"No OpenAPI schema built at {path}, generating it")
+                return generate_openapi()
+        return app.openapi_schema
+
+    app.openapi = openapi  # type: ignore
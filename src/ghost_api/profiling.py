@@ -0,0 +1,140 @@
+"""
+Opt-in profiling of individual requests with cProfile
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from typing import List, Optional
+
+from starlette.datastructures import Headers
+from starlette.routing import Router
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ghost_api.constants import PROFILE_DIR, PROFILE_SAMPLE_RATE
+from ghost_api.logging import get_logger
+from ghost_api.metrics import RoutePaths
+
+logger = get_logger()
+
+#: Header requesting that a request is profiled. With a value of ``inline``,
+#: the profile is returned instead of the response.
+PROFILE_HEADER = "x-profile"
+
+#: Header returning the status code of a response replaced by its profile
+PROFILED_STATUS_HEADER = "x-profiled-status"
+
+#: Number of functions included in profile reports
+REPORT_FUNCTIONS = 40
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", value).strip("_")
+
+
+class ProfilerMiddleware:
+    """
+    Run requests under cProfile when they carry an ``X-Profile`` header, or
+    when they are sampled at ``sample_rate``.
+
+    Profiles are saved as pstats files in ``profile_dir``, named after the
+    route and room code of the request, or logged if it isn't set. Requests
+    with ``X-Profile: inline`` get a report of the profile instead of their
+    response.
+
+    Only one request is profiled at a time. The profile covers everything run
+    on the event loop while the request is handled, so it should be read with
+    concurrent requests in mind.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        router: Router,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        profile_dir: Optional[str] = PROFILE_DIR,
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.profile_dir = profile_dir
+        self._route_paths = RoutePaths(router)
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = Headers(scope=scope).get(PROFILE_HEADER)
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if requested is None and not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        if not self._lock.acquire(blocking=False):
+            # Another request is being profiled
+            await self.app(scope, receive, send)
+            return
+
+        inline = requested == "inline"
+        response_messages: List[Message] = []
+
+        async def capture_send(message: Message) -> None:
+            response_messages.append(message)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, capture_send if inline else send)
+            finally:
+                profiler.disable()
+        finally:
+            self._lock.release()
+
+        tag = self._tag(scope)
+        if inline:
+            status = response_messages[0]["status"] if response_messages else 500
+            await self._send_report(send, self._report(profiler, tag), status)
+        elif self.profile_dir is not None:
+            path = os.path.join(
+                self.profile_dir, f"{time.strftime('%Y%m%dT%H%M%S')}-{_slug(tag)}.prof"
+            )
+            profiler.dump_stats(path)
+            logger.info("Saved profile of %s to %s", tag, path)
+        else:
+            logger.info("%s", self._report(profiler, tag))
+
+    def _tag(self, scope: Scope) -> str:
+        tag = f"{scope['method']} {self._route_paths(scope)}"
+        room_code = scope.get("path_params", {}).get("room_code")
+        if room_code is not None:
+            tag += f" {room_code}"
+        return tag
+
+    def _report(self, profiler: cProfile.Profile, tag: str) -> str:
+        stream = io.StringIO()
+        stream.write(f"Profile of {tag}\n")
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats("cumulative").print_stats(REPORT_FUNCTIONS)
+        return stream.getvalue()
+
+    async def _send_report(self, send: Send, report: str, status: int) -> None:
+        body = report.encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (PROFILED_STATUS_HEADER.encode(), str(status).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
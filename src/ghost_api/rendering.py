@@ -0,0 +1,26 @@
+"""
+Rendering of games as returned by the API
+"""
+
+from typing import Any, Dict, Union
+
+import orjson
+
+from ghost_api.types import GameInfo, PartialGameInfo
+
+
+def game_content(game: Union[GameInfo, PartialGameInfo]) -> Dict[str, Any]:
+    """
+    Get the camelCase content of a game returned by the API. Only the fields
+    that were read are included for partial games.
+    """
+    if isinstance(game, PartialGameInfo):
+        return game.dict(by_alias=True, exclude_unset=True)
+    return game.dict(by_alias=True)
+
+
+def render_game(game: Union[GameInfo, PartialGameInfo]) -> bytes:
+    """
+    Render a game as the JSON returned by the API
+    """
+    return orjson.dumps(game_content(game))
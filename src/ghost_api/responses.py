@@ -0,0 +1,41 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import Response
+
+from ghost_api.rendering import game_content, render_game
+from ghost_api.types import GameInfo, PartialGameInfo
+
+
+class GameInfoResponse(Response):
+    """
+    JSON response for a ``GameInfo`` that has already been validated.
+
+    Returning a response directly from a route skips FastAPI's validation and
+    serialization against the route's ``response_model``, which would otherwise
+    convert the game to a dict, validate it back into a model and encode it
+    again. The ``response_model`` is still used for the API docs.
+
+    A ``PartialGameInfo`` is rendered with only the fields that were read, and
+    bytes are taken to be an already rendered game.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content: Any, *args: Any, **kwargs: Any):
+        self._content = content
+        super().__init__(content, *args, **kwargs)
+
+    def content(self) -> Any:
+        """
+        Get the content of the response as JSON-compatible data, e.g. for
+        encoding it in another format
+        """
+        if isinstance(self._content, (GameInfo, PartialGameInfo)):
+            return game_content(self._content)
+        return orjson.loads(self._content)
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (GameInfo, PartialGameInfo)):
+            return render_game(content)
+        return content
@@ -0,0 +1,102 @@
+"""
+Server running the API in multiple worker processes, for hosts outside Lambda.
+
+Run with ``python -m ghost_api.serve``. Requires the ``server`` extra.
+
+The app is loaded, along with read-only data such as boto3's DynamoDB models
+and the OpenAPI schema, before the workers are forked, so that memory is shared
+copy-on-write between them. On SIGTERM, workers stop accepting connections and
+finish their in-flight requests before exiting.
+"""
+
+import argparse
+import os
+from typing import Any, Dict
+
+from fastapi import FastAPI
+from gunicorn.app.base import BaseApplication  # type: ignore
+
+#: Worker class running the ASGI app in each process
+WORKER_CLASS = "uvicorn.workers.UvicornWorker"
+
+
+def preload() -> FastAPI:
+    """
+    Load the app and the read-only data shared by all workers
+    """
+    from ghost_api.api import app
+    from ghost_api.service import load_dynamodb_models
+
+    app.openapi()
+    load_dynamodb_models()
+    return app
+
+
+class GhostServer(BaseApplication):
+    """
+    Gunicorn application serving the API with Uvicorn workers
+    """
+
+    def __init__(self, options: Dict[str, Any]):
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        self.cfg.set("worker_class", WORKER_CLASS)
+        self.cfg.set("preload_app", True)
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self) -> FastAPI:
+        return preload()
+
+
+def parse_options() -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(
+        description="Serve the API with multiple worker processes"
+    )
+    parser.add_argument("--bind", default="0.0.0.0:8000")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes, defaulting to the number of CPUs",
+    )
+    parser.add_argument(
+        "--backlog",
+        type=int,
+        default=2048,
+        help="Maximum number of pending connections",
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=int,
+        default=5,
+        help="Seconds to keep idle connections open",
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=int,
+        default=30,
+        help="Seconds workers have to finish in-flight requests on SIGTERM",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=30,
+        help="Seconds a silent worker is given before it's restarted",
+    )
+    args = parser.parse_args()
+
+    return {
+        "bind": args.bind,
+        "workers": args.workers,
+        "backlog": args.backlog,
+        "keepalive": args.keep_alive,
+        "graceful_timeout": args.graceful_timeout,
+        "timeout": args.timeout,
+    }
+
+
+if __name__ == "__main__":
+    GhostServer(parse_options()).run()
@@ -1,29 +1,75 @@
-import boto3
-from boto3.dynamodb.conditions import Attr
+import base64
+import binascii
+import contextvars
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Collection, Dict, Iterator, List, Optional, overload
 
-from ghost_api.constants import AWS_REGION, GAMES_TABLE_NAME, LOCAL_DYNAMODB_ENDPOINT
+import boto3
+from boto3.dynamodb.conditions import Attr, ConditionBase, Key
+from botocore.exceptions import ClientError
+
+from ghost_api.constants import (
+    AWS_REGION,
+    GAME_TTL_SECONDS,
+    GAMES_TABLE_NAME,
+    LOCAL_DYNAMODB_ENDPOINT,
+    STORE_SNAPSHOTS,
+)
 from ghost_api.exceptions import (
+    ConcurrentUpdate,
     GameAlreadyExists,
     GameDoesNotExist,
     GameNotStarted,
     GameStarted,
+    GamesUnavailable,
+    GhostServiceException,
+    InvalidCursor,
     InvalidMove,
+    NoFieldsRequested,
+    UnknownField,
     WrongPlayer,
 )
+from ghost_api.metrics import instrument_dynamodb, timed_methods
+from ghost_api.rendering import render_game
+from ghost_api.storage import (
+    GAME_FIELDS,
+    decode_game,
+    decode_partial_game,
+    decode_snapshot,
+    encode_game,
+    encode_moves,
+    encode_player,
+    encode_players,
+    encode_snapshot,
+    moves_unchanged,
+    players_unchanged,
+    winner_unchanged,
+)
 from ghost_api.types import (
+    BatchAction,
+    BatchActionType,
     Challenge,
     ChallengeResponse,
     ChallengeState,
     ChallengeType,
     ChallengeVote,
     GameInfo,
+    GamesPage,
     Move,
     NewChallenge,
+    PartialGameInfo,
     Player,
 )
 
+#: Per-thread DynamoDB resources, since boto3 resources aren't thread safe
+_local = threading.local()
 
-def dynamodb():
+
+def _new_dynamodb():
     config = {}
     if LOCAL_DYNAMODB_ENDPOINT is not None:
         config["endpoint_url"] = LOCAL_DYNAMODB_ENDPOINT
@@ -33,7 +79,56 @@ def dynamodb():
         msg = "Please set either AWS_REGION or LOCAL_DYNAMODB_ENDPOINT"
         raise EnvironmentError(msg)
 
-    return boto3.resource("dynamodb", **config)
+    resource = boto3.resource("dynamodb", **config)
+    instrument_dynamodb(resource.meta.client)
+    return resource
+
+
+def load_dynamodb_models() -> None:
+    """
+    Load boto3's DynamoDB models into its default session, without creating a
+    resource for the current thread.
+
+    Used before forking worker processes, which then share the loaded models
+    but create their own resources and connections.
+    """
+    _new_dynamodb()
+
+
+def dynamodb():
+    """
+    Get the DynamoDB resource of the current thread.
+
+    Creating a resource loads its service model and opens a new connection
+    pool, so one is shared by every service created on the same thread.
+    """
+    resource = getattr(_local, "dynamodb", None)
+    if resource is None:
+        resource = _local.dynamodb = _new_dynamodb()
+    return resource
+
+
+#: Maximum number of keys DynamoDB accepts in one BatchGetItem request
+BATCH_GET_CHUNK_SIZE = 100
+
+#: Maximum number of BatchGetItem requests made concurrently
+BATCH_GET_MAX_WORKERS = 8
+
+#: Number of times unprocessed keys are retried before giving up
+BATCH_GET_MAX_ATTEMPTS = 8
+
+
+#: Number of times a batch of actions is applied to a freshly read game when
+#: other requests change the game first
+BATCH_ACTIONS_MAX_ATTEMPTS = 3
+
+
+#: Name of the sparse global secondary index of games that haven't started
+LOBBY_INDEX_NAME = "lobby-index"
+
+#: Value of the lobby index's hash key attribute, only set on games that
+#: haven't started
+LOBBY_OPEN = "OPEN"
 
 
 def new_game(room_code: str) -> GameInfo:
@@ -49,11 +144,254 @@ def new_game(room_code: str) -> GameInfo:
     )
 
 
+def _write_stamps() -> Dict[str, Any]:
+    """
+    Get the attributes recording that a game has just been changed.
+
+    Games expire, and are removed by DynamoDB TTL, after a period without
+    changes. Each change also gives the game a new revision, which stored
+    snapshots are checked against.
+    """
+    now = int(time.time())
+    return {
+        "last_activity": now,
+        "expires_at": now + GAME_TTL_SECONDS,
+        "revision": uuid.uuid4().hex,
+    }
+
+
+def _game_item(game: GameInfo) -> Dict[str, Any]:
+    """
+    Get the database item storing a game
+    """
+    item = {**encode_game(game), **_write_stamps()}
+    if not game.started:
+        item["lobby"] = LOBBY_OPEN
+    return item
+
+
+#: Attributes that games are decoded from, leaving out their snapshots
+_GAME_ATTRIBUTES = (*GAME_FIELDS, "revision")
+
+
+def _projection(attributes: Collection[str]) -> Dict[str, Any]:
+    """
+    Get the arguments of a read that only returns the given attributes
+    """
+    # Many attribute names are reserved words, so all are substituted
+    return dict(
+        ProjectionExpression=", ".join(f"#{name}" for name in attributes),
+        ExpressionAttributeNames={f"#{name}": name for name in attributes},
+    )
+
+
+def _encode_cursor(last_evaluated_key: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(f"Invalid cursor {cursor!r}")
+    if not isinstance(key, dict) or set(key) != {"lobby", "room_code"}:
+        raise InvalidCursor(f"Invalid cursor {cursor!r}")
+    return key
+
+
+def _check_can_move(game: GameInfo, new_move: Move) -> None:
+    if not game.started:
+        raise GameNotStarted("Cannot make a move in a game that hasn't started")
+
+    if game.challenge is not None:
+        raise InvalidMove(f"Game {game.room_code!r} has an open challenge")
+
+    if game.turn_player_name != new_move.player_name:
+        msg = "Turn player is {!r} but {!r} tried to move"
+        raise WrongPlayer(msg.format(game.turn_player_name, new_move.player_name))
+
+    if new_move.player_name not in [player.name for player in game.players]:
+        raise InvalidMove("Must join a game to play a move")
+
+    if new_move.position in [move.position for move in game.moves]:
+        raise InvalidMove(f"There is already a move on {new_move.position.dict()}")
+
+    if len(new_move.letter) != 1:
+        raise InvalidMove("Moves can only be one letter")
+
+    # TODO: validate move position and value
+
+
+def _check_can_challenge(game: GameInfo, challenge: NewChallenge) -> None:
+    if game.challenge is not None:
+        raise InvalidMove(f"Game {game.room_code!r} already has an open challenge")
+
+    if challenge.challenger_name not in [player.name for player in game.players]:
+        msg = f"Player {challenge.challenger_name!r} not in game {game.room_code!r}"
+        raise InvalidMove(msg)
+
+    if (len(game.moves) == 0) or (challenge.move != game.moves[-1]):
+        raise InvalidMove("Can only challenge the most recent move")
+
+
+def _check_can_respond(game: GameInfo) -> None:
+    if game.challenge is None:
+        msg = f"No challenge exists on game {game.room_code!r}"
+        raise InvalidMove(msg)
+    if game.challenge.state != ChallengeState.AWAITING_RESPONSE:
+        state = game.challenge.state.value
+        msg = f"Challenge is in {state!r} state, not 'AWAITING_RESPONSE'"
+        raise InvalidMove(msg)
+
+
+def _check_can_vote(game: GameInfo, vote: ChallengeVote) -> None:
+    if game.challenge is None:
+        msg = f"No challenge exists on game {game.room_code!r}"
+        raise InvalidMove(msg)
+    if game.challenge.state != ChallengeState.VOTING:
+        state = game.challenge.state.value
+        msg = f"Challenge is in {state!r} state, not 'VOTING'"
+        raise InvalidMove(msg)
+    if vote.voter_name in [v.voter_name for v in game.challenge.votes]:
+        raise InvalidMove(f"Player {vote.voter_name!r} has already voted")
+    if vote.voter_name not in [player.name for player in game.players]:
+        msg = f"Player {vote.voter_name!r} has not joined game {game.room_code!r}"
+        raise InvalidMove(msg)
+
+
+def _open_challenge(challenge: NewChallenge) -> Challenge:
+    initial_state = (
+        ChallengeState.AWAITING_RESPONSE
+        if challenge.type is ChallengeType.NO_VALID_WORDS
+        else ChallengeState.VOTING
+    )
+
+    return Challenge(
+        challenger_name=challenge.challenger_name,
+        move=challenge.move,
+        type=challenge.type,
+        state=initial_state,
+        response=None,
+        votes=[],
+    )
+
+
+def _next_turn_player_name(game: GameInfo) -> Optional[str]:
+    if game.turn_player_name is None:
+        if len(game.players) == 0:
+            return None
+        return game.players[0].name
+
+    player_indexes = {player.name: ind for ind, player in enumerate(game.players)}
+    new_player_ind = (player_indexes[game.turn_player_name] + 1) % len(game.players)
+    return game.players[new_player_ind].name
+
+
+def _challenge_loser_name(challenge: Challenge) -> str:
+    pro_challenge_votes = [vote for vote in challenge.votes if vote.pro_challenge]
+    if len(pro_challenge_votes) / len(challenge.votes) < 0.5:
+        return challenge.challenger_name
+    return challenge.move.player_name
+
+
+@timed_methods
 class GhostService:
     def __init__(self):
         self.db = dynamodb()
         self.games_table = self.db.Table(GAMES_TABLE_NAME)
 
+    def _update_game(
+        self, game: GameInfo, updated: GameInfo, **kwargs: Any
+    ) -> GameInfo:
+        """
+        Update a game with ``update_item``, stamping the time and revision of
+        the change, and return the game as it is after the update.
+
+        ``game`` is the game as it was read, and ``updated`` is the game as the
+        update leaves it. With snapshots enabled, the snapshot of ``updated``
+        is stored by the same update, unless another request has changed the
+        game since it was read. Then the update is made without the snapshot,
+        and the stale snapshot is rebuilt when it's next read.
+
+        Takes the same keyword arguments as ``update_item``, except the key.
+        The update expression must start with a SET clause.
+        """
+        update_expression = kwargs["UpdateExpression"]
+        if not update_expression.startswith("set "):
+            raise ValueError(f"Expected a SET clause in {update_expression!r}")
+
+        stamps = _write_stamps()
+        if STORE_SNAPSHOTS:
+            snapshot = encode_snapshot(render_game(updated), stamps["revision"])
+            not_changed = (
+                Attr("revision").not_exists()
+                if game._revision is None
+                else Attr("revision").eq(game._revision)
+            )
+            try:
+                self._update_item(
+                    game.room_code, {**stamps, **snapshot}, not_changed, **kwargs
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+            else:
+                updated._revision = stamps["revision"]
+                return updated
+
+        self._update_item(game.room_code, stamps, None, **kwargs)
+        return self.read_game(game.room_code, consistent=STORE_SNAPSHOTS)
+
+    def _update_item(
+        self,
+        room_code: str,
+        attributes: Dict[str, Any],
+        condition: Optional[ConditionBase],
+        **kwargs: Any,
+    ) -> None:
+        """
+        Update a game with ``update_item``, also setting the given attributes
+        and checking the given condition
+        """
+        update_expression = kwargs.pop("UpdateExpression")
+        kwargs["UpdateExpression"] = (
+            "set "
+            + "".join(f"#{name}=:{name}, " for name in attributes)
+            + update_expression[len("set ") :]
+        )
+        kwargs["ExpressionAttributeValues"] = {
+            **kwargs.get("ExpressionAttributeValues", {}),
+            **{f":{name}": value for name, value in attributes.items()},
+        }
+        # "snapshot" is a reserved word
+        kwargs["ExpressionAttributeNames"] = {
+            **kwargs.get("ExpressionAttributeNames", {}),
+            **{f"#{name}": name for name in attributes},
+        }
+        if condition is not None:
+            kwargs["ConditionExpression"] = (
+                condition
+                if "ConditionExpression" not in kwargs
+                else kwargs["ConditionExpression"] & condition
+            )
+
+        self.games_table.update_item(Key={"room_code": room_code}, **kwargs)
+
+    def _put_game(self, game: GameInfo, **kwargs: Any) -> GameInfo:
+        """
+        Write the whole of a game with ``put_item``, with its snapshot if
+        snapshots are enabled, and return it.
+
+        Takes the same keyword arguments as ``put_item``, except the item.
+        """
+        item = _game_item(game)
+        if STORE_SNAPSHOTS:
+            item.update(encode_snapshot(render_game(game), item["revision"]))
+
+        self.games_table.put_item(Item=item, **kwargs)
+        game._revision = item["revision"]
+        return game
+
     def create_game(self, room_code: str) -> GameInfo:
         """
         Create a new game in the database
@@ -66,30 +404,214 @@ class GhostService:
         try:
             self.read_game(room_code)
         except GameDoesNotExist:
-            self.games_table.put_item(Item=dict(new_game(room_code)))
+            return self._put_game(new_game(room_code))
         else:
             raise GameAlreadyExists(f"Game {room_code!r} already exists")
 
-        return self.read_game(room_code)
+    @overload
+    def read_game(
+        self,
+        room_code: str,
+        consistent: bool = ...,
+        fields: None = ...,
+    ) -> GameInfo: ...
+
+    @overload
+    def read_game(
+        self,
+        room_code: str,
+        consistent: bool = ...,
+        *,
+        fields: Collection[str],
+    ) -> PartialGameInfo: ...
 
-    def read_game(self, room_code: str, consistent=False) -> GameInfo:
+    def read_game(self, room_code, consistent=False, fields=None):
         """
-        Read a game state from the database
+        Read a game state from the database.
+
+        If ``fields`` is given, only those fields of the game are read and a
+        ``PartialGameInfo`` is returned.
 
         Raises
         ------
         GameDoesNotExist
             If the game doesn't exist
+        UnknownField
+            If any of the fields aren't fields of a game
+        NoFieldsRequested
+            If ``fields`` is empty
         """
+        attributes = _GAME_ATTRIBUTES
+        if fields is not None:
+            fields = list(dict.fromkeys(fields))
+            if len(fields) == 0:
+                raise NoFieldsRequested("At least one field must be requested")
+            unknown_fields = sorted(set(fields) - set(GAME_FIELDS))
+            if len(unknown_fields) > 0:
+                raise UnknownField(f"Games have no fields {unknown_fields!r}")
+            attributes = fields
+
         response = self.games_table.get_item(
             Key={"room_code": room_code},
             ConsistentRead=consistent,
+            **_projection(attributes),
         )
 
         if "Item" not in response:
             raise GameDoesNotExist(f"Game {room_code!r} does not exist")
 
-        return GameInfo.parse_obj(response["Item"])
+        if fields is not None:
+            return decode_partial_game(response["Item"], fields)
+        return decode_game(response["Item"])
+
+    def read_game_json(self, room_code: str) -> bytes:
+        """
+        Read a game from the database, rendered as the JSON returned by the
+        API.
+
+        The stored snapshot is returned if it is current. Otherwise the game is
+        rendered, and its snapshot stored if snapshots are enabled.
+
+        Raises
+        ------
+        GameDoesNotExist
+            If the game doesn't exist
+        """
+        response = self.games_table.get_item(Key={"room_code": room_code})
+
+        if "Item" not in response:
+            raise GameDoesNotExist(f"Game {room_code!r} does not exist")
+
+        item = response["Item"]
+        body = decode_snapshot(item)
+        if body is None:
+            body = render_game(decode_game(item))
+            if STORE_SNAPSHOTS:
+                self._store_snapshot(item, body)
+        return body
+
+    def _store_snapshot(self, item: Dict[str, Any], body: bytes) -> None:
+        """
+        Store the rendered game of an item, unless the game has changed since
+        the item was read
+        """
+        revision = item.get("revision")
+        if revision is None:
+            # Games stored before revisions were added get one on their next
+            # change
+            return
+
+        snapshot = encode_snapshot(body, revision)
+        try:
+            self.games_table.update_item(
+                Key={"room_code": item["room_code"]},
+                UpdateExpression="set "
+                + ", ".join(f"#{name}=:{name}" for name in snapshot),
+                ExpressionAttributeValues={
+                    f":{name}": value for name, value in snapshot.items()
+                },
+                # "snapshot" is a reserved word
+                ExpressionAttributeNames={f"#{name}": name for name in snapshot},
+                ConditionExpression=Attr("revision").eq(revision),
+            )
+        except self.games_table.meta.client.exceptions.ConditionalCheckFailedException:
+            pass
+
+    def read_games(self, room_codes: List[str]) -> Iterator[GameInfo]:
+        """
+        Read many games from the database, yielding them as they arrive.
+
+        Games are fetched in parallel BatchGetItem requests, so they are not
+        yielded in any particular order. Room codes of games that don't exist
+        are skipped.
+
+        Raises
+        ------
+        GamesUnavailable
+            If some games still couldn't be read after retrying
+        """
+        keys = [{"room_code": code} for code in dict.fromkeys(room_codes)]
+        chunks = [
+            keys[i : i + BATCH_GET_CHUNK_SIZE]
+            for i in range(0, len(keys), BATCH_GET_CHUNK_SIZE)
+        ]
+        if len(chunks) == 0:
+            return
+
+        with ThreadPoolExecutor(
+            max_workers=min(len(chunks), BATCH_GET_MAX_WORKERS)
+        ) as executor:
+            # Run in the context of the request, so the calls are counted
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._batch_get, chunk)
+                for chunk in chunks
+            ]
+            for future in as_completed(futures):
+                for item in future.result():
+                    yield decode_game(item)
+
+    def _batch_get(self, keys: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Get up to 100 games with BatchGetItem, retrying any unprocessed keys
+        with exponential backoff
+        """
+        # The resource's client is thread safe, unlike the resource itself
+        client = self.db.meta.client
+
+        items = []
+        request_items = {
+            GAMES_TABLE_NAME: {"Keys": keys, **_projection(_GAME_ATTRIBUTES)}
+        }
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            if attempt > 0:
+                time.sleep(0.05 * 2 ** (attempt - 1))
+
+            response = client.batch_get_item(RequestItems=request_items)
+            items.extend(response["Responses"].get(GAMES_TABLE_NAME, []))
+
+            request_items = response.get("UnprocessedKeys", {})
+            if len(request_items) == 0:
+                return items
+
+        raise GamesUnavailable("Some games could not be read, please try again")
+
+    def list_open_games(
+        self,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> GamesPage:
+        """
+        List games that haven't started yet, in room code order, a page at a
+        time.
+
+        Only games in the sparse lobby index are read, so the cost doesn't grow
+        with the number of started or finished games.
+
+        Raises
+        ------
+        InvalidCursor
+            If the cursor isn't one returned by a previous page
+        """
+        query: Dict[str, Any] = dict(
+            IndexName=LOBBY_INDEX_NAME,
+            KeyConditionExpression=Key("lobby").eq(LOBBY_OPEN),
+            Limit=limit,
+            **_projection(_GAME_ATTRIBUTES),
+        )
+        if cursor is not None:
+            query["ExclusiveStartKey"] = _decode_cursor(cursor)
+
+        response = self.games_table.query(**query)
+
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        return GamesPage(
+            games=[decode_game(item) for item in response["Items"]],
+            cursor=(
+                None
+                if last_evaluated_key is None
+                else _encode_cursor(last_evaluated_key)
+            ),
+        )
 
     def delete_game(self, room_code: str) -> None:
         """
@@ -101,13 +623,14 @@ class GhostService:
         """
         Start a game if it isn't already started
         """
-        self.read_game(room_code)
-        self.games_table.update_item(
-            Key={"room_code": room_code},
-            UpdateExpression="set started=:s",
+        game = self.read_game(room_code)
+        return self._update_game(
+            game,
+            game.copy(update={"started": True}),
+            # Started games are dropped from the lobby index
+            UpdateExpression="set started=:s remove lobby",
             ExpressionAttributeValues={":s": True},
         )
-        return self.read_game(room_code)
 
     def add_player(self, room_code: str, new_player: Player) -> GameInfo:
         """
@@ -133,38 +656,28 @@ class GhostService:
             if game.turn_player_name is not None
             else new_player.name
         )
+        updated = game.copy(
+            update={
+                "players": game.players + [new_player],
+                "turn_player_name": turn_player_name,
+            }
+        )
 
-        self.games_table.update_item(
-            Key={"room_code": room_code},
-            UpdateExpression=(
-                "set turn_player_name=:t, players=list_append(players, :p)"
-            ),
+        return self._update_game(
+            game,
+            updated,
+            UpdateExpression=("set turn_player_name=:t, players=:p"),
             ExpressionAttributeValues={
-                ":p": [new_player.dict()],
+                ":p": encode_players(updated.players),
                 ":t": turn_player_name,
             },
-            ConditionExpression=Attr("players").eq(game.dict()["players"]),
+            ConditionExpression=players_unchanged(game, "players"),
         )
-        return self.read_game(room_code)
-
-    def _determine_winner(self, room_code: str) -> None:
-        """
-        Determine if there's a winner and update the game in the database if so
-        """
-        game = self.read_game(room_code)
-        if (len(game.players) == 1) and game.started:
-            (winner,) = game.players
-            self.games_table.update_item(
-                Key={"room_code": room_code},
-                UpdateExpression=("set winner=:p"),
-                ExpressionAttributeValues={
-                    ":p": winner.dict(),
-                },
-            )
 
     def remove_player(self, room_code: str, player_name: str) -> GameInfo:
         """
         Remove a player from the game, updating the turn player if necessary.
+        If only one player is left in a started game, they win.
         """
         game = self.read_game(room_code)
         new_player_list = game.players.copy()
@@ -188,42 +701,25 @@ class GhostService:
                 turn_player = new_player_list[player_index % len(new_player_list)]
                 turn_player_name = turn_player.name
 
-        self.games_table.update_item(
-            Key={"room_code": room_code},
-            UpdateExpression=("set turn_player_name=:t, players=:p"),
-            ExpressionAttributeValues={
-                ":t": turn_player_name,
-                ":p": [player.dict() for player in new_player_list],
-            },
-            ConditionExpression=Attr("players").eq(game.dict()["players"]),
+        updated = game.copy(
+            update={"players": new_player_list, "turn_player_name": turn_player_name}
         )
-
-        self._determine_winner(room_code)
-
-        return self.read_game(room_code)
-
-    def _advance_turn(self, game: GameInfo) -> None:
-        if game.turn_player_name is None:
-            if len(game.players) == 0:
-                new_player_name = None
-            else:
-                new_player_name = game.players[0].name
-        else:
-            player_indexes = {
-                player.name: ind for ind, player in enumerate(game.players)
-            }
-            new_player_ind = (player_indexes[game.turn_player_name] + 1) % len(
-                game.players
-            )
-            new_player_name = game.players[new_player_ind].name
-
-        self.games_table.update_item(
-            Key={"room_code": game.room_code},
-            UpdateExpression=("set turn_player_name=:p"),
-            ExpressionAttributeValues={
-                ":p": new_player_name,
-            },
-            ConditionExpression=Attr("players").eq(game.dict()["players"]),
+        update_expression = "set turn_player_name=:t, players=:p"
+        values: Dict[str, Any] = {
+            ":t": turn_player_name,
+            ":p": encode_players(new_player_list),
+        }
+        if (len(new_player_list) == 1) and game.started:
+            (updated.winner,) = new_player_list
+            update_expression += ", winner=:w"
+            values[":w"] = encode_player(updated.winner)
+
+        return self._update_game(
+            game,
+            updated,
+            UpdateExpression=update_expression,
+            ExpressionAttributeValues=values,
+            ConditionExpression=players_unchanged(game, "players"),
         )
 
     def add_move(self, room_code: str, new_move: Move) -> GameInfo:
@@ -243,47 +739,35 @@ class GhostService:
             If the game hasn't started yet
         """
         game = self.read_game(room_code)
-        if not game.started:
-            raise GameNotStarted("Cannot make a move in a game that hasn't started")
-
-        if game.challenge is not None:
-            raise InvalidMove(f"Game {room_code!r} has an open challenge")
-
-        if game.turn_player_name != new_move.player_name:
-            msg = "Turn player is {!r} but {!r} tried to move"
-            raise WrongPlayer(msg.format(game.turn_player_name, new_move.player_name))
-
-        if new_move.player_name not in [player.name for player in game.players]:
-            raise InvalidMove("Must join a game to play a move")
-
-        if new_move.position in [move.position for move in game.moves]:
-            raise InvalidMove(f"There is already a move on {new_move.position.dict()}")
-
-        if len(new_move.letter) != 1:
-            raise InvalidMove("Moves can only be one letter")
+        _check_can_move(game, new_move)
 
-        # TODO: validate move position and value
+        updated = game.copy(
+            update={
+                "moves": game.moves + [new_move],
+                "turn_player_name": _next_turn_player_name(game),
+            }
+        )
 
-        self.games_table.update_item(
-            Key={"room_code": room_code},
-            UpdateExpression=("set moves=list_append(moves, :m)"),
+        return self._update_game(
+            game,
+            updated,
+            UpdateExpression=("set moves=:m, turn_player_name=:t"),
             ExpressionAttributeValues={
-                ":m": [new_move.dict()],
+                ":m": encode_moves(updated.moves),
+                ":t": updated.turn_player_name,
             },
-            ConditionExpression=Attr("moves").eq(game.dict()["moves"]),
+            ConditionExpression=(
+                moves_unchanged(game) & players_unchanged(game, "players")
+            ),
         )
 
-        self._advance_turn(game)
-
-        return self.read_game(room_code)
-
     def create_challenge(
         self,
         room_code: str,
         challenge: NewChallenge,
     ) -> GameInfo:
         """
-        Create a new challenge of a given move
+        Create a new challenge of a given move, also updating the turn player
 
         Raises
         ------
@@ -293,43 +777,28 @@ class GhostService:
             If the challenge cannot be made
         """
         game = self.read_game(room_code)
+        _check_can_challenge(game, challenge)
 
-        if game.challenge is not None:
-            raise InvalidMove(f"Game {room_code!r} already has an open challenge")
-
-        if challenge.challenger_name not in [player.name for player in game.players]:
-            msg = f"Player {challenge.challenger_name!r} not in game {room_code!r}"
-            raise InvalidMove(msg)
-
-        if (len(game.moves) == 0) or (challenge.move != game.moves[-1]):
-            raise InvalidMove("Can only challenge the most recent move")
-
-        initial_state = (
-            ChallengeState.AWAITING_RESPONSE
-            if challenge.type is ChallengeType.NO_VALID_WORDS
-            else ChallengeState.VOTING
-        )
-
-        game_challenge = Challenge(
-            challenger_name=challenge.challenger_name,
-            move=challenge.move,
-            type=challenge.type,
-            state=initial_state,
-            response=None,
-            votes=[],
+        updated = game.copy(
+            update={
+                "challenge": _open_challenge(challenge),
+                "turn_player_name": _next_turn_player_name(game),
+            }
         )
 
-        self.games_table.update_item(
-            Key={"room_code": room_code},
-            UpdateExpression=("set challenge=:c"),
-            ExpressionAttributeValues={":c": game_challenge.dict()},
-            ConditionExpression=Attr("challenge").eq(None),
+        return self._update_game(
+            game,
+            updated,
+            UpdateExpression=("set challenge=:c, turn_player_name=:t"),
+            ExpressionAttributeValues={
+                ":c": updated.dict()["challenge"],
+                ":t": updated.turn_player_name,
+            },
+            ConditionExpression=(
+                Attr("challenge").eq(None) & players_unchanged(game, "players")
+            ),
         )
 
-        self._advance_turn(game)
-
-        return self.read_game(room_code)
-
     def create_challenge_response(
         self,
         room_code: str,
@@ -346,17 +815,23 @@ class GhostService:
             If the challenge response is invalid
         """
         game = self.read_game(room_code)
+        _check_can_respond(game)
+        assert game.challenge is not None
+
+        updated = game.copy(
+            update={
+                "challenge": game.challenge.copy(
+                    update={
+                        "response": challenge_response,
+                        "state": ChallengeState.VOTING,
+                    }
+                )
+            }
+        )
 
-        if game.challenge is None:
-            msg = f"No challenge exists on game {room_code!r}"
-            raise InvalidMove(msg)
-        if game.challenge.state != ChallengeState.AWAITING_RESPONSE:
-            state = game.challenge.state.value
-            msg = f"Challenge is in {state!r} state, not 'AWAITING_RESPONSE'"
-            raise InvalidMove(msg)
-
-        self.games_table.update_item(
-            Key={"room_code": room_code},
+        return self._update_game(
+            game,
+            updated,
             UpdateExpression=("set challenge.#chalresp=:r, challenge.#chalstate=:s"),
             ExpressionAttributeValues={
                 ":r": challenge_response.dict(),
@@ -370,47 +845,6 @@ class GhostService:
             ConditionExpression=Attr("challenge").eq(game.dict()["challenge"]),
         )
 
-        return self.read_game(room_code)
-
-    def _complete_challenge(self, game: GameInfo) -> None:
-        if game.challenge is None:
-            raise ValueError("Cannot complete a nonexistent challenge")
-        # All votes in, apply the result
-        pro_challenge_votes = [
-            vote for vote in game.challenge.votes if vote.pro_challenge
-        ]
-        if len(pro_challenge_votes) / len(game.challenge.votes) < 0.5:
-            loser_name = game.challenge.challenger_name
-        else:
-            loser_name = game.challenge.move.player_name
-
-        if loser_name == game.turn_player_name:
-            self._advance_turn(game)
-
-        remaining_players = [
-            player for player in game.players if player.name != loser_name
-        ]
-        (loser,) = [player for player in game.players if player.name == loser_name]
-
-        self.games_table.update_item(
-            Key={"room_code": game.room_code},
-            UpdateExpression=(
-                "set challenge=:n, players=:p, losers=list_append(losers, :l)"
-            ),
-            ExpressionAttributeValues={
-                ":n": None,
-                ":p": [player.dict() for player in remaining_players],
-                ":l": [loser.dict()],
-            },
-            ConditionExpression=(
-                Attr("players").eq(game.dict()["players"])
-                & Attr("challenge").eq(game.dict()["challenge"])
-                & Attr("losers").eq(game.dict()["losers"])
-            ),
-        )
-
-        self._determine_winner(game.room_code)
-
     def add_challenge_vote(self, room_code: str, vote: ChallengeVote) -> GameInfo:
         """
         Vote on a challenge in the VOTING stage.
@@ -425,33 +859,177 @@ class GhostService:
             If the vote can't be cast
         """
         game = self.read_game(room_code)
+        _check_can_vote(game, vote)
+        assert game.challenge is not None
+
+        updated = game.copy(
+            update={
+                "challenge": game.challenge.copy(
+                    update={"votes": game.challenge.votes + [vote]}
+                ),
+                "losers": game.losers.copy(),
+            }
+        )
+        assert updated.challenge is not None
+
+        if len(updated.challenge.votes) < len(updated.players):
+            return self._update_game(
+                game,
+                updated,
+                UpdateExpression=(
+                    "set challenge.votes=list_append(challenge.votes, :v)"
+                ),
+                ExpressionAttributeValues={
+                    ":v": [vote.dict()],
+                },
+                ConditionExpression=Attr("challenge").eq(game.dict()["challenge"]),
+            )
 
-        if game.challenge is None:
-            msg = f"No challenge exists on game {room_code!r}"
-            raise InvalidMove(msg)
-        if game.challenge.state != ChallengeState.VOTING:
-            state = game.challenge.state.value
-            msg = f"Challenge is in {state!r} state, not 'VOTING'"
-            raise InvalidMove(msg)
-        if vote.voter_name in [v.voter_name for v in game.challenge.votes]:
-            raise InvalidMove(f"Player {vote.voter_name!r} has already voted")
-        if vote.voter_name not in [player.name for player in game.players]:
-            msg = f"Player {vote.voter_name!r} has not joined game {room_code!r}"
-            raise InvalidMove(msg)
-
-        self.games_table.update_item(
-            Key={"room_code": room_code},
-            UpdateExpression=("set challenge.votes=list_append(challenge.votes, :v)"),
-            ExpressionAttributeValues={
-                ":v": [vote.dict()],
-            },
-            ConditionExpression=Attr("challenge").eq(game.dict()["challenge"]),
+        # All votes in, apply the result
+        _resolve_challenge(updated)
+        update_expression = (
+            "set challenge=:n, players=:p, losers=:l, turn_player_name=:t"
+        )
+        values: Dict[str, Any] = {
+            ":n": None,
+            ":p": encode_players(updated.players),
+            ":l": encode_players(updated.losers),
+            ":t": updated.turn_player_name,
+        }
+        if updated.winner is not None:
+            update_expression += ", winner=:w"
+            values[":w"] = encode_player(updated.winner)
+
+        return self._update_game(
+            game,
+            updated,
+            UpdateExpression=update_expression,
+            ExpressionAttributeValues=values,
+            ConditionExpression=(
+                players_unchanged(game, "players")
+                & Attr("challenge").eq(game.dict()["challenge"])
+                & players_unchanged(game, "losers")
+            ),
         )
 
-        game = self.read_game(room_code, consistent=True)
+    def apply_actions(self, room_code: str, actions: List[BatchAction]) -> GameInfo:
+        """
+        Apply a sequence of actions to a game in order, with a single read and
+        a single write.
 
-        if game.challenge is not None:
-            if len(game.challenge.votes) == len(game.players):
-                self._complete_challenge(game)
+        Either every action is applied or none are. The write is conditional
+        on the game not having been changed by another request in the
+        meantime. If it has, the actions are applied again to the changed
+        game, up to ``BATCH_ACTIONS_MAX_ATTEMPTS`` times.
 
-        return self.read_game(room_code)
+        Raises
+        ------
+        GameDoesNotExist
+            If the game doesn't exist
+        GhostServiceException
+            The exception raised by the first action that can't be applied,
+            with the index of the action in its message
+        ConcurrentUpdate
+            If the game was changed by another request on every attempt
+        """
+        for _ in range(BATCH_ACTIONS_MAX_ATTEMPTS):
+            original = self.read_game(room_code, consistent=True)
+            game = original.copy(deep=True)
+
+            for index, action in enumerate(actions):
+                try:
+                    _apply_action(game, action)
+                except GhostServiceException as e:
+                    raise type(e)(f"Action {index}: {e}") from e
+
+            if game == original:
+                return game
+
+            stored = original.dict()
+            try:
+                # The write is conditional on every field, so the game is
+                # stored exactly as it was written
+                return self._put_game(
+                    game,
+                    ConditionExpression=(
+                        Attr("room_code").exists()
+                        & Attr("started").eq(stored["started"])
+                        & winner_unchanged(original)
+                        & players_unchanged(original, "players")
+                        & players_unchanged(original, "losers")
+                        & Attr("turn_player_name").eq(stored["turn_player_name"])
+                        & moves_unchanged(original)
+                        & Attr("challenge").eq(stored["challenge"])
+                    ),
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+
+        msg = f"Game {room_code!r} was changed by other requests while applying actions"
+        raise ConcurrentUpdate(msg)
+
+
+def _apply_action(game: GameInfo, action: BatchAction) -> None:
+    """
+    Apply a single batch action to a game in place, mirroring the effect of the
+    equivalent ``GhostService`` method
+    """
+    if action.type is BatchActionType.JOIN:
+        assert action.player is not None
+        if game.started:
+            raise GameStarted("Cannot join a game that's started")
+        if action.player.name in [player.name for player in game.players + game.losers]:
+            return
+        if game.turn_player_name is None:
+            game.turn_player_name = action.player.name
+        game.players.append(action.player)
+
+    elif action.type is BatchActionType.START:
+        game.started = True
+
+    elif action.type is BatchActionType.MOVE:
+        assert action.move is not None
+        _check_can_move(game, action.move)
+        game.moves.append(action.move)
+        game.turn_player_name = _next_turn_player_name(game)
+
+    elif action.type is BatchActionType.CHALLENGE:
+        assert action.challenge is not None
+        _check_can_challenge(game, action.challenge)
+        game.challenge = _open_challenge(action.challenge)
+        game.turn_player_name = _next_turn_player_name(game)
+
+    elif action.type is BatchActionType.CHALLENGE_RESPONSE:
+        assert action.challenge_response is not None
+        _check_can_respond(game)
+        assert game.challenge is not None
+        game.challenge.response = action.challenge_response
+        game.challenge.state = ChallengeState.VOTING
+
+    elif action.type is BatchActionType.CHALLENGE_VOTE:
+        assert action.vote is not None
+        _check_can_vote(game, action.vote)
+        assert game.challenge is not None
+        game.challenge.votes.append(action.vote)
+        if len(game.challenge.votes) == len(game.players):
+            _resolve_challenge(game)
+
+
+def _resolve_challenge(game: GameInfo) -> None:
+    """
+    Apply the result of a fully voted challenge to a game in place
+    """
+    assert game.challenge is not None
+    loser_name = _challenge_loser_name(game.challenge)
+
+    if loser_name == game.turn_player_name:
+        game.turn_player_name = _next_turn_player_name(game)
+
+    (loser,) = [player for player in game.players if player.name == loser_name]
+    game.players = [player for player in game.players if player.name != loser_name]
+    game.losers.append(loser)
+    game.challenge = None
+
+    if (len(game.players) == 1) and game.started:
+        (game.winner,) = game.players
@@ -0,0 +1,408 @@
+"""
+Conversion between games and the items storing them in DynamoDB
+"""
+
+import zlib
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from boto3.dynamodb.conditions import Attr, ConditionBase
+from boto3.dynamodb.types import Binary
+from pydantic import BaseModel
+
+from ghost_api.avatars import default_image_url
+from ghost_api.types import (
+    Challenge,
+    ChallengeResponse,
+    ChallengeState,
+    ChallengeType,
+    ChallengeVote,
+    GameInfo,
+    Move,
+    PartialGameInfo,
+    Player,
+    Position,
+)
+
+# Items are only ever written by this service from validated models, so they
+# are decoded without pydantic validation. DynamoDB returns all numbers as
+# ``Decimal``, so those are converted back explicitly.
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+def _trusted(model: Type[Model], **values: Any) -> Model:
+    """
+    Create a model from values for all of its fields, without validation.
+
+    Like ``model.construct``, but without the overhead of filling in defaults,
+    which is significant when creating hundreds of moves.
+    """
+    instance = model.__new__(model)
+    object.__setattr__(instance, "__dict__", values)
+    object.__setattr__(instance, "__fields_set__", set(values))
+    return instance
+
+
+# Players are stored as just their name when their image is the default one
+# generated from their name, which is the case for all guest logins. Otherwise
+# the custom image URL is stored too.
+
+
+def encode_player(player: Player) -> Dict[str, str]:
+    """
+    Encode a player in the compact form they are stored in
+    """
+    if player.image_url == default_image_url(player.name):
+        return {"name": player.name}
+    return {"name": player.name, "image_url": player.image_url}
+
+
+def encode_players(players: List[Player]) -> List[Dict[str, str]]:
+    """
+    Encode a list of players in the compact form they are stored in
+    """
+    return [encode_player(player) for player in players]
+
+
+def _decode_player(value: Dict[str, Any]) -> Player:
+    name = value["name"]
+    image_url = value.get("image_url")
+    if image_url is None:
+        image_url = default_image_url(name)
+    return _trusted(Player, name=name, image_url=image_url)
+
+
+def _is_legacy_player(value: Dict[str, Any]) -> bool:
+    # Compact players omit the default image, and are otherwise the same
+    return value.get("image_url") == default_image_url(value["name"])
+
+
+def _decode_optional_player(value: Optional[Dict[str, Any]]) -> Optional[Player]:
+    return None if value is None else _decode_player(value)
+
+
+def _decode_move(value: Dict[str, Any]) -> Move:
+    position = value["position"]
+    return _trusted(
+        Move,
+        player_name=value["player_name"],
+        position=_trusted(Position, x=int(position["x"]), y=int(position["y"])),
+        letter=value["letter"],
+    )
+
+
+# Moves are stored packed into a binary attribute rather than as a list of
+# maps, which is mostly made up of attribute names. The format is a version
+# byte, the number of distinct player names, then each name as a length and
+# UTF-8 bytes. This is followed by each move as the index of its player's
+# name, its x and y positions and its letter as a length and UTF-8 bytes. All
+# integers are varints, and positions are zigzag encoded so that negative
+# values stay small.
+
+#: Version of the packed moves format
+PACKED_MOVES_VERSION = 1
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _write_string(buffer: bytearray, value: str) -> None:
+    encoded = value.encode()
+    _write_varint(buffer, len(encoded))
+    buffer.extend(encoded)
+
+
+def _read_string(data: bytes, offset: int) -> Tuple[str, int]:
+    length, offset = _read_varint(data, offset)
+    end = offset + length
+    return data[offset:end].decode(), end
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if value % 2 == 0 else -((value + 1) >> 1)
+
+
+def encode_moves(moves: List[Move]) -> Binary:
+    """
+    Pack moves into the binary format they are stored in
+    """
+    name_indexes: Dict[str, int] = {}
+    for move in moves:
+        name_indexes.setdefault(move.player_name, len(name_indexes))
+
+    buffer = bytearray([PACKED_MOVES_VERSION])
+    _write_varint(buffer, len(name_indexes))
+    for name in name_indexes:
+        _write_string(buffer, name)
+
+    for move in moves:
+        _write_varint(buffer, name_indexes[move.player_name])
+        _write_varint(buffer, _zigzag(move.position.x))
+        _write_varint(buffer, _zigzag(move.position.y))
+        _write_string(buffer, move.letter)
+
+    return Binary(bytes(buffer))
+
+
+def _decode_packed_moves(data: bytes) -> List[Move]:
+    if data[0] != PACKED_MOVES_VERSION:
+        raise ValueError(f"Unknown packed moves version {data[0]}")
+
+    n_names, offset = _read_varint(data, 1)
+    names = []
+    for _ in range(n_names):
+        name, offset = _read_string(data, offset)
+        names.append(name)
+
+    moves = []
+    end = len(data)
+    while offset < end:
+        # Varints below 128 are a single byte, which is the common case for
+        # every field, so those are read inline
+        name_index = data[offset]
+        if name_index < 0x80:
+            offset += 1
+        else:
+            name_index, offset = _read_varint(data, offset)
+        x = data[offset]
+        if x < 0x80:
+            offset += 1
+        else:
+            x, offset = _read_varint(data, offset)
+        y = data[offset]
+        if y < 0x80:
+            offset += 1
+        else:
+            y, offset = _read_varint(data, offset)
+        letter, offset = _read_string(data, offset)
+
+        moves.append(
+            _trusted(
+                Move,
+                player_name=names[name_index],
+                position=_trusted(Position, x=_unzigzag(x), y=_unzigzag(y)),
+                letter=letter,
+            )
+        )
+    return moves
+
+
+def _decode_moves(value: Union[Binary, List[Dict[str, Any]]]) -> List[Move]:
+    if isinstance(value, list):
+        # Stored before moves were packed
+        return [_decode_move(move) for move in value]
+    return _decode_packed_moves(value.value)
+
+
+# Games may still be stored in the layout used before moves were packed and
+# players were compacted. Every write replaces the whole attribute in the
+# current layout, so conditions on those attributes compare against the layout
+# the game was read in.
+
+
+def moves_unchanged(game: GameInfo) -> ConditionBase:
+    """
+    Condition that a game's stored moves are still those it was read with
+    """
+    if "moves" in game._legacy_attributes:
+        return Attr("moves").eq([move.dict() for move in game.moves])
+    return Attr("moves").eq(encode_moves(game.moves))
+
+
+def players_unchanged(game: GameInfo, attribute: str) -> ConditionBase:
+    """
+    Condition that a game's stored list of players in ``attribute`` is still
+    the one it was read with
+    """
+    players: List[Player] = getattr(game, attribute)
+    if attribute in game._legacy_attributes:
+        return Attr(attribute).eq([player.dict() for player in players])
+    return Attr(attribute).eq(encode_players(players))
+
+
+def winner_unchanged(game: GameInfo) -> ConditionBase:
+    """
+    Condition that a game's stored winner is still the one it was read with
+    """
+    if game.winner is None:
+        return Attr("winner").eq(None)
+    if "winner" in game._legacy_attributes:
+        return Attr("winner").eq(game.winner.dict())
+    return Attr("winner").eq(encode_player(game.winner))
+
+
+def encode_game(game: GameInfo) -> Dict[str, Any]:
+    """
+    Encode a game as the attributes of a games table item
+    """
+    return {
+        **game.dict(),
+        "winner": None if game.winner is None else encode_player(game.winner),
+        "players": encode_players(game.players),
+        "losers": encode_players(game.losers),
+        "moves": encode_moves(game.moves),
+    }
+
+
+def _decode_challenge(value: Optional[Dict[str, Any]]) -> Optional[Challenge]:
+    if value is None:
+        return None
+
+    response = value["response"]
+    return _trusted(
+        Challenge,
+        challenger_name=value["challenger_name"],
+        move=_decode_move(value["move"]),
+        type=ChallengeType(value["type"]),
+        state=ChallengeState(value["state"]),
+        response=(
+            None
+            if response is None
+            else _trusted(
+                ChallengeResponse,
+                row_word=response["row_word"],
+                col_word=response["col_word"],
+            )
+        ),
+        votes=[
+            _trusted(
+                ChallengeVote,
+                voter_name=vote["voter_name"],
+                pro_challenge=vote["pro_challenge"],
+            )
+            for vote in value["votes"]
+        ],
+    )
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _decode_players(value: List[Dict[str, Any]]) -> List[Player]:
+    return [_decode_player(player) for player in value]
+
+
+#: Decoder for the stored attribute of each ``GameInfo`` field
+_FIELD_DECODERS: Dict[str, Callable[[Any], Any]] = {
+    "room_code": _identity,
+    "started": _identity,
+    "winner": _decode_optional_player,
+    "players": _decode_players,
+    "losers": _decode_players,
+    "turn_player_name": _identity,
+    "moves": _decode_moves,
+    "challenge": _decode_challenge,
+}
+
+#: Check of whether each attribute whose layout has changed is stored in the
+#: old layout
+_LEGACY_LAYOUT_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "winner": lambda value: value is not None and _is_legacy_player(value),
+    "players": lambda value: any(_is_legacy_player(player) for player in value),
+    "losers": lambda value: any(_is_legacy_player(player) for player in value),
+    "moves": lambda value: isinstance(value, list),
+}
+
+#: Names of the fields of a game, which are also the names of the attributes
+#: they are stored in
+GAME_FIELDS = tuple(_FIELD_DECODERS)
+
+
+def decode_game(item: Dict[str, Any]) -> GameInfo:
+    """
+    Decode a games table item written by this service, without validation.
+
+    Use ``GameInfo.parse_obj`` instead for data that didn't come from the games
+    table.
+    """
+    game = _trusted(
+        GameInfo,
+        **{field: decode(item[field]) for field, decode in _FIELD_DECODERS.items()},
+    )
+    legacy_attributes = frozenset(
+        attribute
+        for attribute, is_legacy in _LEGACY_LAYOUT_CHECKS.items()
+        if is_legacy(item[attribute])
+    )
+    object.__setattr__(game, "_legacy_attributes", legacy_attributes)
+    object.__setattr__(game, "_revision", item.get("revision"))
+    return game
+
+
+def decode_partial_game(
+    item: Dict[str, Any], fields: Collection[str]
+) -> PartialGameInfo:
+    """
+    Decode the given fields of a games table item written by this service,
+    without validation. Only those fields are set on the partial game.
+    """
+    return PartialGameInfo.construct(
+        _fields_set=set(fields),
+        **{field: _FIELD_DECODERS[field](item[field]) for field in fields},
+    )
+
+
+# A game may be stored with a snapshot of its rendered JSON, compressed with
+# zlib. The snapshot is tagged with the revision of the game it was rendered
+# from and the version of the snapshot schema, and is only used if both still
+# match. Bump the version whenever the rendered JSON changes.
+
+#: Version of the rendered JSON stored in snapshots
+SNAPSHOT_SCHEMA_VERSION = 1
+
+
+def encode_snapshot(body: bytes, revision: str) -> Dict[str, Any]:
+    """
+    Encode a rendered game as the snapshot attributes of its item
+    """
+    return {
+        "snapshot": Binary(zlib.compress(body)),
+        "snapshot_revision": revision,
+        "snapshot_version": SNAPSHOT_SCHEMA_VERSION,
+    }
+
+
+def decode_snapshot(item: Dict[str, Any]) -> Optional[bytes]:
+    """
+    Decode the rendered game stored in an item, if it has a snapshot that is
+    still current
+    """
+    if "snapshot" not in item:
+        return None
+    if item["snapshot_version"] != SNAPSHOT_SCHEMA_VERSION:
+        return None
+    if item["snapshot_revision"] != item.get("revision"):
+        return None
+    return zlib.decompress(item["snapshot"].value)
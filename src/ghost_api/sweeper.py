@@ -0,0 +1,113 @@
+import threading
+import time
+from typing import Optional
+
+from boto3.dynamodb.conditions import Attr
+
+from ghost_api.constants import (
+    GAMES_TABLE_NAME,
+    SWEEP_INTERVAL_SECONDS,
+    SWEEP_MAX_DELETES_PER_SECOND,
+)
+from ghost_api.logging import get_logger
+from ghost_api.service import dynamodb
+
+logger = get_logger()
+
+
+def sweep_expired_games(
+    games_table,
+    now: Optional[float] = None,
+    max_deletes_per_second: float = SWEEP_MAX_DELETES_PER_SECOND,
+    stop: Optional[threading.Event] = None,
+) -> int:
+    """
+    Delete games whose ``expires_at`` time has passed, for backends that don't
+    implement DynamoDB TTL.
+
+    Deletes are spread out to at most ``max_deletes_per_second``, and are
+    conditional on the game still being expired, so a game changed during the
+    sweep is kept.
+
+    Returns the number of games deleted.
+    """
+    if now is None:
+        now = time.time()
+    expires_before = int(now)
+    delete_interval = 1 / max_deletes_per_second
+
+    scan_kwargs = dict(
+        FilterExpression=Attr("expires_at").lt(expires_before),
+        ProjectionExpression="room_code",
+    )
+    deleted = 0
+    while True:
+        response = games_table.scan(**scan_kwargs)
+        for item in response["Items"]:
+            if stop is not None and stop.is_set():
+                return deleted
+
+            started_at = time.monotonic()
+            try:
+                games_table.delete_item(
+                    Key={"room_code": item["room_code"]},
+                    ConditionExpression=Attr("expires_at").lt(expires_before),
+                )
+            except games_table.meta.client.exceptions.ConditionalCheckFailedException:
+                pass
+            else:
+                deleted += 1
+
+            elapsed = time.monotonic() - started_at
+            time.sleep(max(0.0, delete_interval - elapsed))
+
+        if "LastEvaluatedKey" not in response:
+            return deleted
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+class ExpiredGameSweeper:
+    """
+    Background thread that periodically sweeps expired games from the table
+    named ``table_name``
+    """
+
+    def __init__(
+        self,
+        table_name: str = GAMES_TABLE_NAME,
+        interval_seconds: float = SWEEP_INTERVAL_SECONDS,
+        max_deletes_per_second: float = SWEEP_MAX_DELETES_PER_SECOND,
+    ):
+        self.table_name = table_name
+        self.interval_seconds = interval_seconds
+        self.max_deletes_per_second = max_deletes_per_second
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="expired-game-sweeper",
+            daemon=True,
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        # The sweeper's own resource, since boto3 resources aren't thread safe
+        games_table = dynamodb().Table(self.table_name)
+        while not self._stop.is_set():
+            try:
+                deleted = sweep_expired_games(
+                    games_table,
+                    max_deletes_per_second=self.max_deletes_per_second,
+                    stop=self._stop,
+                )
+            except Exception:
+                logger.exception("Sweeping expired games failed")
+            else:
+                if deleted > 0:
+                    logger.info("Swept %d expired games", deleted)
+            self._stop.wait(self.interval_seconds)
@@ -1,7 +1,8 @@
 from enum import Enum
-from typing import List, Optional
+from typing import Any, Dict, FrozenSet, List, Optional
 
 from fastapi_camelcase import CamelModel
+from pydantic import Field, PrivateAttr, root_validator
 
 
 class GuestLogin(CamelModel):
@@ -125,3 +126,115 @@ class GameInfo(CamelModel):
 
     #: Any currently active challenge
     challenge: Optional[Challenge]
+
+    # Attributes that were read from an item in the layout used before moves
+    # were packed and players were compacted. Set by
+    # ``ghost_api.storage.decode_game``.
+    _legacy_attributes: FrozenSet[str] = PrivateAttr(frozenset())
+
+    # Revision of the item the game was read from or last written as, if any
+    _revision: Optional[str] = PrivateAttr(None)
+
+
+class PartialGameInfo(CamelModel):
+    """
+    A subset of the fields of a ``GameInfo``. Only the fields that were read
+    are set.
+    """
+
+    room_code: Optional[str]
+    started: Optional[bool]
+    winner: Optional[Player]
+    players: Optional[List[Player]]
+    losers: Optional[List[Player]]
+    turn_player_name: Optional[str]
+    moves: Optional[List[Move]]
+    challenge: Optional[Challenge]
+
+
+class BatchActionType(str, Enum):
+    #: Join the game as ``player``
+    JOIN = "JOIN"
+
+    #: Start the game
+    START = "START"
+
+    #: Play ``move``
+    MOVE = "MOVE"
+
+    #: Issue ``challenge`` on the most recent move
+    CHALLENGE = "CHALLENGE"
+
+    #: Respond to the open challenge with ``challenge_response``
+    CHALLENGE_RESPONSE = "CHALLENGE_RESPONSE"
+
+    #: Cast ``vote`` on the open challenge
+    CHALLENGE_VOTE = "CHALLENGE_VOTE"
+
+
+#: Payload field required by each type of batch action
+BATCH_ACTION_PAYLOADS: Dict[BatchActionType, Optional[str]] = {
+    BatchActionType.JOIN: "player",
+    BatchActionType.START: None,
+    BatchActionType.MOVE: "move",
+    BatchActionType.CHALLENGE: "challenge",
+    BatchActionType.CHALLENGE_RESPONSE: "challenge_response",
+    BatchActionType.CHALLENGE_VOTE: "vote",
+}
+
+
+class BatchAction(CamelModel):
+    """
+    A single action in a batch, carrying the payload for its type
+    """
+
+    #: Type of action
+    type: BatchActionType
+
+    #: Player joining, for JOIN actions
+    player: Optional[Player]
+
+    #: Move played, for MOVE actions
+    move: Optional[Move]
+
+    #: Challenge issued, for CHALLENGE actions
+    challenge: Optional[NewChallenge]
+
+    #: Challenge response, for CHALLENGE_RESPONSE actions
+    challenge_response: Optional[ChallengeResponse]
+
+    #: Vote cast, for CHALLENGE_VOTE actions
+    vote: Optional[ChallengeVote]
+
+    @root_validator(skip_on_failure=True)
+    def _check_payload(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        payload_field = BATCH_ACTION_PAYLOADS[values["type"]]
+        if payload_field is not None and values.get(payload_field) is None:
+            action_type = values["type"].value
+            raise ValueError(f"{action_type} actions require {payload_field!r}")
+        return values
+
+
+#: Maximum number of games that can be read in a single query
+MAX_QUERY_ROOM_CODES = 500
+
+
+class GamesQuery(CamelModel):
+    """
+    Query for reading many games at once
+    """
+
+    #: Room codes of the games to read
+    room_codes: List[str] = Field(..., max_items=MAX_QUERY_ROOM_CODES)
+
+
+class GamesPage(CamelModel):
+    """
+    A page of games from a listing
+    """
+
+    #: Games in this page
+    games: List[GameInfo]
+
+    #: Cursor for requesting the next page, if there is one
+    cursor: Optional[str]
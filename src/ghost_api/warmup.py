@@ -0,0 +1,56 @@
+"""
+Short-circuiting keep-warm invocations of the Lambda handler
+"""
+
+from typing import Any, Callable, Dict
+
+from ghost_api.idempotency import get_idempotency_store
+from ghost_api.logging import get_logger
+
+logger = get_logger()
+
+#: Sources of events that only keep the Lambda warm, rather than being
+#: requests: CloudWatch scheduled events and serverless-plugin-warmup
+WARMUP_SOURCES = {"aws.events", "serverless-plugin-warmup"}
+
+
+def is_warmup_event(event: Any) -> bool:
+    """
+    If a Lambda event is a keep-warm ping rather than an API request
+    """
+    return isinstance(event, dict) and event.get("source") in WARMUP_SOURCES
+
+
+def warm_up() -> Dict[str, Any]:
+    """
+    Set up everything the first request after a cold start would otherwise
+    have to, without going through the app: import the service and storage
+    modules, create the shared DynamoDB resource, and open its connection to
+    DynamoDB.
+    """
+    from ghost_api.service import GhostService
+
+    try:
+        service = GhostService()
+        # Makes a request, so the connection pool has an open connection
+        service.games_table.load()
+        get_idempotency_store()
+    except Exception:
+        # A failed warm-up only leaves the setup to the next request
+        logger.exception("Warming up failed")
+        return {"warm": False}
+    return {"warm": True}
+
+
+def with_warmup(handler: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    """
+    Wrap a Lambda handler so keep-warm events return as soon as everything is
+    set up, rather than going through the handler
+    """
+
+    def warmup_handler(event: Any, context: Any) -> Any:
+        if is_warmup_event(event):
+            return warm_up()
+        return handler(event, context)
+
+    return warmup_handler
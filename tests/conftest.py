@@ -4,7 +4,9 @@ from fastapi.testclient import TestClient
 
 from ghost_api.api import app
 from ghost_api.constants import GAMES_TABLE_NAME, LOCAL_DYNAMODB_ENDPOINT
-from ghost_api.service import GhostService
+from ghost_api.idempotency import get_idempotency_store
+from ghost_api.service import LOBBY_INDEX_NAME, GhostService
+from ghost_api.types import GameInfo, Player
 
 
 @pytest.fixture
@@ -34,11 +36,35 @@ def games_table(dynamodb_client):
                 "AttributeName": "room_code",
                 "AttributeType": "S",
             },
+            {
+                "AttributeName": "lobby",
+                "AttributeType": "S",
+            },
         ],
         ProvisionedThroughput={
             "ReadCapacityUnits": 100,
             "WriteCapacityUnits": 100,
         },
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": LOBBY_INDEX_NAME,
+                "KeySchema": [
+                    {
+                        "AttributeName": "lobby",
+                        "KeyType": "HASH",
+                    },
+                    {
+                        "AttributeName": "room_code",
+                        "KeyType": "RANGE",
+                    },
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+                "ProvisionedThroughput": {
+                    "ReadCapacityUnits": 100,
+                    "WriteCapacityUnits": 100,
+                },
+            },
+        ],
     )
 
     exists_waiter = dynamodb_client.get_waiter("table_exists")
@@ -61,9 +87,22 @@ def service(games_table) -> GhostService:
     return GhostService()
 
 
+@pytest.fixture
+def two_player_game(service) -> GameInfo:
+    """
+    Return a started game in room ABCD with two players
+    """
+    service.create_game("ABCD")
+    service.add_player("ABCD", Player(name="player1", image_url="abc.def"))
+    service.add_player("ABCD", Player(name="player2", image_url="ghi.jkl"))
+    return service.start_game("ABCD")
+
+
 @pytest.fixture
 def api_client(service) -> TestClient:
     """
     Return an API test client that can interact with a temporary database
     """
+    # Don't replay responses stored by previous tests
+    get_idempotency_store.cache_clear()
     return TestClient(app)
@@ -1,4 +1,21 @@
-from ghost_api.types import ChallengeType, Move, NewChallenge, Player, Position
+import json
+import subprocess
+import sys
+
+import fastapi.routing
+import fastapi.utils
+
+from ghost_api.api import app
+from ghost_api.exceptions import ConcurrentUpdate, GamesUnavailable
+from ghost_api.service import GhostService
+from ghost_api.types import (
+    ChallengeType,
+    GameInfo,
+    Move,
+    NewChallenge,
+    Player,
+    Position,
+)
 
 
 def test_get_game_200(service, api_client):
@@ -750,3 +767,373 @@ def test_post_challenge_vote_409(service, api_client):
     assert response.json() == {
         "message": "Challenge is in 'AWAITING_RESPONSE' state, not 'VOTING'"
     }
+
+
+def test_post_batch_200(service, api_client):
+    """
+    POST /game/{room_code}/batch OK
+    """
+    service.create_game("ABCD")
+
+    new_move_json = {
+        "playerName": "player1",
+        "position": {
+            "x": 0,
+            "y": 0,
+        },
+        "letter": "K",
+    }
+    actions = [
+        {"type": "JOIN", "player": {"name": "player1", "imageUrl": "abc.def"}},
+        {"type": "JOIN", "player": {"name": "player2", "imageUrl": "ghi.jkl"}},
+        {"type": "START"},
+        {"type": "MOVE", "move": new_move_json},
+    ]
+    response = api_client.post("/game/ABCD/batch", json=actions)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "roomCode": "ABCD",
+        "started": True,
+        "winner": None,
+        "players": [
+            {"name": "player1", "imageUrl": "abc.def"},
+            {"name": "player2", "imageUrl": "ghi.jkl"},
+        ],
+        "moves": [new_move_json],
+        "turnPlayerName": "player2",
+        "challenge": None,
+        "losers": [],
+    }
+
+
+def test_post_batch_404(service, api_client):
+    """
+    POST /game/{room_code}/batch
+    For a nonexistent game
+    """
+    response = api_client.post("/game/ABCD/batch", json=[{"type": "START"}])
+
+    assert response.status_code == 404
+    assert response.json() == {"message": "Game 'ABCD' does not exist"}
+
+
+def test_post_batch_409(service, api_client):
+    """
+    POST /game/{room_code}/batch
+    With an action that can't be applied
+    """
+    service.create_game("ABCD")
+
+    actions = [
+        {"type": "JOIN", "player": {"name": "player1", "imageUrl": "abc.def"}},
+        {
+            "type": "MOVE",
+            "move": {
+                "playerName": "player1",
+                "position": {"x": 0, "y": 0},
+                "letter": "K",
+            },
+        },
+    ]
+    response = api_client.post("/game/ABCD/batch", json=actions)
+
+    assert response.status_code == 409
+    assert response.json() == {
+        "message": "Action 1: Cannot make a move in a game that hasn't started"
+    }
+    assert service.read_game("ABCD").players == []
+
+
+def test_post_batch_409_concurrent_update(service, api_client, monkeypatch):
+    """
+    POST /game/{room_code}/batch
+    When the game keeps being changed by other requests
+    """
+    service.create_game("ABCD")
+
+    def apply_actions(self, room_code, actions):
+        raise ConcurrentUpdate("Game 'ABCD' was changed by other requests")
+
+    monkeypatch.setattr(GhostService, "apply_actions", apply_actions)
+    response = api_client.post("/game/ABCD/batch", json=[{"type": "START"}])
+
+    assert response.status_code == 409
+    assert response.json() == {"message": "Game 'ABCD' was changed by other requests"}
+
+
+def test_post_batch_422_missing_payload(service, api_client):
+    """
+    POST /game/{room_code}/batch
+    With an action missing its payload
+    """
+    service.create_game("ABCD")
+
+    response = api_client.post("/game/ABCD/batch", json=[{"type": "MOVE"}])
+
+    assert response.status_code == 422
+
+
+def test_post_games_query_503(service, api_client, monkeypatch):
+    """
+    POST /games/query
+    When the games can't be read
+    """
+    service.create_game("ABCD")
+
+    def batch_get(self, keys):
+        raise GamesUnavailable("Some games could not be read, please try again")
+
+    monkeypatch.setattr(GhostService, "_batch_get", batch_get)
+    response = api_client.post("/games/query", json={"roomCodes": ["ABCD"]})
+
+    assert response.status_code == 503
+    assert response.json() == {
+        "message": "Some games could not be read, please try again"
+    }
+
+
+def test_post_games_query_error_after_first_batch(service, api_client, monkeypatch):
+    """
+    POST /games/query
+    When some games can't be read after the response has started
+    """
+    room_codes = [f"A{i:03}" for i in range(150)]
+    for room_code in room_codes:
+        service.create_game(room_code)
+
+    batch_get = GhostService._batch_get
+    calls = 0
+
+    def batch_get_once(self, keys):
+        nonlocal calls
+        calls += 1
+        if calls > 1:
+            raise GamesUnavailable("Some games could not be read, please try again")
+        return batch_get(self, keys)
+
+    # Read the batches one at a time, so the first one succeeds
+    monkeypatch.setattr("ghost_api.service.BATCH_GET_MAX_WORKERS", 1)
+    monkeypatch.setattr(GhostService, "_batch_get", batch_get_once)
+    response = api_client.post("/games/query", json={"roomCodes": room_codes})
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 101
+    assert lines[-1] == {"error": "Some games could not be read, please try again"}
+
+
+def test_post_games_query_200(service, api_client):
+    """
+    POST /games/query OK
+    """
+    service.create_game("ABCD")
+    service.create_game("EFGH")
+    service.add_player("EFGH", Player(name="player1", image_url="abc.def"))
+
+    response = api_client.post(
+        "/games/query",
+        json={"roomCodes": ["ABCD", "EFGH", "IJKL"]},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    games = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(games, key=lambda game: game["roomCode"]) == [
+        {
+            "roomCode": "ABCD",
+            "started": False,
+            "winner": None,
+            "players": [],
+            "moves": [],
+            "turnPlayerName": None,
+            "challenge": None,
+            "losers": [],
+        },
+        {
+            "roomCode": "EFGH",
+            "started": False,
+            "winner": None,
+            "players": [{"name": "player1", "imageUrl": "abc.def"}],
+            "moves": [],
+            "turnPlayerName": "player1",
+            "challenge": None,
+            "losers": [],
+        },
+    ]
+
+
+def test_post_games_query_422_too_many(service, api_client):
+    """
+    POST /games/query
+    With too many room codes
+    """
+    room_codes = [f"A{i:03}" for i in range(501)]
+    response = api_client.post("/games/query", json={"roomCodes": room_codes})
+
+    assert response.status_code == 422
+
+
+def test_get_games_200(service, api_client):
+    """
+    GET /games?started=false OK
+    """
+    service.create_game("ABCD")
+    service.create_game("EFGH")
+    service.create_game("IJKL")
+    service.start_game("EFGH")
+
+    response = api_client.get("/games", params={"started": False, "limit": 1})
+
+    assert response.status_code == 200
+    page = response.json()
+    assert [game["roomCode"] for game in page["games"]] == ["ABCD"]
+    assert page["games"][0] == {
+        "roomCode": "ABCD",
+        "started": False,
+        "winner": None,
+        "players": [],
+        "moves": [],
+        "turnPlayerName": None,
+        "challenge": None,
+        "losers": [],
+    }
+    assert page["cursor"] is not None
+
+    response = api_client.get(
+        "/games", params={"started": False, "cursor": page["cursor"]}
+    )
+
+    assert response.status_code == 200
+    page = response.json()
+    assert [game["roomCode"] for game in page["games"]] == ["IJKL"]
+    assert page["cursor"] is None
+
+
+def test_get_games_400_started(service, api_client):
+    """
+    GET /games?started=true
+    Started games can't be listed
+    """
+    response = api_client.get("/games", params={"started": True})
+
+    assert response.status_code == 400
+    assert response.json() == {
+        "message": "Only games that haven't started can be listed"
+    }
+
+
+def test_get_games_400_invalid_cursor(service, api_client):
+    """
+    GET /games?started=false
+    With an invalid cursor
+    """
+    response = api_client.get("/games", params={"started": False, "cursor": "abc"})
+
+    assert response.status_code == 400
+    assert response.json() == {"message": "Invalid cursor 'abc'"}
+
+
+def test_get_game_fields_200(service, api_client):
+    """
+    GET /game/{room_code}?fields=... OK
+    """
+    service.create_game("ABCD")
+    service.add_player("ABCD", Player(name="player1", image_url="abc.def"))
+
+    response = api_client.get(
+        "/game/ABCD", params={"fields": "turnPlayerName,started,challenge"}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "turnPlayerName": "player1",
+        "started": False,
+        "challenge": None,
+    }
+
+
+def test_get_game_fields_400(service, api_client):
+    """
+    GET /game/{room_code}?fields=...
+    With fields games don't have
+    """
+    service.create_game("ABCD")
+
+    response = api_client.get("/game/ABCD", params={"fields": "started,score"})
+
+    assert response.status_code == 400
+    assert response.json() == {"message": "Games have no fields ['score']"}
+
+
+def test_get_game_fields_422(service, api_client):
+    """
+    GET /game/{room_code}?fields=
+    With no fields
+    """
+    service.create_game("ABCD")
+
+    response = api_client.get("/game/ABCD", params={"fields": ""})
+
+    assert response.status_code == 422
+    assert response.json() == {"message": "At least one field must be requested"}
+
+
+def test_get_game_partial_response_schema(api_client):
+    """
+    GET /game/{room_code} is documented as returning either the whole game or
+    some of its fields
+    """
+    schema = api_client.get("/openapi.json").json()
+    response = schema["paths"]["/game/{room_code}"]["get"]["responses"]["200"]
+
+    assert response["content"]["application/json"]["schema"] == {
+        "title": "Response Get Game Info Game  Room Code  Get",
+        "anyOf": [
+            {"$ref": "#/components/schemas/GameInfo"},
+            {"$ref": "#/components/schemas/PartialGameInfo"},
+        ],
+    }
+
+
+def test_get_game_fields_404(service, api_client):
+    """
+    GET /game/{room_code}?fields=...
+    For a nonexistent game
+    """
+    response = api_client.get("/game/ABCD", params={"fields": "started"})
+
+    assert response.status_code == 404
+    assert response.json() == {"message": "Game 'ABCD' does not exist"}
+
+
+def test_import_defers_boto3():
+    """
+    Importing the API doesn't load boto3, which is only needed once a request
+    reads or writes games
+    """
+    code = "import sys, ghost_api.api; print('boto3' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    assert result.stdout.strip() == "False"
+
+
+def test_routes_share_response_model_clones():
+    """
+    Routes with the same response model share its clone, without changing how
+    FastAPI clones response models for other apps
+    """
+    clones = [
+        route.secure_cloned_response_field.type_
+        for route in app.routes
+        if getattr(route, "response_model", None) is GameInfo
+    ]
+
+    assert len(clones) > 1
+    assert all(clone is clones[0] for clone in clones)
+    assert fastapi.routing.create_cloned_field is fastapi.utils.create_cloned_field
@@ -0,0 +1,183 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.testclient import TestClient
+
+from ghost_api.compression import CompressionMiddleware, choose_encoding
+
+LARGE_BODY = "ghost " * 1000
+
+
+def _test_app(encodings=("br", "gzip")):
+    app = Starlette()
+
+    @app.route("/small")
+    async def small(request):
+        return PlainTextResponse("ghost")
+
+    @app.route("/large")
+    async def large(request):
+        return PlainTextResponse(LARGE_BODY)
+
+    @app.route("/encoded")
+    async def encoded(request):
+        return PlainTextResponse(
+            gzip.compress(LARGE_BODY.encode()),
+            headers={"Content-Encoding": "gzip"},
+        )
+
+    @app.route("/stream")
+    async def stream(request):
+        async def lines():
+            for i in range(3):
+                yield f"line {i}\n"
+
+        return StreamingResponse(lines(), media_type="text/plain")
+
+    app.add_middleware(
+        CompressionMiddleware, encodings=list(encodings), minimum_size=1024
+    )
+    return app
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip", "gzip"),
+        ("gzip, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("*", "br"),
+        ("gzip;q=0, identity", None),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_choose_encoding(accept_encoding, expected):
+    """
+    The encoding with the highest quality is chosen, preferring the first of
+    the supported encodings
+    """
+    assert choose_encoding(accept_encoding, ["br", "gzip"]) == expected
+
+
+def test_large_response_gzip():
+    """
+    Responses above the minimum size are compressed
+    """
+    client = TestClient(_test_app())
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(LARGE_BODY)
+    assert response.text == LARGE_BODY
+
+
+def test_large_response_brotli():
+    """
+    Brotli is preferred when the client accepts it
+    """
+    pytest.importorskip("brotli")
+    client = TestClient(_test_app())
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip, br"})
+
+    assert response.headers["content-encoding"] == "br"
+    assert response.text == LARGE_BODY
+
+
+def test_small_response_uncompressed():
+    """
+    Responses below the minimum size aren't compressed
+    """
+    client = TestClient(_test_app())
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.text == "ghost"
+
+
+def test_not_accepted_uncompressed():
+    """
+    Responses aren't compressed for clients that don't accept a supported
+    encoding
+    """
+    client = TestClient(_test_app(encodings=["gzip"]))
+
+    response = client.get("/large", headers={"Accept-Encoding": "br"})
+
+    assert "content-encoding" not in response.headers
+    assert response.text == LARGE_BODY
+
+
+def test_already_encoded_unchanged():
+    """
+    Responses that already have a Content-Encoding aren't compressed again
+    """
+    client = TestClient(_test_app())
+
+    response = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == LARGE_BODY
+
+
+def test_streamed_chunks_flushed():
+    """
+    Each chunk of a streamed response can be decompressed as it arrives
+    """
+    app = _test_app()
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/stream",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    messages = []
+    loop = asyncio.new_event_loop()
+    disconnected = loop.create_future()
+
+    async def receive():
+        # The client stays connected until the response is complete
+        return await disconnected
+
+    async def send(message):
+        messages.append(message)
+
+    loop.run_until_complete(app(scope, receive, send))
+    loop.close()
+
+    start, *bodies = messages
+    assert (b"content-encoding", b"gzip") in start["headers"]
+    assert all(name != b"content-length" for name, _ in start["headers"])
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    lines = [decompressor.decompress(message["body"]) for message in bodies]
+    assert lines[:3] == [b"line 0\n", b"line 1\n", b"line 2\n"]
+    assert decompressor.eof
+
+
+def test_post_games_query_compressed(service, api_client):
+    """
+    POST /games/query
+    The streamed games are compressed
+    """
+    service.create_game("ABCD")
+
+    response = api_client.post(
+        "/games/query",
+        json={"roomCodes": ["ABCD"]},
+        headers={"Accept-Encoding": "gzip"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["roomCode"] == "ABCD"
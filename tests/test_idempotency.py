@@ -0,0 +1,242 @@
+import asyncio
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.testclient import TestClient
+
+from ghost_api.idempotency import (
+    IdempotencyMiddleware,
+    InMemoryIdempotencyStore,
+    StoredResponse,
+)
+
+
+def test_in_memory_store_roundtrip():
+    """
+    Stored responses can be read back until they expire
+    """
+    store = InMemoryIdempotencyStore(ttl_seconds=60)
+    response = StoredResponse(
+        fingerprint="abc",
+        status_code=200,
+        headers=[("content-type", "application/json")],
+        body=b"{}",
+    )
+    store.put("key", response)
+
+    assert store.get("key") == response
+    assert store.get("other-key") is None
+
+
+def test_in_memory_store_expiry():
+    """
+    Expired responses aren't returned
+    """
+    store = InMemoryIdempotencyStore(ttl_seconds=0)
+    store.put(
+        "key",
+        StoredResponse(
+            fingerprint="abc",
+            status_code=200,
+            headers=[],
+            body=b"",
+        ),
+    )
+
+    assert store.get("key") is None
+
+
+def test_in_memory_store_reserve():
+    """
+    Only one request can reserve a key, until it's released
+    """
+    store = InMemoryIdempotencyStore(ttl_seconds=60)
+
+    assert store.reserve("key", "abc")
+    assert not store.reserve("key", "abc")
+    assert store.get("key").in_progress
+
+    store.release("key")
+
+    assert store.get("key") is None
+    assert store.reserve("key", "abc")
+
+
+def test_concurrent_retry_in_progress():
+    """
+    A retry made while the original request is still executing is rejected
+    rather than executed again
+    """
+    calls = 0
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    store = InMemoryIdempotencyStore(ttl_seconds=60)
+    middleware = IdempotencyMiddleware(app, store_factory=lambda: store)
+
+    async def request():
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"{}", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/game/ABCD/move",
+            "query_string": b"",
+            "headers": [(b"idempotency-key", b"move-1")],
+        }
+        await middleware(scope, receive, send)
+        return sent[0]["status"]
+
+    async def run():
+        original = asyncio.ensure_future(request())
+        await asyncio.sleep(0)
+        duplicate = await request()
+        release.set()
+        return await original, duplicate
+
+    assert asyncio.run(run()) == (200, 409)
+    assert calls == 1
+
+
+def test_retry_replays_headers():
+    """
+    Replayed responses have the headers of the original response, except
+    those for a single connection
+    """
+    app = Starlette()
+
+    @app.route("/game/{room_code}", methods=["POST"])
+    async def create(request):
+        return PlainTextResponse(
+            "created",
+            status_code=201,
+            headers={"Location": "/game/ABCD", "Connection": "close"},
+        )
+
+    store = InMemoryIdempotencyStore(ttl_seconds=60)
+    app.add_middleware(IdempotencyMiddleware, store_factory=lambda: store)
+    client = TestClient(app)
+
+    headers = {"Idempotency-Key": "new-game"}
+    first = client.post("/game/ABCD", headers=headers)
+    retry = client.post("/game/ABCD", headers=headers)
+
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.headers["location"] == first.headers["location"] == "/game/ABCD"
+    assert retry.headers["content-type"] == first.headers["content-type"]
+    assert retry.text == "created"
+    assert ("connection", "close") not in store.get("POST /game/ABCD new-game").headers
+
+
+def test_post_move_retry_replayed(service, two_player_game, api_client):
+    """
+    POST /game/{room_code}/move
+    Retrying with the same Idempotency-Key returns the original response
+    without making the move again
+    """
+    new_move_json = {
+        "playerName": "player1",
+        "position": {"x": 0, "y": 0},
+        "letter": "K",
+    }
+    headers = {"Idempotency-Key": "move-1"}
+    first = api_client.post("/game/ABCD/move", json=new_move_json, headers=headers)
+    retry = api_client.post("/game/ABCD/move", json=new_move_json, headers=headers)
+
+    assert first.status_code == 200
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert len(service.read_game("ABCD").moves) == 1
+
+
+def test_post_move_retry_without_key(two_player_game, api_client):
+    """
+    POST /game/{room_code}/move
+    Retrying without an Idempotency-Key executes the request again
+    """
+    new_move_json = {
+        "playerName": "player1",
+        "position": {"x": 0, "y": 0},
+        "letter": "K",
+    }
+    api_client.post("/game/ABCD/move", json=new_move_json)
+    retry = api_client.post("/game/ABCD/move", json=new_move_json)
+
+    assert retry.status_code == 409
+
+
+def test_post_idempotency_key_reused(service, two_player_game, api_client):
+    """
+    POST /game/{room_code}/move
+    Reusing an Idempotency-Key for a different request is rejected
+    """
+    headers = {"Idempotency-Key": "move-1"}
+    api_client.post(
+        "/game/ABCD/move",
+        json={"playerName": "player1", "position": {"x": 0, "y": 0}, "letter": "K"},
+        headers=headers,
+    )
+    response = api_client.post(
+        "/game/ABCD/move",
+        json={"playerName": "player2", "position": {"x": 1, "y": 0}, "letter": "A"},
+        headers=headers,
+    )
+
+    assert response.status_code == 422
+    assert response.json() == {
+        "message": "Idempotency-Key has already been used for a different request"
+    }
+    assert len(service.read_game("ABCD").moves) == 1
+
+
+def test_post_idempotency_key_scoped_to_path(service, api_client):
+    """
+    POST /game/{room_code}
+    The same Idempotency-Key can be used on different paths
+    """
+    headers = {"Idempotency-Key": "new-game"}
+    first = api_client.post("/game/ABCD", headers=headers)
+    second = api_client.post("/game/EFGH", headers=headers)
+
+    assert first.status_code == 201
+    assert second.status_code == 201
+    assert second.json()["roomCode"] == "EFGH"
+
+
+def test_post_idempotency_key_reused_with_other_accept(
+    service, two_player_game, api_client
+):
+    """
+    POST /game/{room_code}/move
+    A response isn't replayed in a different media type than it was negotiated
+    in
+    """
+    new_move_json = {
+        "playerName": "player1",
+        "position": {"x": 0, "y": 0},
+        "letter": "K",
+    }
+    headers = {"Idempotency-Key": "move-1"}
+    api_client.post("/game/ABCD/move", json=new_move_json, headers=headers)
+    retry = api_client.post(
+        "/game/ABCD/move",
+        json=new_move_json,
+        headers={**headers, "Accept": "application/msgpack"},
+    )
+
+    assert retry.status_code == 422
+    assert len(service.read_game("ABCD").moves) == 1
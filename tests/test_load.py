@@ -0,0 +1,34 @@
+from benchmarks.load import OK, REJECTED, Request, ServiceClient
+
+
+def test_service_client_statuses(service):
+    """
+    Requests made on the service get the status codes the API responds with
+    """
+    client = ServiceClient()
+    route = "/game/{room_code}"
+
+    created = client.request(Request("POST", route, {"room_code": "ABCD"}))
+    read = client.request(Request("GET", route, {"room_code": "ABCD"}))
+    missing = client.request(Request("GET", route, {"room_code": "EFGH"}))
+
+    assert (created.status, created.outcome) == (201, OK)
+    assert (read.status, read.outcome) == (200, OK)
+    assert (missing.status, missing.outcome) == (404, REJECTED)
+
+
+def test_service_client_read_game(service, api_client):
+    """
+    Games are read as the JSON the API returns, or only the fields requested
+    """
+    client = ServiceClient()
+    service.create_game("ABCD")
+
+    def read(query):
+        route = "/game/{room_code}"
+        return client.request(Request("GET", route, {"room_code": "ABCD"}, query=query))
+
+    assert read({}).body == api_client.get("/game/ABCD").content
+    assert read({"fields": "turnPlayerName,started"}).status == 200
+    assert read({"fields": "nonsense"}).status == 400
+    assert read({"fields": ""}).status == 422
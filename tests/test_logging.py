@@ -0,0 +1,93 @@
+import logging
+
+import orjson
+
+from ghost_api.logging import (
+    JsonFormatter,
+    Lazy,
+    SamplingFilter,
+    flush_logs,
+    get_logger,
+    log_fields,
+    with_log_flush,
+)
+from ghost_api.types import Move
+
+
+def _record(msg, level=logging.INFO, **fields):
+    record = logging.LogRecord("root", level, __file__, 1, msg, None, None)
+    record.fields = fields
+    return record
+
+
+def test_json_formatter_fields():
+    """
+    Records are formatted as JSON, with their structured fields
+    """
+    record = _record(
+        "POST /game/{room_code}/move",
+        room_code="ABCD",
+        move=Move(player_name="Alice", position={"x": 0, "y": 1}, letter="g"),
+    )
+
+    logged = orjson.loads(JsonFormatter().format(record))
+
+    assert logged["level"] == "INFO"
+    assert logged["message"] == "POST /game/{room_code}/move"
+    assert logged["room_code"] == "ABCD"
+    assert logged["move"]["player_name"] == "Alice"
+
+
+def test_lazy_field_computed_when_formatted():
+    """
+    Lazy fields are only computed when their record is formatted
+    """
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 3
+
+    record = _record("GET /games", count=Lazy(compute))
+    assert calls == []
+
+    logged = orjson.loads(JsonFormatter().format(record))
+
+    assert logged["count"] == 3
+    assert calls == [1]
+
+
+def test_sampling_filter():
+    """
+    Records of sampled routes are kept at their rate, while other records and
+    warnings are always kept
+    """
+    sampler = SamplingFilter({"GET /game/{room_code}": 0.0, "GET /games": 1.0})
+
+    assert not sampler.filter(_record("GET /game/{room_code}"))
+    assert sampler.filter(_record("GET /game/{room_code}", level=logging.WARNING))
+    assert sampler.filter(_record("GET /games"))
+    assert sampler.filter(_record("POST /game/{room_code}"))
+
+
+def test_records_written_by_listener(caplog):
+    """
+    Logged fields are kept on the record until it is written
+    """
+    move = Move(player_name="Alice", position={"x": 0, "y": 1}, letter="g")
+
+    with caplog.at_level(logging.INFO):
+        get_logger().info("POST /game/{room_code}/move", extra=log_fields(move=move))
+    flush_logs()
+
+    (record,) = [r for r in caplog.records if r.msg == "POST /game/{room_code}/move"]
+    assert record.fields["move"] is move
+
+
+def test_with_log_flush():
+    """
+    Logs are flushed before a wrapped handler returns
+    """
+    handler = with_log_flush(lambda event, context: {"statusCode": 200})
+
+    assert handler({}, None) == {"statusCode": 200}
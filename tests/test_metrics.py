@@ -0,0 +1,180 @@
+import logging
+
+import pytest
+
+import ghost_api.metrics
+from ghost_api.metrics import (
+    DYNAMODB_CALLS,
+    DYNAMODB_CALLS_PER_REQUEST,
+    DYNAMODB_CONSUMED_CAPACITY,
+    REGISTRY,
+    REQUEST_DURATION,
+    SERVICE_CALL_DURATION,
+    Counter,
+    HistogramMetric,
+    MetricsMiddleware,
+    Registry,
+    RequestMetrics,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    REGISTRY.clear()
+    yield
+    REGISTRY.clear()
+
+
+def test_render_prometheus():
+    """
+    Metrics are rendered in the Prometheus text format
+    """
+    histogram = HistogramMetric("latency", "A histogram", ["route"], [0.1, 1.0])
+    counter = Counter("calls_total", "A counter", ["operation"])
+    histogram.observe(("/a",), 0.05)
+    histogram.observe(("/a",), 0.5)
+    histogram.observe(("/a",), 5.0)
+    counter.inc(("get_item",), 2)
+
+    assert Registry([histogram, counter]).render() == (
+        "# HELP latency A histogram\n"
+        "# TYPE latency histogram\n"
+        'latency_bucket{route="/a",le="0.1"} 1\n'
+        'latency_bucket{route="/a",le="1.0"} 2\n'
+        'latency_bucket{route="/a",le="+Inf"} 3\n'
+        'latency_sum{route="/a"} 5.55\n'
+        'latency_count{route="/a"} 3\n'
+        "# HELP calls_total A counter\n"
+        "# TYPE calls_total counter\n"
+        'calls_total{operation="get_item"} 2\n'
+    )
+
+
+def test_get_game_metrics(service, api_client):
+    """
+    GET /game/{room_code}
+    The request's latency and DynamoDB calls are recorded against its route
+    """
+    service.create_game("ABCD")
+
+    api_client.get("/game/ABCD")
+
+    labels = ("GET", "/game/{room_code}")
+    assert REQUEST_DURATION.histogram(labels).count == 1
+    assert DYNAMODB_CALLS.value((*labels, "get_item")) == 1
+    assert DYNAMODB_CALLS_PER_REQUEST.histogram(labels).sum == 1
+    assert SERVICE_CALL_DURATION.histogram(("read_game_json",)).count == 1
+
+
+def test_post_move_metrics(two_player_game, api_client):
+    """
+    POST /game/{room_code}/move
+    Each DynamoDB operation is counted separately
+    """
+    api_client.post(
+        "/game/ABCD/move",
+        json={"playerName": "player1", "position": {"x": 0, "y": 0}, "letter": "K"},
+    )
+
+    labels = ("POST", "/game/{room_code}/move")
+    operations = ["get_item", "update_item", "put_item"]
+    calls = {op: DYNAMODB_CALLS.value((*labels, op)) for op in operations}
+    assert calls["get_item"] >= 1
+    assert calls["update_item"] >= 1
+    assert calls["put_item"] == 0
+    assert DYNAMODB_CALLS_PER_REQUEST.histogram(labels).sum == sum(calls.values())
+
+
+def test_post_games_query_metrics(service, api_client):
+    """
+    POST /games/query
+    Calls made from worker threads and while streaming are counted, and the
+    generator is timed until it's exhausted
+    """
+    service.create_game("ABCD")
+
+    api_client.post("/games/query", json={"roomCodes": ["ABCD"]})
+
+    labels = ("POST", "/games/query")
+    assert DYNAMODB_CALLS.value((*labels, "batch_get_item")) == 1
+    assert SERVICE_CALL_DURATION.histogram(("read_games",)).count == 1
+
+
+def test_consumed_capacity_metrics(two_player_game, api_client):
+    """
+    POST /game/{room_code}/move
+    The read and write capacity consumed by a request is recorded
+    """
+    api_client.post(
+        "/game/ABCD/move",
+        json={"playerName": "player1", "position": {"x": 0, "y": 0}, "letter": "K"},
+    )
+
+    labels = ("POST", "/game/{room_code}/move")
+    assert DYNAMODB_CONSUMED_CAPACITY.value((*labels, "read")) > 0
+    assert DYNAMODB_CONSUMED_CAPACITY.value((*labels, "write")) > 0
+
+
+def test_consumed_capacity_header(service, api_client, monkeypatch):
+    """
+    GET /game/{room_code}
+    In debug mode, the consumed capacity is returned in a header
+    """
+    service.create_game("ABCD")
+
+    response = api_client.get("/game/ABCD")
+    assert "x-consumed-capacity" not in response.headers
+
+    monkeypatch.setattr(ghost_api.metrics, "DEBUG", True)
+    response = api_client.get("/game/ABCD")
+
+    read, write = response.headers["x-consumed-capacity"].split(", ")
+    assert float(read.split("=")[1]) > 0
+    assert write == "write=0"
+
+
+def test_unmatched_route_metrics(api_client):
+    """
+    Requests that don't match a route are recorded together
+    """
+    api_client.get("/no/such/route")
+
+    assert REQUEST_DURATION.histogram(("GET", "unmatched")).count == 1
+
+
+def test_metrics_endpoint(service, api_client):
+    """
+    GET /metrics
+    """
+    service.create_game("ABCD")
+    api_client.get("/game/ABCD")
+
+    response = api_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'ghost_dynamodb_calls_total{method="GET",route="/game/{room_code}",'
+        'operation="get_item"} 1'
+    ) in response.text
+
+
+def test_metrics_logged(caplog):
+    """
+    A summary of the metrics is logged at most once per interval
+    """
+
+    async def app(scope, receive, send):
+        pass
+
+    middleware = MetricsMiddleware(app, router=None, log_interval_seconds=0.001)
+    middleware._last_logged -= 1
+    scope = {"type": "http", "method": "GET"}
+
+    with caplog.at_level(logging.INFO):
+        middleware._record(scope, 0.01, RequestMetrics())
+        middleware._record(scope, 0.01, RequestMetrics())
+
+    logged = [record for record in caplog.records if record.message == "Metrics"]
+    assert len(logged) == 1
+    assert "ghost_request_duration_seconds" in logged[0].fields["metrics"]
@@ -0,0 +1,111 @@
+import msgpack
+
+from ghost_api.types import Player
+
+MSGPACK = "application/msgpack"
+
+
+def test_get_game_msgpack(service, api_client):
+    """
+    GET /game/{room_code}
+    Returns MessagePack when the client accepts it
+    """
+    service.create_game("ABCD")
+    service.add_player("ABCD", Player(name="player1", image_url="abc.def"))
+
+    response = api_client.get("/game/ABCD", headers={"Accept": MSGPACK})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == MSGPACK
+    assert msgpack.unpackb(response.content) == api_client.get("/game/ABCD").json()
+
+
+def test_get_game_fields_msgpack(service, api_client):
+    """
+    GET /game/{room_code}?fields=...
+    Partial games are returned as MessagePack too
+    """
+    service.create_game("ABCD")
+
+    response = api_client.get(
+        "/game/ABCD",
+        params={"fields": "started,turnPlayerName"},
+        headers={"Accept": MSGPACK},
+    )
+
+    assert response.status_code == 200
+    assert msgpack.unpackb(response.content) == {
+        "started": False,
+        "turnPlayerName": None,
+    }
+
+
+def test_get_game_prefers_json(service, api_client):
+    """
+    GET /game/{room_code}
+    JSON is returned when the client prefers it to MessagePack
+    """
+    service.create_game("ABCD")
+
+    response = api_client.get(
+        "/game/ABCD", headers={"Accept": f"application/json, {MSGPACK}"}
+    )
+
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["roomCode"] == "ABCD"
+
+
+def test_get_game_404_msgpack(service, api_client):
+    """
+    GET /game/{room_code}
+    Errors are returned as MessagePack when the client accepts it
+    """
+    response = api_client.get("/game/ABCD", headers={"Accept": MSGPACK})
+
+    assert response.status_code == 404
+    assert msgpack.unpackb(response.content) == {
+        "message": "Game 'ABCD' does not exist"
+    }
+
+
+def test_post_move_msgpack(service, api_client):
+    """
+    POST /game/{room_code}/move
+    Accepts a MessagePack body
+    """
+    service.create_game("ABCD")
+    service.add_player("ABCD", Player(name="player1", image_url="abc.def"))
+    service.add_player("ABCD", Player(name="player2", image_url="ghi.jkl"))
+    service.start_game("ABCD")
+
+    new_move = {
+        "playerName": "player1",
+        "position": {"x": 0, "y": 0},
+        "letter": "K",
+    }
+    response = api_client.post(
+        "/game/ABCD/move",
+        data=msgpack.packb(new_move),
+        headers={"Content-Type": MSGPACK, "Accept": MSGPACK},
+    )
+
+    assert response.status_code == 200
+    game = msgpack.unpackb(response.content)
+    assert game["moves"] == [new_move]
+    assert game["turnPlayerName"] == "player2"
+
+
+def test_post_move_invalid_msgpack(service, api_client):
+    """
+    POST /game/{room_code}/move
+    With a body that isn't valid MessagePack
+    """
+    service.create_game("ABCD")
+
+    response = api_client.post(
+        "/game/ABCD/move",
+        data=b"\xc1",
+        headers={"Content-Type": MSGPACK},
+    )
+
+    assert response.status_code == 400
@@ -0,0 +1,75 @@
+import json
+
+import fastapi.applications
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ghost_api.api import app
+from ghost_api.openapi import (
+    OPENAPI_SCHEMA_PATH,
+    build_openapi_schema,
+    use_static_openapi,
+)
+
+
+def test_build_openapi_schema(tmp_path):
+    """
+    The built artifact is the schema generated from the app
+    """
+    path = tmp_path / "openapi.json"
+
+    build_openapi_schema(app, path)
+
+    assert json.loads(path.read_bytes()) == app.openapi()
+
+
+def test_static_openapi_served(tmp_path, monkeypatch):
+    """
+    With a static schema, the artifact is served and no schema is generated
+    """
+    path = tmp_path / "openapi.json"
+    build_openapi_schema(app, path)
+
+    def get_openapi(*args, **kwargs):
+        pytest.fail("The schema was generated at runtime")
+
+    monkeypatch.setattr(fastapi.applications, "get_openapi", get_openapi)
+    static_app = FastAPI()
+    use_static_openapi(static_app, path)
+
+    response = TestClient(static_app).get("/openapi.json")
+
+    assert response.status_code == 200
+    assert response.json() == json.loads(path.read_bytes())
+    assert "/game/{room_code}" in response.json()["paths"]
+
+
+def test_static_openapi_not_built(tmp_path):
+    """
+    Without a built artifact, the schema is generated from the app
+    """
+    static_app = FastAPI()
+
+    @static_app.get("/ping")
+    def ping():
+        return "pong"
+
+    use_static_openapi(static_app, tmp_path / "openapi.json")
+
+    response = TestClient(static_app).get("/openapi.json")
+
+    assert response.status_code == 200
+    assert "/ping" in response.json()["paths"]
+
+
+@pytest.mark.skipif(
+    not OPENAPI_SCHEMA_PATH.exists(), reason="Built by poe build-openapi"
+)
+def test_built_openapi_schema_up_to_date():
+    """
+    The built artifact matches the app's routes and models
+    """
+    assert (
+        json.loads(OPENAPI_SCHEMA_PATH.read_bytes()) == app.openapi()
+    ), "The OpenAPI schema is out of date, rebuild it with poe build-openapi"
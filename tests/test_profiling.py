@@ -0,0 +1,66 @@
+import pstats
+
+from fastapi.testclient import TestClient
+
+from ghost_api.api import app
+from ghost_api.profiling import ProfilerMiddleware
+
+
+def _profiled_client(**kwargs) -> TestClient:
+    return TestClient(ProfilerMiddleware(app, router=app.router, **kwargs))
+
+
+def test_unprofiled_request(service, tmp_path):
+    """
+    Requests without the header aren't profiled
+    """
+    service.create_game("ABCD")
+    client = _profiled_client(profile_dir=str(tmp_path))
+
+    response = client.get("/game/ABCD")
+
+    assert response.status_code == 200
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_profile_saved(service, tmp_path):
+    """
+    Profiles of requests with the header are saved, tagged with their route
+    and room code
+    """
+    service.create_game("ABCD")
+    client = _profiled_client(profile_dir=str(tmp_path))
+
+    response = client.get("/game/ABCD", headers={"X-Profile": "1"})
+
+    assert response.status_code == 200
+    assert response.json()["roomCode"] == "ABCD"
+    (path,) = tmp_path.iterdir()
+    assert path.name.endswith("-GET_game_room_code_ABCD.prof")
+    assert pstats.Stats(str(path)).total_calls > 0
+
+
+def test_profile_sampled(service, tmp_path):
+    """
+    Requests are profiled at the sample rate
+    """
+    service.create_game("ABCD")
+    client = _profiled_client(sample_rate=1.0, profile_dir=str(tmp_path))
+
+    client.get("/game/ABCD")
+
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_profile_inline(service):
+    """
+    With X-Profile: inline, a report of the profile replaces the response
+    """
+    client = _profiled_client()
+
+    response = client.get("/game/ABCD", headers={"X-Profile": "inline"})
+
+    assert response.status_code == 200
+    assert response.headers["x-profiled-status"] == "404"
+    assert response.text.startswith("Profile of GET /game/{room_code} ABCD\n")
+    assert "read_game" in response.text
@@ -0,0 +1,175 @@
+import json
+
+from benchmarks.load import Request
+from benchmarks.replay import (
+    TimedRequest,
+    missing_rooms,
+    parse_requests,
+    scale_requests,
+)
+
+
+def _log_line(time, message, **fields):
+    record = {"time": time, "level": "INFO", "message": message, **fields}
+    # Prefixed like CloudWatch log lines
+    return "2021-06-01T12:00:00.000Z\tabc-123\t" + json.dumps(record)
+
+
+def test_parse_requests_logs():
+    """
+    Request logs are parsed into requests with camelCase bodies, in the order
+    they were made, skipping other lines
+    """
+    lines = [
+        _log_line(
+            "2021-06-01T12:00:02+00:00",
+            "POST /game/{room_code}/move",
+            room_code="ABCD",
+            move={
+                "player_name": "player1",
+                "position": {"x": 0, "y": 1},
+                "letter": "K",
+            },
+        ),
+        _log_line(
+            "2021-06-01T12:00:00+00:00", "POST /game/{room_code}", room_code="ABCD"
+        ),
+        _log_line("2021-06-01T12:00:01+00:00", "Sweeping expired games"),
+        "START RequestId: abc-123",
+        "{not json",
+        _log_line(
+            "2021-06-01T12:00:03+00:00",
+            "GET /game/{room_code}",
+            room_code="ABCD",
+            fields="started",
+        ),
+    ]
+
+    requests = parse_requests(lines)
+
+    assert [timed.time - requests[0].time for timed in requests] == [0, 2, 3]
+    assert [timed.request for timed in requests] == [
+        Request("POST", "/game/{room_code}", {"room_code": "ABCD"}),
+        Request(
+            "POST",
+            "/game/{room_code}/move",
+            {"room_code": "ABCD"},
+            body={
+                "playerName": "player1",
+                "position": {"x": 0, "y": 1},
+                "letter": "K",
+            },
+        ),
+        Request(
+            "GET",
+            "/game/{room_code}",
+            {"room_code": "ABCD"},
+            query={"fields": "started"},
+        ),
+    ]
+
+
+def test_parse_requests_games_query():
+    """
+    Logged game queries are replayed for the most recently seen rooms, as only
+    the number of rooms queried is logged
+    """
+    lines = [
+        _log_line(1, "POST /game/{room_code}", room_code="AAAA"),
+        _log_line(2, "POST /game/{room_code}", room_code="BBBB"),
+        _log_line(3, "POST /game/{room_code}", room_code="CCCC"),
+        _log_line(4, "POST /games/query", room_codes=2),
+    ]
+
+    query = parse_requests(lines)[-1].request
+
+    assert query.body == {"roomCodes": ["BBBB", "CCCC"]}
+
+
+def test_parse_requests_recorded():
+    """
+    Recorded request files are parsed as they are
+    """
+    record = {
+        "time": 5,
+        "method": "DELETE",
+        "route": "/game/{room_code}/player/{player_name}",
+        "path_params": {"room_code": "ABCD", "player_name": "player1"},
+    }
+
+    (timed,) = parse_requests([json.dumps(record)])
+
+    assert timed == TimedRequest(
+        5,
+        Request(
+            "DELETE",
+            "/game/{room_code}/player/{player_name}",
+            {"room_code": "ABCD", "player_name": "player1"},
+        ),
+    )
+
+
+def _requests():
+    return [
+        TimedRequest(0, Request("POST", "/game/{room_code}", {"room_code": "AAAA"})),
+        TimedRequest(1, Request("POST", "/game/{room_code}", {"room_code": "BBBB"})),
+        TimedRequest(2, Request("GET", "/games", query={"started": "false"})),
+        TimedRequest(
+            3, Request("POST", "/games/query", body={"roomCodes": ["AAAA", "BBBB"]})
+        ),
+    ]
+
+
+def test_scale_requests_copies():
+    """
+    Each copy of a room gets its own room code, and requests that aren't for a
+    room are copied as they are
+    """
+    scaled = scale_requests(_requests(), copies=2)
+
+    assert [timed.time for timed in scaled] == [0, 0, 1, 1, 2, 2, 3, 3]
+    room_codes = [timed.request.room_code for timed in scaled if timed.time < 2]
+    assert len(set(room_codes)) == 4
+    assert all(code[:4] in ("AAAA", "BBBB") for code in room_codes)
+    assert [timed.request.query for timed in scaled if timed.time == 2] == [
+        {"started": "false"}
+    ] * 2
+
+    first_copy_rooms = [room_codes[0], room_codes[2]]
+    assert scaled[-2].request.body == {"roomCodes": first_copy_rooms}
+
+
+def test_scale_requests_rooms():
+    """
+    Only the first rooms are kept if a number of rooms is given
+    """
+    scaled = scale_requests(_requests(), copies=1, rooms=1)
+
+    (create,) = [timed for timed in scaled if timed.request.room_code is not None]
+    assert create.request.room_code.startswith("AAAA-")
+    assert scaled[-1].request.body == {"roomCodes": [create.request.room_code]}
+
+
+def test_scale_requests_fresh_room_codes():
+    """
+    Every scaling uses new room codes, so replays can be repeated
+    """
+    first = scale_requests(_requests(), copies=1)
+    second = scale_requests(_requests(), copies=1)
+
+    assert first[0].request.room_code != second[0].request.room_code
+
+
+def test_missing_rooms():
+    """
+    Rooms are missing if their first request doesn't create them
+    """
+    requests = [
+        TimedRequest(0, Request("POST", "/game/{room_code}", {"room_code": "AAAA"})),
+        TimedRequest(1, Request("GET", "/game/{room_code}", {"room_code": "BBBB"})),
+        TimedRequest(2, Request("POST", "/game/{room_code}", {"room_code": "BBBB"})),
+        TimedRequest(3, Request("GET", "/games")),
+        TimedRequest(4, Request("GET", "/game/{room_code}", {"room_code": "AAAA"})),
+    ]
+
+    assert missing_rooms(requests) == ["BBBB"]
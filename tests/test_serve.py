@@ -0,0 +1,70 @@
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+pytest.importorskip("gunicorn")
+pytest.importorskip("uvicorn")
+
+from ghost_api.serve import GhostServer  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_server_config():
+    """
+    Options are applied on top of preloading the app into Uvicorn workers
+    """
+    server = GhostServer({"workers": 3, "backlog": 64, "keepalive": 7})
+
+    assert server.cfg.workers == 3
+    assert server.cfg.backlog == 64
+    assert server.cfg.keepalive == 7
+    assert server.cfg.preload_app
+    assert server.cfg.worker_class_str == "uvicorn.workers.UvicornWorker"
+
+
+def test_serve_and_drain():
+    """
+    The server handles requests with multiple workers, and exits cleanly on
+    SIGTERM
+    """
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "ghost_api.serve",
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--workers",
+            "2",
+        ],
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                response = requests.post(
+                    f"http://127.0.0.1:{port}/login/guest",
+                    json={"name": "player1"},
+                )
+                break
+            except requests.ConnectionError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+        assert response.status_code == 200
+        assert response.json()["name"] == "player1"
+    finally:
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=30) == 0
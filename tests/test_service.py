@@ -1,14 +1,28 @@
+import json
+import time
+
 import pytest
 
+from ghost_api.avatars import default_image_url
+from ghost_api.constants import GAME_TTL_SECONDS
 from ghost_api.exceptions import (
+    ConcurrentUpdate,
     GameAlreadyExists,
     GameDoesNotExist,
     GameNotStarted,
     GameStarted,
+    GamesUnavailable,
+    InvalidCursor,
     InvalidMove,
+    NoFieldsRequested,
+    UnknownField,
     WrongPlayer,
 )
+from ghost_api.service import GhostService
+from ghost_api.storage import SNAPSHOT_SCHEMA_VERSION
 from ghost_api.types import (
+    BatchAction,
+    BatchActionType,
     Challenge,
     ChallengeResponse,
     ChallengeState,
@@ -1061,3 +1075,637 @@ def test_add_challenge_vote_non_player(service):
     )
     with pytest.raises(InvalidMove):
         service.add_challenge_vote("AAAA", vote)
+
+
+def test_apply_actions(service):
+    """
+    A batch of actions is applied in order, playing through a challenge
+    """
+    service.create_game("AAAA")
+
+    new_player1 = Player(name="player1", image_url="aaa.bbb")
+    new_player2 = Player(name="player2", image_url="ccc.ddd")
+    new_player3 = Player(name="player3", image_url="eee.fff")
+    new_move1 = Move(
+        player_name="player1",
+        position=Position(x=0, y=0),
+        letter="U",
+    )
+    new_move2 = Move(
+        player_name="player2",
+        position=Position(x=1, y=0),
+        letter="P",
+    )
+    actions = [
+        BatchAction(type=BatchActionType.JOIN, player=new_player1),
+        BatchAction(type=BatchActionType.JOIN, player=new_player2),
+        BatchAction(type=BatchActionType.JOIN, player=new_player3),
+        BatchAction(type=BatchActionType.START),
+        BatchAction(type=BatchActionType.MOVE, move=new_move1),
+        BatchAction(type=BatchActionType.MOVE, move=new_move2),
+        BatchAction(
+            type=BatchActionType.CHALLENGE,
+            challenge=NewChallenge(
+                challenger_name="player3",
+                move=new_move2,
+                type=ChallengeType.NO_VALID_WORDS,
+            ),
+        ),
+        BatchAction(
+            type=BatchActionType.CHALLENGE_RESPONSE,
+            challenge_response=ChallengeResponse(row_word="UPS", col_word="P"),
+        ),
+        BatchAction(
+            type=BatchActionType.CHALLENGE_VOTE,
+            vote=ChallengeVote(voter_name="player1", pro_challenge=True),
+        ),
+        BatchAction(
+            type=BatchActionType.CHALLENGE_VOTE,
+            vote=ChallengeVote(voter_name="player2", pro_challenge=False),
+        ),
+        BatchAction(
+            type=BatchActionType.CHALLENGE_VOTE,
+            vote=ChallengeVote(voter_name="player3", pro_challenge=True),
+        ),
+    ]
+
+    game = service.apply_actions("AAAA", actions)
+
+    assert game == service.read_game("AAAA")
+    assert game.started
+    assert game.moves == [new_move1, new_move2]
+    assert game.challenge is None
+    assert game.players == [new_player1, new_player3]
+    assert game.losers == [new_player2]
+    assert game.turn_player_name == "player1"
+    assert game.winner is None
+
+
+def test_apply_actions_matches_single_actions(service):
+    """
+    Applying actions in a batch gives the same game as applying them one by
+    one, including determining a winner
+    """
+    new_player1 = Player(name="player1", image_url="aaa.bbb")
+    new_player2 = Player(name="player2", image_url="ccc.ddd")
+    new_move = Move(
+        player_name="player1",
+        position=Position(x=0, y=0),
+        letter="U",
+    )
+    challenge = NewChallenge(
+        challenger_name="player2",
+        move=new_move,
+        type=ChallengeType.COMPLETE_WORD,
+    )
+    vote1 = ChallengeVote(voter_name="player1", pro_challenge=False)
+    vote2 = ChallengeVote(voter_name="player2", pro_challenge=True)
+
+    service.create_game("AAAA")
+    service.add_player("AAAA", new_player1)
+    service.add_player("AAAA", new_player2)
+    service.start_game("AAAA")
+    service.add_move("AAAA", new_move)
+    service.create_challenge("AAAA", challenge)
+    service.add_challenge_vote("AAAA", vote1)
+    single_game = service.add_challenge_vote("AAAA", vote2)
+
+    service.create_game("BBBB")
+    batch_game = service.apply_actions(
+        "BBBB",
+        [
+            BatchAction(type=BatchActionType.JOIN, player=new_player1),
+            BatchAction(type=BatchActionType.JOIN, player=new_player2),
+            BatchAction(type=BatchActionType.START),
+            BatchAction(type=BatchActionType.MOVE, move=new_move),
+            BatchAction(type=BatchActionType.CHALLENGE, challenge=challenge),
+            BatchAction(type=BatchActionType.CHALLENGE_VOTE, vote=vote1),
+            BatchAction(type=BatchActionType.CHALLENGE_VOTE, vote=vote2),
+        ],
+    )
+
+    assert batch_game.winner == new_player2
+    assert batch_game == single_game.copy(update={"room_code": "BBBB"})
+
+
+def test_apply_actions_failure_applies_nothing(service):
+    """
+    If any action in a batch fails, none of the actions are applied
+    """
+    service.create_game("AAAA")
+
+    new_player1 = Player(name="player1", image_url="aaa.bbb")
+    new_player2 = Player(name="player2", image_url="ccc.ddd")
+    actions = [
+        BatchAction(type=BatchActionType.JOIN, player=new_player1),
+        BatchAction(type=BatchActionType.START),
+        BatchAction(type=BatchActionType.JOIN, player=new_player2),
+    ]
+
+    with pytest.raises(GameStarted, match="Action 2: "):
+        service.apply_actions("AAAA", actions)
+
+    read_game = service.read_game("AAAA")
+    assert read_game.players == []
+    assert not read_game.started
+
+
+def test_apply_actions_retries_conflict(service):
+    """
+    If another request changes the game before the actions are written, they
+    are applied again to the changed game
+    """
+    service.create_game("AAAA")
+    other_service = GhostService()
+
+    put_item = service.games_table.put_item
+    calls = 0
+
+    def put_item_after_other_join(**kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            other_service.add_player("AAAA", Player(name="player2", image_url="x"))
+        return put_item(**kwargs)
+
+    service.games_table.put_item = put_item_after_other_join
+    player1 = Player(name="player1", image_url="aaa.bbb")
+    game = service.apply_actions(
+        "AAAA", [BatchAction(type=BatchActionType.JOIN, player=player1)]
+    )
+
+    assert calls == 2
+    assert [player.name for player in game.players] == ["player2", "player1"]
+
+
+def test_apply_actions_persistent_conflict(service):
+    """
+    If other requests keep changing the game, the actions aren't applied
+    """
+    service.create_game("AAAA")
+    other_service = GhostService()
+
+    put_item = service.games_table.put_item
+    joins = 0
+
+    def put_item_after_other_join(**kwargs):
+        nonlocal joins
+        joins += 1
+        other_service.add_player("AAAA", Player(name=f"other{joins}", image_url="x"))
+        return put_item(**kwargs)
+
+    service.games_table.put_item = put_item_after_other_join
+    player1 = Player(name="player1", image_url="aaa.bbb")
+    with pytest.raises(ConcurrentUpdate):
+        service.apply_actions(
+            "AAAA", [BatchAction(type=BatchActionType.JOIN, player=player1)]
+        )
+
+    players = [player.name for player in service.read_game("AAAA").players]
+    assert "player1" not in players
+
+
+def test_apply_actions_nonexistent_game(service):
+    """
+    Can't apply actions to a game that doesn't exist
+    """
+    with pytest.raises(GameDoesNotExist):
+        service.apply_actions("AAAA", [BatchAction(type=BatchActionType.START)])
+
+
+def test_read_games(service):
+    """
+    Many games can be read at once, across several batches
+    """
+    room_codes = [f"A{i:03}" for i in range(150)]
+    for room_code in room_codes:
+        service.create_game(room_code)
+
+    games = list(service.read_games(room_codes))
+
+    assert sorted(game.room_code for game in games) == room_codes
+    assert games[0] == service.read_game(games[0].room_code)
+
+
+def test_read_games_skips_missing_and_duplicates(service):
+    """
+    Nonexistent games are skipped and repeated room codes are read once
+    """
+    service.create_game("AAAA")
+    service.create_game("BBBB")
+
+    games = list(service.read_games(["AAAA", "CCCC", "BBBB", "AAAA"]))
+
+    assert sorted(game.room_code for game in games) == ["AAAA", "BBBB"]
+
+
+def test_read_games_empty(service):
+    """
+    Reading no games makes no requests
+    """
+    assert list(service.read_games([])) == []
+
+
+def test_read_games_retries_unprocessed_keys(service, monkeypatch):
+    """
+    Keys left unprocessed by DynamoDB are retried
+    """
+    service.create_game("AAAA")
+    service.create_game("BBBB")
+
+    client = service.db.meta.client
+    batch_get_item = client.batch_get_item
+    requests = []
+
+    def throttled_batch_get_item(RequestItems):
+        requests.append(RequestItems)
+        if len(requests) > 1:
+            return batch_get_item(RequestItems=RequestItems)
+        # Only process the first key on the first attempt
+        ((table_name, request),) = RequestItems.items()
+        response = batch_get_item(
+            RequestItems={table_name: {"Keys": request["Keys"][:1]}}
+        )
+        response["UnprocessedKeys"] = {table_name: {"Keys": request["Keys"][1:]}}
+        return response
+
+    monkeypatch.setattr(client, "batch_get_item", throttled_batch_get_item)
+
+    games = list(service.read_games(["AAAA", "BBBB"]))
+
+    assert sorted(game.room_code for game in games) == ["AAAA", "BBBB"]
+    assert len(requests) == 2
+
+
+def test_read_games_unavailable(service, monkeypatch):
+    """
+    Keys that are never processed raise an error
+    """
+    client = service.db.meta.client
+
+    def throttled_batch_get_item(RequestItems):
+        return {"Responses": {}, "UnprocessedKeys": RequestItems}
+
+    monkeypatch.setattr(client, "batch_get_item", throttled_batch_get_item)
+    monkeypatch.setattr("ghost_api.service.time.sleep", lambda seconds: None)
+
+    with pytest.raises(GamesUnavailable):
+        list(service.read_games(["AAAA"]))
+
+
+def test_list_open_games(service):
+    """
+    Games that haven't started are listed in room code order
+    """
+    service.create_game("CCCC")
+    service.create_game("AAAA")
+    service.create_game("BBBB")
+    service.start_game("BBBB")
+    service.create_game("DDDD")
+    service.apply_actions("DDDD", [BatchAction(type=BatchActionType.START)])
+
+    page = service.list_open_games()
+
+    assert [game.room_code for game in page.games] == ["AAAA", "CCCC"]
+    assert page.games[0] == service.read_game("AAAA")
+    assert page.cursor is None
+
+
+def test_list_open_games_pages(service):
+    """
+    Open games can be listed a page at a time
+    """
+    room_codes = [f"A{i:03}" for i in range(5)]
+    for room_code in room_codes:
+        service.create_game(room_code)
+
+    listed = []
+    cursor = None
+    for _ in range(10):
+        page = service.list_open_games(limit=2, cursor=cursor)
+        assert len(page.games) <= 2
+        listed.extend(game.room_code for game in page.games)
+        cursor = page.cursor
+        if cursor is None:
+            break
+
+    assert listed == room_codes
+
+
+def test_list_open_games_invalid_cursor(service):
+    """
+    Cursors must come from a previous page
+    """
+    with pytest.raises(InvalidCursor):
+        service.list_open_games(cursor="not-a-cursor")
+
+
+def test_mutations_stamp_activity(service):
+    """
+    Creating and changing a game records when it was last active and when it
+    expires
+    """
+    before = int(time.time())
+    service.create_game("AAAA")
+    created = service.games_table.get_item(Key={"room_code": "AAAA"})["Item"]
+
+    assert created["last_activity"] >= before
+    assert created["expires_at"] == created["last_activity"] + GAME_TTL_SECONDS
+
+    service.add_player("AAAA", Player(name="player1", image_url="aaa.bbb"))
+    service.start_game("AAAA")
+    started = service.games_table.get_item(Key={"room_code": "AAAA"})["Item"]
+
+    assert started["last_activity"] >= created["last_activity"]
+    assert started["expires_at"] == started["last_activity"] + GAME_TTL_SECONDS
+
+
+def test_add_move_packs_legacy_moves(service):
+    """
+    Moves stored in the list layout can still be read, and are packed by the
+    next move
+    """
+    service.create_game("AAAA")
+    new_player1 = Player(name="player1", image_url="aaa.bbb")
+    service.add_player("AAAA", new_player1)
+    new_player2 = Player(name="player2", image_url="ccc.ddd")
+    service.add_player("AAAA", new_player2)
+    service.start_game("AAAA")
+
+    legacy_move = Move(
+        player_name="player1",
+        position=Position(x=0, y=0),
+        letter="U",
+    )
+    service.games_table.update_item(
+        Key={"room_code": "AAAA"},
+        UpdateExpression="set moves=:m, turn_player_name=:t",
+        ExpressionAttributeValues={":m": [legacy_move.dict()], ":t": "player2"},
+    )
+    assert service.read_game("AAAA").moves == [legacy_move]
+
+    new_move = Move(
+        player_name="player2",
+        position=Position(x=1, y=0),
+        letter="P",
+    )
+    game = service.add_move("AAAA", new_move)
+
+    assert game.moves == [legacy_move, new_move]
+    item = service.games_table.get_item(Key={"room_code": "AAAA"})["Item"]
+    assert not isinstance(item["moves"], list)
+
+
+def test_add_player_compact_storage(service):
+    """
+    Players with the default image are stored compactly and read back in full
+    """
+    service.create_game("AAAA")
+    guest = Player(name="guest", image_url=default_image_url("guest"))
+    custom = Player(name="custom", image_url="aaa.bbb")
+
+    service.add_player("AAAA", guest)
+    game = service.add_player("AAAA", custom)
+
+    assert game.players == [guest, custom]
+    item = service.games_table.get_item(Key={"room_code": "AAAA"})["Item"]
+    assert item["players"] == [
+        {"name": "guest"},
+        {"name": "custom", "image_url": "aaa.bbb"},
+    ]
+
+
+def test_add_player_legacy_players(service):
+    """
+    Players stored with their full default image URL can still be read and
+    changed
+    """
+    service.create_game("AAAA")
+    guest1 = Player(name="guest1", image_url=default_image_url("guest1"))
+    service.games_table.update_item(
+        Key={"room_code": "AAAA"},
+        UpdateExpression="set players=:p, turn_player_name=:t",
+        ExpressionAttributeValues={":p": [guest1.dict()], ":t": "guest1"},
+    )
+    assert service.read_game("AAAA").players == [guest1]
+
+    guest2 = Player(name="guest2", image_url=default_image_url("guest2"))
+    game = service.add_player("AAAA", guest2)
+
+    assert game.players == [guest1, guest2]
+    item = service.games_table.get_item(Key={"room_code": "AAAA"})["Item"]
+    assert item["players"] == [{"name": "guest1"}, {"name": "guest2"}]
+
+
+def test_read_game_fields(service):
+    """
+    Only the requested fields of a game are read
+    """
+    service.create_game("AAAA")
+    new_player1 = Player(name="player1", image_url="aaa.bbb")
+    service.add_player("AAAA", new_player1)
+    service.start_game("AAAA")
+    new_move = Move(
+        player_name="player1",
+        position=Position(x=0, y=0),
+        letter="U",
+    )
+    service.add_move("AAAA", new_move)
+
+    partial = service.read_game(
+        "AAAA", fields=["turn_player_name", "started", "moves", "players"]
+    )
+
+    assert partial.dict(exclude_unset=True) == {
+        "turn_player_name": "player1",
+        "started": True,
+        "moves": [new_move.dict()],
+        "players": [new_player1.dict()],
+    }
+
+
+def test_read_game_unknown_fields(service):
+    """
+    Can't read fields that games don't have
+    """
+    service.create_game("AAAA")
+
+    with pytest.raises(UnknownField):
+        service.read_game("AAAA", fields=["started", "score"])
+
+
+def test_read_game_no_fields(service):
+    """
+    Can't read none of the fields of a game
+    """
+    service.create_game("AAAA")
+
+    with pytest.raises(NoFieldsRequested):
+        service.read_game("AAAA", fields=[])
+
+
+def test_read_game_fields_nonexistent_game(service):
+    """
+    Can't read fields of a game that doesn't exist
+    """
+    with pytest.raises(GameDoesNotExist):
+        service.read_game("AAAA", fields=["started"])
+
+
+def test_read_game_json(service):
+    """
+    Games can be read already rendered as JSON
+    """
+    service.create_game("AAAA")
+    service.add_player("AAAA", Player(name="player1", image_url="aaa.bbb"))
+
+    body = service.read_game_json("AAAA")
+
+    assert json.loads(body) == json.loads(service.read_game("AAAA").json(by_alias=True))
+
+
+def test_read_game_json_nonexistent_game(service):
+    """
+    Can't read a game that doesn't exist
+    """
+    with pytest.raises(GameDoesNotExist):
+        service.read_game_json("AAAA")
+
+
+def test_snapshots(service, monkeypatch):
+    """
+    With snapshots enabled, changing a game stores its rendered JSON, which is
+    returned by later reads until the game changes again
+    """
+    monkeypatch.setattr("ghost_api.service.STORE_SNAPSHOTS", True)
+
+    service.create_game("AAAA")
+    game = service.add_player("AAAA", Player(name="player1", image_url="aaa.bbb"))
+
+    item = service.games_table.get_item(Key={"room_code": "AAAA"})["Item"]
+    assert item["snapshot_revision"] == item["revision"]
+    assert json.loads(service.read_game_json("AAAA")) == json.loads(
+        game.json(by_alias=True)
+    )
+
+    # A change without a snapshot, e.g. by an instance with snapshots disabled
+    monkeypatch.setattr("ghost_api.service.STORE_SNAPSHOTS", False)
+    game = service.add_player("AAAA", Player(name="player2", image_url="ccc.ddd"))
+    monkeypatch.setattr("ghost_api.service.STORE_SNAPSHOTS", True)
+
+    assert json.loads(service.read_game_json("AAAA")) == json.loads(
+        game.json(by_alias=True)
+    )
+    # The stale snapshot is rebuilt on read
+    item = service.games_table.get_item(Key={"room_code": "AAAA"})["Item"]
+    assert item["snapshot_revision"] == item["revision"]
+
+
+def test_snapshot_schema_version(service, monkeypatch):
+    """
+    Snapshots from another schema version are rebuilt rather than returned
+    """
+    monkeypatch.setattr("ghost_api.service.STORE_SNAPSHOTS", True)
+    game = service.create_game("AAAA")
+
+    service.games_table.update_item(
+        Key={"room_code": "AAAA"},
+        UpdateExpression="set snapshot_version=:v",
+        ExpressionAttributeValues={":v": 0},
+    )
+
+    assert json.loads(service.read_game_json("AAAA")) == json.loads(
+        game.json(by_alias=True)
+    )
+    item = service.games_table.get_item(Key={"room_code": "AAAA"})["Item"]
+    assert item["snapshot_version"] == SNAPSHOT_SCHEMA_VERSION
+
+
+def test_snapshot_written_with_change(service, monkeypatch):
+    """
+    With snapshots enabled, the snapshot is stored by the same write as the
+    change, and the changed game isn't read back
+    """
+    monkeypatch.setattr("ghost_api.service.STORE_SNAPSHOTS", True)
+    service.create_game("AAAA")
+
+    calls = []
+
+    def counted(name):
+        method = getattr(service.games_table, name)
+
+        def call(**kwargs):
+            calls.append(name)
+            return method(**kwargs)
+
+        return call
+
+    for name in ["get_item", "update_item", "put_item"]:
+        monkeypatch.setattr(service.games_table, name, counted(name))
+    game = service.add_player("AAAA", Player(name="player1", image_url="aaa.bbb"))
+
+    assert calls == ["get_item", "update_item"]
+    item = service.games_table.get_item(Key={"room_code": "AAAA"})["Item"]
+    assert item["snapshot_revision"] == item["revision"]
+    assert json.loads(service.read_game_json("AAAA")) == json.loads(
+        game.json(by_alias=True)
+    )
+
+
+def test_snapshot_not_written_after_other_change(service, monkeypatch):
+    """
+    If the game is changed by another request after it's read, the change is
+    still made, but its snapshot isn't stored
+    """
+    monkeypatch.setattr("ghost_api.service.STORE_SNAPSHOTS", True)
+    service.create_game("AAAA")
+    service.add_player("AAAA", Player(name="player1", image_url="aaa.bbb"))
+    service.start_game("AAAA")
+    other_service = GhostService()
+
+    update_item = service.games_table.update_item
+    calls = 0
+
+    def update_item_after_other_change(**kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            other_service.games_table.update_item(
+                Key={"room_code": "AAAA"},
+                UpdateExpression="set revision=:r",
+                ExpressionAttributeValues={":r": "other"},
+            )
+        return update_item(**kwargs)
+
+    service.games_table.update_item = update_item_after_other_change
+    new_move = Move(player_name="player1", position=Position(x=0, y=0), letter="K")
+    game = service.add_move("AAAA", new_move)
+
+    assert calls == 2
+    assert game.moves == [new_move]
+    item = service.games_table.get_item(Key={"room_code": "AAAA"})["Item"]
+    assert item["snapshot_revision"] != item["revision"]
+    assert json.loads(service.read_game_json("AAAA")) == json.loads(
+        game.json(by_alias=True)
+    )
+
+
+def test_read_game_leaves_out_snapshot(service, monkeypatch):
+    """
+    Reading a game doesn't read its snapshot
+    """
+    monkeypatch.setattr("ghost_api.service.STORE_SNAPSHOTS", True)
+    service.create_game("AAAA")
+
+    responses = []
+    get_item = service.games_table.get_item
+    monkeypatch.setattr(
+        service.games_table,
+        "get_item",
+        lambda **kwargs: responses.append(get_item(**kwargs)) or responses[-1],
+    )
+    service.read_game("AAAA")
+
+    (response,) = responses
+    assert "snapshot" not in response["Item"]
+    assert "revision" in response["Item"]
@@ -0,0 +1,118 @@
+import random
+
+from benchmarks.simulate import WordBot, WordList, empty_neighbours, row_word
+from ghost_api.types import (
+    Challenge,
+    ChallengeState,
+    ChallengeType,
+    GameInfo,
+    Move,
+    Position,
+)
+
+
+def _move(x, y, letter):
+    return Move(player_name="player1", position=Position(x=x, y=y), letter=letter)
+
+
+def _game(moves):
+    return GameInfo(
+        room_code="ABCD",
+        started=True,
+        winner=None,
+        players=[],
+        losers=[],
+        turn_player_name=None,
+        moves=moves,
+        challenge=None,
+    )
+
+
+def test_row_word():
+    """
+    The word through a position is the unbroken run of its row, in lowercase
+    """
+    moves = [
+        _move(0, 0, "C"),
+        _move(1, 0, "A"),
+        _move(2, 0, "T"),
+        _move(4, 0, "S"),
+        _move(1, 1, "X"),
+    ]
+
+    assert row_word(moves, Position(x=1, y=0)) == "cat"
+    assert row_word(moves, Position(x=3, y=0), "E") == "cates"
+    assert row_word(moves, Position(x=1, y=1)) == "x"
+
+
+def test_empty_neighbours():
+    """
+    Bots play next to existing moves, or at the origin of an empty board
+    """
+    assert empty_neighbours([]) == [Position(x=0, y=0)]
+    assert empty_neighbours([_move(0, 0, "A"), _move(1, 0, "B")]) == [
+        Position(x=-1, y=0),
+        Position(x=0, y=-1),
+        Position(x=0, y=1),
+        Position(x=1, y=-1),
+        Position(x=1, y=1),
+        Position(x=2, y=0),
+    ]
+
+
+def test_word_list_prefixes():
+    """
+    Prefixes are the beginnings of words that can still be extended
+    """
+    words = WordList(["cat", "cats"])
+
+    assert words.prefixes == {"", "c", "ca", "cat"}
+
+
+def test_word_bot_avoids_completing_words():
+    """
+    Word bots play letters that extend a word without completing it
+    """
+    bot = WordBot(random.Random(0), WordList(["cat", "dog"]))
+    game = _game([_move(0, 0, "C"), _move(1, 0, "A")])
+
+    for _ in range(20):
+        move = bot.move(game, "player1")
+        assert row_word(game.moves, move.position, move.letter) != "cat"
+
+
+def test_word_bot_challenges():
+    """
+    Word bots challenge completed words and rows that can't become words
+    """
+    bot = WordBot(random.Random(0), WordList(["cat"]))
+
+    completed = _game([_move(0, 0, "C"), _move(1, 0, "A"), _move(2, 0, "T")])
+    dead_end = _game([_move(0, 0, "C"), _move(1, 0, "X")])
+    open_row = _game([_move(0, 0, "C"), _move(1, 0, "A")])
+
+    assert bot.challenge_type(completed) is ChallengeType.COMPLETE_WORD
+    assert bot.challenge_type(dead_end) is ChallengeType.NO_VALID_WORDS
+    assert bot.challenge_type(open_row) is None
+
+
+def test_word_bot_votes():
+    """
+    Word bots vote for complete word challenges of words
+    """
+    bot = WordBot(random.Random(0), WordList(["cat"]))
+    game = _game([_move(0, 0, "C"), _move(1, 0, "A"), _move(2, 0, "T")])
+    challenge = Challenge(
+        challenger_name="player2",
+        move=game.moves[-1],
+        type=ChallengeType.COMPLETE_WORD,
+        state=ChallengeState.VOTING,
+        response=None,
+        votes=[],
+    )
+
+    assert bot.vote(game, challenge)
+
+    game.moves[-1] = _move(2, 0, "B")
+    challenge.move = game.moves[-1]
+    assert not bot.vote(game, challenge)
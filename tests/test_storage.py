@@ -0,0 +1,253 @@
+import json
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+from boto3.dynamodb.types import Binary
+
+from ghost_api.avatars import default_image_url
+from ghost_api.storage import (
+    decode_game,
+    encode_game,
+    encode_moves,
+    encode_player,
+    moves_unchanged,
+    players_unchanged,
+    winner_unchanged,
+)
+from ghost_api.types import (
+    ChallengeState,
+    ChallengeType,
+    GameInfo,
+    Move,
+    Player,
+    Position,
+)
+
+
+def _stored_item():
+    """
+    A games table item as returned by DynamoDB, with numbers as Decimals
+    """
+    return {
+        "room_code": "ABCD",
+        "started": True,
+        "winner": None,
+        "players": [
+            {"name": "player1", "image_url": "abc.def"},
+            {"name": "player2", "image_url": "ghi.jkl"},
+        ],
+        "losers": [{"name": "player3", "image_url": "mno.pqr"}],
+        "turn_player_name": "player2",
+        "moves": [
+            {
+                "player_name": "player1",
+                "position": {"x": Decimal(0), "y": Decimal(1)},
+                "letter": "K",
+            },
+        ],
+        "challenge": {
+            "challenger_name": "player2",
+            "move": {
+                "player_name": "player1",
+                "position": {"x": Decimal(0), "y": Decimal(1)},
+                "letter": "K",
+            },
+            "type": "NO_VALID_WORDS",
+            "state": "VOTING",
+            "response": {"row_word": "KA", "col_word": "KO"},
+            "votes": [{"voter_name": "player1", "pro_challenge": False}],
+        },
+        "last_activity": Decimal(1600000000),
+        "expires_at": Decimal(1600604800),
+    }
+
+
+def test_decode_game():
+    """
+    Decoding a stored game gives the same game as validating it
+    """
+    item = _stored_item()
+
+    game = decode_game(item)
+
+    assert game == GameInfo.parse_obj(item)
+    assert type(game.moves[0].position.x) is int
+    assert game.challenge is not None
+    assert game.challenge.type is ChallengeType.NO_VALID_WORDS
+    assert game.challenge.state is ChallengeState.VOTING
+    assert game.json(by_alias=True) == GameInfo.parse_obj(item).json(by_alias=True)
+
+
+def test_decode_game_empty():
+    """
+    Games without any moves or a challenge can be decoded
+    """
+    item = {
+        **_stored_item(),
+        "started": False,
+        "players": [],
+        "losers": [],
+        "turn_player_name": None,
+        "moves": [],
+        "challenge": None,
+    }
+
+    assert decode_game(item) == GameInfo.parse_obj(item)
+
+
+def test_decode_game_packed_moves():
+    """
+    Games with packed moves decode to the same game as the list layout
+    """
+    legacy_item = _stored_item()
+    game = GameInfo.parse_obj(legacy_item)
+
+    item = encode_game(game)
+
+    assert isinstance(item["moves"], Binary)
+    assert decode_game(item) == game
+
+
+def _condition_values(condition):
+    return list(
+        ConditionExpressionBuilder()
+        .build_expression(condition)
+        .attribute_value_placeholders.values()
+    )
+
+
+def test_moves_unchanged_packed():
+    """
+    The condition on packed moves only compares against the packed layout
+    """
+    game = decode_game(encode_game(GameInfo.parse_obj(_stored_item())))
+
+    assert _condition_values(moves_unchanged(game)) == [encode_moves(game.moves)]
+
+
+def test_moves_unchanged_legacy():
+    """
+    The condition on moves read in the list layout compares against that layout
+    """
+    game = decode_game(_stored_item())
+
+    assert _condition_values(moves_unchanged(game)) == [
+        [move.dict() for move in game.moves]
+    ]
+
+
+def test_players_unchanged_compact():
+    """
+    The conditions on compact players only compare against the compact layout
+    """
+    guest = Player(name="guest", image_url=default_image_url("guest"))
+    custom = Player(name="custom", image_url="abc.def")
+    legacy_item = {
+        **_stored_item(),
+        "winner": guest.dict(),
+        "players": [guest.dict(), custom.dict()],
+    }
+    game = decode_game(encode_game(GameInfo.parse_obj(legacy_item)))
+
+    assert _condition_values(players_unchanged(game, "players")) == [
+        [{"name": "guest"}, {"name": "custom", "image_url": "abc.def"}]
+    ]
+    assert _condition_values(winner_unchanged(game)) == [{"name": "guest"}]
+
+
+def test_players_unchanged_legacy():
+    """
+    The conditions on players read in the old layout compare against that
+    layout
+    """
+    guest = Player(name="guest", image_url=default_image_url("guest"))
+    custom = Player(name="custom", image_url="abc.def")
+    game = decode_game(
+        {
+            **_stored_item(),
+            "winner": guest.dict(),
+            "players": [guest.dict(), custom.dict()],
+        }
+    )
+
+    assert _condition_values(players_unchanged(game, "players")) == [
+        [guest.dict(), custom.dict()]
+    ]
+    assert _condition_values(winner_unchanged(game)) == [guest.dict()]
+
+
+def test_encode_moves_roundtrip():
+    """
+    Moves survive packing, including negative positions and non-ASCII names
+    and letters
+    """
+    moves = [
+        Move(player_name="player1", position=Position(x=0, y=0), letter="K"),
+        Move(player_name="jöhn", position=Position(x=-1, y=300), letter="Ö"),
+        Move(player_name="player1", position=Position(x=70000, y=-65), letter="A"),
+    ]
+    item = {**_stored_item(), "moves": encode_moves(moves)}
+
+    assert decode_game(item).moves == moves
+
+
+def test_encode_moves_size():
+    """
+    Packed moves are several times smaller than the list layout
+    """
+    moves = [
+        Move(
+            player_name=f"player{i % 4}",
+            position=Position(x=i % 20, y=i // 20),
+            letter="K",
+        )
+        for i in range(200)
+    ]
+
+    packed_size = len(encode_moves(moves).value)
+    list_size = len(json.dumps([move.dict() for move in moves]))
+
+    assert packed_size * 10 < list_size
+
+
+def test_encode_player_default_image():
+    """
+    Players with the default image for their name are stored as just the name
+    """
+    player = Player(name="player1", image_url=default_image_url("player1"))
+
+    assert encode_player(player) == {"name": "player1"}
+
+
+def test_encode_player_custom_image():
+    """
+    Players with a custom image are stored with its URL
+    """
+    player = Player(name="player1", image_url="abc.def")
+
+    assert encode_player(player) == {"name": "player1", "image_url": "abc.def"}
+
+
+def test_decode_game_compact_players():
+    """
+    Compact players are expanded with their default image
+    """
+    guest = Player(name="guest", image_url=default_image_url("guest"))
+    custom = Player(name="custom", image_url="abc.def")
+    game = GameInfo.parse_obj(
+        {
+            **_stored_item(),
+            "winner": guest.dict(),
+            "players": [guest.dict(), custom.dict()],
+            "losers": [guest.dict()],
+        }
+    )
+
+    item = encode_game(game)
+
+    assert item["players"] == [
+        {"name": "guest"},
+        {"name": "custom", "image_url": "abc.def"},
+    ]
+    assert item["winner"] == {"name": "guest"}
+    assert decode_game(item) == game
@@ -0,0 +1,103 @@
+from benchmarks.load import CONFLICT, OK, Client, LoadStats, Result, ServiceClient
+from benchmarks.stress import Room, _concurrently, join, stress_room
+from ghost_api.types import GameInfo, Player
+
+
+class ScriptedClient(Client):
+    """
+    Responds to moves with the given outcomes in order, and to reads with a
+    fixed game
+    """
+
+    def __init__(self, outcomes=(), game=None):
+        self.outcomes = list(outcomes)
+        self.game = game
+        self.requests = []
+
+    def request(self, request):
+        self.requests.append(request)
+        if request.method == "GET":
+            return Result(200, OK, 0, self.game)
+        return Result(200, self.outcomes.pop(0) if self.outcomes else OK, 0)
+
+
+def _room(client, max_retries=2):
+    return Room(client, LoadStats(), "ABCD", max_retries)
+
+
+def _player(name):
+    return Player(name=name, image_url=f"https://example.com/{name}.png")
+
+
+def test_room_request_retries():
+    """
+    Requests that lose conditional writes are retried until they succeed
+    """
+    room = _room(ScriptedClient([CONFLICT, CONFLICT, OK]))
+
+    result = room.request("POST", "/game/{room_code}/move")
+
+    assert result.outcome == OK
+    assert (room.attempts, room.retries) == (3, 2)
+    assert room.stats.requests == 3
+
+
+def test_room_request_gives_up():
+    """
+    Requests are retried at most ``max_retries`` times, and not at all unless
+    asked
+    """
+    room = _room(ScriptedClient([CONFLICT] * 4))
+
+    assert room.request("POST", "/game/{room_code}/move").outcome == CONFLICT
+    assert room.request("POST", "/game/{room_code}/move", retry=False).outcome == (
+        CONFLICT
+    )
+    assert (room.attempts, room.retries) == (4, 2)
+
+
+def test_concurrently():
+    """
+    Results are returned in the order the tasks were submitted
+    """
+    assert _concurrently(4, lambda i: i * 2, 10) == list(range(0, 20, 2))
+
+
+def test_join_violations():
+    """
+    Joining checks for players that joined twice and successful joins that
+    were lost
+    """
+    game = GameInfo(
+        room_code="ABCD",
+        started=False,
+        winner=None,
+        players=[_player("player0"), _player("player0")],
+        losers=[],
+        turn_player_name="player0",
+        moves=[],
+        challenge=None,
+    )
+    room = _room(ScriptedClient(game=game))
+
+    join(room, players=2, workers=2)
+
+    assert room.violations == [
+        "ABCD: players joined more than once: ['player0']",
+        "ABCD: successful joins were lost: ['player1']",
+    ]
+
+
+def test_stress_room(service):
+    """
+    A room played by one thread at a time breaks no invariants
+    """
+    room = stress_room(
+        ServiceClient(), LoadStats(), players=3, moves=5, workers=1, max_retries=0
+    )
+
+    assert room.violations == []
+    game = room.read_game()
+    assert len(game.moves) == 5
+    assert game.challenge is None
+    assert len(game.losers) == 1
@@ -0,0 +1,120 @@
+from benchmarks.suite import (
+    Case,
+    _game,
+    _next_move,
+    compare,
+    measure,
+    per_move_costs,
+    serialization_cases,
+)
+
+
+def _results(medians):
+    return {
+        f"{case}[{size}]": {"median_us": median}
+        for case, sizes in medians.items()
+        for size, median in sizes.items()
+    }
+
+
+def test_measure():
+    """
+    Each timed call is set up first, after an untimed warm-up call
+    """
+    calls = []
+    case = Case("case", lambda: calls.append("call"), lambda: calls.append("setup"))
+
+    result = measure(case, iterations=3)
+
+    assert calls == ["setup", "call"] * 4
+    assert result["iterations"] == 3
+    assert 0 <= result["min_us"] <= result["median_us"] <= result["p90_us"]
+
+
+def test_game():
+    """
+    Benchmarked games are in their own rooms, with a challenge only if asked
+    """
+    game = _game(50)
+    challenged = _game(50, started=False, challenge=True)
+
+    assert game.room_code != challenged.room_code
+    assert len(game.moves) == 50
+    assert game.started and game.challenge is None
+    assert not challenged.started and challenged.challenge is not None
+
+
+def test_next_move():
+    """
+    The next move is played by the player whose turn it is, off the board so
+    it doesn't overlap a move
+    """
+    game = _game(50)
+
+    move = _next_move(game)
+
+    assert move.player_name == game.turn_player_name
+    assert move.position not in [existing.position for existing in game.moves]
+
+
+def test_serialization_cases():
+    """
+    Serialization cases run without the games table
+    """
+    for case in serialization_cases(50):
+        case.setup()
+        case.call()
+
+
+def test_per_move_costs():
+    """
+    The cost of each move is the difference to the smallest size a case was
+    run at, and cases only run at one size are left out
+    """
+    results = _results(
+        {
+            "service.read_game": {0: 100.0, 50: 150.0, 500: 600.0},
+            "service.vote": {50: 200.0, 500: 650.0},
+            "service.create_game": {0: 50.0},
+            "service.check_word": {500: 10.0},
+        }
+    )
+
+    assert per_move_costs(results) == {
+        "service.read_game per move": 1.0,
+        "service.vote per move": 1.0,
+    }
+
+
+def test_compare_regressions(capsys):
+    """
+    Cases slower than the threshold are regressions, and cases missing from
+    either run are skipped
+    """
+    baseline = {"results": {"a[0]": {"median_us": 100.0}, "b[0]": {"median_us": 1}}}
+    results = {"results": {"a[0]": {"median_us": 130.0}, "c[0]": {"median_us": 1}}}
+
+    assert compare(baseline, results, threshold=0.25) == ["a[0]"]
+    assert compare(baseline, results, threshold=0.5) == []
+
+    output = capsys.readouterr().out
+    assert "b[0]" in output and "not in results" in output
+    assert "c[0]" in output and "not in baseline" in output
+
+
+def test_compare_per_move_costs():
+    """
+    Changes in per-move costs are relative to the mean cost of a move, as the
+    costs themselves can be close to zero
+    """
+    baseline = {
+        "results": {"a[500]": {"median_us": 500.0}, "a per move": {"median_us": 0.01}}
+    }
+    results = {
+        "results": {"a[500]": {"median_us": 500.0}, "a per move": {"median_us": 0.1}}
+    }
+
+    assert compare(baseline, results, threshold=0.25) == []
+
+    results["results"]["a per move"]["median_us"] = 0.5
+    assert compare(baseline, results, threshold=0.25) == ["a per move"]
@@ -0,0 +1,49 @@
+import time
+
+from ghost_api.constants import GAME_TTL_SECONDS
+from ghost_api.sweeper import ExpiredGameSweeper, sweep_expired_games
+from ghost_api.types import Player
+
+
+def test_sweep_expired_games(service):
+    """
+    Games past their expiry time are deleted, others are kept
+    """
+    service.create_game("AAAA")
+    service.create_game("BBBB")
+    # Games without an expiry time are never swept
+    service.games_table.put_item(Item={"room_code": "CCCC"})
+
+    deleted = sweep_expired_games(
+        service.games_table,
+        now=time.time() + GAME_TTL_SECONDS + 1,
+        max_deletes_per_second=1000,
+    )
+
+    assert deleted == 2
+    remaining = service.games_table.scan()["Items"]
+    assert [item["room_code"] for item in remaining] == ["CCCC"]
+
+
+def test_sweep_unexpired_games(service):
+    """
+    Games that have been active recently aren't deleted
+    """
+    service.create_game("AAAA")
+    service.add_player("AAAA", Player(name="player1", image_url="abc.def"))
+
+    deleted = sweep_expired_games(service.games_table, max_deletes_per_second=1000)
+
+    assert deleted == 0
+    assert service.read_game("AAAA").players[0].name == "player1"
+
+
+def test_sweeper_thread(service):
+    """
+    The background sweeper can be started and stopped
+    """
+    sweeper = ExpiredGameSweeper(interval_seconds=0.01)
+    sweeper.start()
+    sweeper.stop()
+
+    assert not sweeper._thread.is_alive()
@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+import ghost_api.service
+import ghost_api.warmup
+from ghost_api.api import handler
+from ghost_api.service import GhostService, dynamodb
+from ghost_api.warmup import is_warmup_event, warm_up, with_warmup
+
+
+@pytest.mark.parametrize(
+    "event, expected",
+    [
+        ({"source": "aws.events", "detail-type": "Scheduled Event"}, True),
+        ({"source": "serverless-plugin-warmup"}, True),
+        ({"httpMethod": "GET", "path": "/game/ABCD"}, False),
+        ({}, False),
+        ("ping", False),
+    ],
+)
+def test_is_warmup_event(event, expected):
+    assert is_warmup_event(event) == expected
+
+
+def test_warmup_event_skips_handler(monkeypatch):
+    """
+    Keep-warm events are answered without calling the wrapped handler
+    """
+    monkeypatch.setattr(ghost_api.warmup, "warm_up", lambda: {"warm": True})
+    calls = []
+
+    def wrapped(event, context):
+        calls.append(event)
+        return "handled"
+
+    warmup_handler = with_warmup(wrapped)
+
+    assert warmup_handler({"httpMethod": "GET"}, None) == "handled"
+    assert calls == [{"httpMethod": "GET"}]
+
+    assert warmup_handler({"source": "serverless-plugin-warmup"}, None) == {
+        "warm": True
+    }
+    assert calls == [{"httpMethod": "GET"}]
+
+
+def test_warm_up(games_table):
+    """
+    Warming up creates the DynamoDB resource shared by later services
+    """
+    assert handler({"source": "aws.events"}, None) == {"warm": True}
+    assert GhostService().db is dynamodb()
+
+
+def test_warm_up_failure(monkeypatch):
+    """
+    A failed warm-up is logged rather than failing the invocation
+    """
+
+    def unavailable_service():
+        raise RuntimeError("Unavailable")
+
+    monkeypatch.setattr(ghost_api.service, "GhostService", unavailable_service)
+
+    assert warm_up() == {"warm": False}
+
+
+def test_dynamodb_shared_per_thread():
+    """
+    Each thread gets its own DynamoDB resource, shared by all of its services
+    """
+    other_thread = []
+    thread = threading.Thread(target=lambda: other_thread.append(dynamodb()))
+    thread.start()
+    thread.join()
+
+    assert dynamodb() is dynamodb()
+    assert other_thread[0] is not dynamodb()